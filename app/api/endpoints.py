@@ -1,81 +1,311 @@
 # app/api/endpoints.py
 import asyncio
-import os
-import yfinance as yf
 import json
-from fastapi import APIRouter, HTTPException, Body
-from fastapi.responses import JSONResponse
-from typing import List
-
-from app.models.schemas import StockAnalysis, UndervaluedStock, TradeRequest
-from app.services.analysis_agents import (
-    fundament_agent,
-    technical_agent,
-    sentiment_agent,
-    recommendation_agent,
-    find_undervalued_stocks
+from fastapi import APIRouter, HTTPException, Body, Header, Query, Response
+from fastapi.responses import StreamingResponse
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.lazy import loaded_modules
+from app.models.schemas import (
+    StockAnalysis,
+    UndervaluedStock,
+    TradeRequest,
+    OrderReceipt,
+    BatchAnalysisRequest,
+    BatchAnalysisResponse,
+    TickerAnalysisResult,
+    PortfolioSummary,
+    PortfolioPage,
+    PortfolioMembership,
+)
+from app.services.analysis import analysis_flight
+from app.services.analysis_agents import find_undervalued_stocks
+from app.services.gemini_batcher import batcher_stats
+from app.services.gemini_client import resilience_stats
+from app.services.llm_cache import llm_cache
+from app.services.fundamentals import fundamentals
+from app.services.market_data import history_batcher, history_flight, info_flight, prefetch_history
+from app.services.orders import order_pipeline
+from app.services.indicator_state import indicator_states
+from app.services.portfolio import DEFAULT_NAME, portfolio_store
+from app.services.precompute import StoredAnalysis, precompute_scheduler, result_store
+from app.services.price_store import price_store
+from app.services.rate_limiter import PRIORITY_BATCH, gemini_scheduler, request_priority
+from app.services.responses import (
+   FastJSONResponse,
+   conditional_response,
+   derived_etag,
+   dumps,
+   json_response,
+   not_modified,
 )
+from app.services.rules import rule_stats
+from app.services.screener import screener
+from app.services.shared_cache import shared_cache
+from app.services.streaming import stream_analyses
+from app.services.tracing import server_timing, trace
 
 router = APIRouter()
 
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+# Lets clients revalidate with If-None-Match and get a 304 instead of the body
+IF_NONE_MATCH = Header(None, alias="If-None-Match", include_in_schema=False)
+
+
+async def _run_batch_analysis(tickers: List[str]) -> BatchAnalysisResponse:
+   """Analyzes tickers concurrently, bounded by BATCH_MAX_CONCURRENCY, collecting per-ticker failures."""
+   request_priority.set(PRIORITY_BATCH)
+   missing = [symbol for symbol in tickers if result_store.get(symbol) is None]
+   # One multi-symbol price download for the whole batch instead of one per ticker
+   await asyncio.gather(fundamentals.prefetch(missing), prefetch_history(missing))
+   semaphore = asyncio.Semaphore(max(1, settings.BATCH_MAX_CONCURRENCY))
+
+   async def analyze_one(symbol: str) -> TickerAnalysisResult:
+       async with semaphore:
+           try:
+               analysis, _, _ = await precompute_scheduler.get_analysis(symbol)
+               return TickerAnalysisResult(ticker=symbol, status="ok", analysis=analysis)
+           except HTTPException as e:
+               return TickerAnalysisResult(ticker=symbol, status="error", error=str(e.detail), status_code=e.status_code)
+           except Exception as e:
+               return TickerAnalysisResult(ticker=symbol, status="error", error=str(e), status_code=500)
+
+   results = await asyncio.gather(*(analyze_one(symbol) for symbol in tickers))
+   succeeded = sum(1 for result in results if result.status == "ok")
+   return BatchAnalysisResponse(results=list(results), succeeded=succeeded, failed=len(results) - succeeded)
+
+
+def _batch_page(name: str, prefix: str, offset: int, limit: Optional[int]) -> List[str]:
+   """One page of a portfolio for the batch paths, at most BATCH_MAX_TICKERS long."""
+   limit = settings.BATCH_MAX_TICKERS if limit is None else min(limit, settings.BATCH_MAX_TICKERS)
+   return portfolio_store.get(name).search(prefix, offset, limit)[1]
+
+
 @router.get("/portfolio", response_model=List[str], tags=["Portfolio"])
-async def get_portfolio():
-   """Reads tickers from portfolio.txt, de-duplicates, and sorts them."""
-   default_portfolio = ["AAPL", "GOOGL", "MSFT", "NVDA", "TSLA"]
-   if not os.path.exists("portfolio.txt"):
-       return sorted(default_portfolio)
-   try:
-       with open("portfolio.txt", "r") as f:
-           tickers = {line.strip().upper() for line in f if line.strip()}
-           return sorted(list(tickers)) if tickers else sorted(default_portfolio)
-   except Exception as e:
-       return sorted(default_portfolio)
+async def get_portfolio(
+   name: str = DEFAULT_NAME,
+   prefix: str = "",
+   offset: int = Query(0, ge=0),
+   limit: Optional[int] = Query(None, ge=1),
+   if_none_match: Optional[str] = IF_NONE_MATCH,
+):
+   """Returns a portfolio's sorted tickers (portfolio.txt by default), optionally filtered by prefix and paged.
+
+   The number of matching tickers is in the X-Total-Count header.
+   """
+   portfolio = portfolio_store.get(name)
+   etag = derived_etag("list", portfolio.digest, prefix.upper(), str(offset), str(limit))
+   # Revalidation needs neither the search nor the serialization; the 304 carries no X-Total-Count
+   response = not_modified(etag, if_none_match)
+   if response is not None:
+       return response
+   total, tickers = portfolio.search(prefix, offset, limit)
+   return conditional_response(dumps(tickers), etag, None, {"X-Total-Count": str(total)})
+
+
+@router.get("/portfolio/analysis", response_model=BatchAnalysisResponse, tags=["Portfolio"])
+async def analyze_portfolio(
+   name: str = DEFAULT_NAME,
+   prefix: str = "",
+   offset: int = Query(0, ge=0),
+   limit: Optional[int] = Query(None, ge=1),
+   if_none_match: Optional[str] = IF_NONE_MATCH,
+):
+   """Analyzes a page of a portfolio's tickers (up to BATCH_MAX_TICKERS) concurrently."""
+   result = await _run_batch_analysis(_batch_page(name, prefix, offset, limit))
+   return json_response(result.model_dump_json().encode("utf-8"), if_none_match)
+
+
+@router.get("/portfolio/stream", tags=["Portfolio"])
+async def stream_portfolio(
+   name: str = DEFAULT_NAME,
+   prefix: str = "",
+   offset: int = Query(0, ge=0),
+   limit: Optional[int] = Query(None, ge=1),
+):
+   """Streams Server-Sent Events for a page of a portfolio's tickers, interleaved as each agent finishes."""
+   tickers = _batch_page(name, prefix, offset, limit)
+   return StreamingResponse(stream_analyses(tickers, include_ticker=True), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+@router.get("/portfolios", response_model=List[PortfolioSummary], tags=["Portfolio"])
+async def list_portfolios():
+   """Lists the named portfolios and their sizes."""
+   return [
+       PortfolioSummary(name=name, size=len(portfolio), loaded_at=portfolio.loaded_at)
+       for name, portfolio in ((name, portfolio_store.get(name)) for name in portfolio_store.names())
+   ]
+
+
+@router.get("/portfolios/{name}", response_model=PortfolioPage, tags=["Portfolio"])
+async def get_named_portfolio(
+   name: str,
+   prefix: str = "",
+   offset: int = Query(0, ge=0),
+   limit: int = Query(100, ge=1),
+   if_none_match: Optional[str] = IF_NONE_MATCH,
+):
+   """Returns one page of a named portfolio, optionally filtered by ticker prefix."""
+   limit = min(limit, settings.PORTFOLIO_PAGE_MAX)
+   portfolio = portfolio_store.get(name)
+   etag = derived_etag("page", portfolio.name, portfolio.digest, prefix.upper(), str(offset), str(limit))
+   # Revalidation needs neither the search nor the serialization
+   response = not_modified(etag, if_none_match)
+   if response is not None:
+       return response
+   total, tickers = portfolio.search(prefix, offset, limit)
+   page = PortfolioPage(name=portfolio.name, total=total, offset=offset, limit=limit, prefix=prefix.upper(), tickers=tickers)
+   return conditional_response(page.model_dump_json().encode("utf-8"), etag, None)
+
+
+@router.get("/portfolios/{name}/contains/{ticker_symbol}", response_model=PortfolioMembership, tags=["Portfolio"])
+async def portfolio_contains(name: str, ticker_symbol: str):
+   """Checks whether a ticker is in a named portfolio."""
+   portfolio = portfolio_store.get(name)
+   return PortfolioMembership(portfolio=portfolio.name, ticker=ticker_symbol.upper(), member=ticker_symbol in portfolio)
+
+
+@router.post("/analyze/batch", response_model=BatchAnalysisResponse, tags=["Analysis"])
+async def analyze_batch(request: BatchAnalysisRequest):
+   """Analyzes a list of tickers concurrently, reporting failures per ticker."""
+   tickers = list(dict.fromkeys(t.strip().upper() for t in request.tickers if t.strip()))
+   if not tickers:
+       raise HTTPException(status_code=400, detail="At least one ticker is required.")
+   if len(tickers) > settings.BATCH_MAX_TICKERS:
+       raise HTTPException(status_code=400, detail=f"A batch may contain at most {settings.BATCH_MAX_TICKERS} tickers.")
+   result = await _run_batch_analysis(tickers)
+   return Response(result.model_dump_json().encode("utf-8"), media_type="application/json")
 
 
 @router.get("/analyze/{ticker_symbol}", response_model=StockAnalysis, tags=["Analysis"])
-async def analyze_stock(ticker_symbol: str):
-   """Performs a full analysis (fundamental, technical, sentiment) for a given stock ticker."""
+async def analyze_stock(
+   ticker_symbol: str,
+   trace_mode: Optional[str] = Query(None, alias="trace", description='"1" for Server-Timing headers, "json" to add the span tree'),
+   trace_header: Optional[str] = Header(None, alias="X-Trace", include_in_schema=False),
+   if_none_match: Optional[str] = IF_NONE_MATCH,
+):
+   """Performs a full analysis (fundamental, technical, sentiment) for a given stock ticker.
+
+   Stored results are served immediately with an Age header; stale ones are refreshed in the background.
+   The body is encoded once when the analysis is stored and carries a strong ETag, so a client
+   revalidating with If-None-Match gets a 304 until the analysis changes.
+   With ?trace=1 (or an X-Trace: 1 header) the response carries a Server-Timing header per span;
+   with trace=json the body becomes {"analysis": ..., "trace": <span tree>}.
+   """
+   mode = (trace_mode or trace_header or "").lower()
+   if not settings.TRACING_ENABLED or mode in ("", "0", "false"):
+       return _analysis_response(*await _analyze(ticker_symbol), if_none_match)
+   status = "error"
+   with trace("analyze", ticker=ticker_symbol.upper()) as root:
+       try:
+           stored, status = await _analyze(ticker_symbol)
+       finally:
+           root.set(status=status)
+   if mode != "json":
+       return _analysis_response(stored, status, if_none_match, {"Server-Timing": server_timing(root)})
+   return FastJSONResponse(
+       {"analysis": stored.analysis.model_dump(mode="json"), "trace": root.to_dict()},
+       headers={"Age": str(int(stored.age)), "X-Analysis-Status": status, "Server-Timing": server_timing(root)},
+   )
+
+
+async def _analyze(ticker_symbol: str) -> Tuple[StoredAnalysis, str]:
    try:
-       ticker = yf.Ticker(ticker_symbol)
-       if not ticker.info.get('longName'):
-           raise HTTPException(status_code=404, detail=f"Ticker '{ticker_symbol}' not found.")
-
-       fundamental_data = await fundament_agent(ticker)
-       technical_data = await technical_agent(ticker)
-       sentiment_data = await sentiment_agent(ticker_symbol, fundamental_data.company_name)
-       final_rec_data = await recommendation_agent(fundamental_data, technical_data, sentiment_data)
-
-       return StockAnalysis(
-           ticker=ticker_symbol.upper(),
-           fundamental=fundamental_data,
-           technical=technical_data,
-           sentiment=sentiment_data,
-           final_recommendation=final_rec_data
-       )
+       return await precompute_scheduler.get_stored(ticker_symbol)
    except HTTPException as e:
        raise e
    except Exception as e:
        raise HTTPException(status_code=500, detail=f"An unexpected error occurred for {ticker_symbol}: {e}")
 
 
+def _analysis_response(stored: StoredAnalysis, status: str, if_none_match: Optional[str],
+                      headers: Optional[Dict[str, str]] = None) -> Response:
+   headers = {**(headers or {}), "Age": str(int(stored.age)), "X-Analysis-Status": status}
+   return conditional_response(stored.body, stored.etag, if_none_match, headers)
+
+
+@router.get("/analyze/{ticker_symbol}/stream", tags=["Analysis"])
+async def stream_stock_analysis(ticker_symbol: str):
+   """Streams Server-Sent Events with each agent's result for a ticker as soon as it finishes."""
+   return StreamingResponse(stream_analyses([ticker_symbol]), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
 @router.get("/undervalued-stocks", response_model=List[UndervaluedStock], tags=["Discovery"])
-async def get_undervalued_stocks():
-    """Returns a list of potentially undervalued stocks based on AI analysis."""
+async def get_undervalued_stocks(portfolio: Optional[str] = None, limit: Optional[int] = Query(None, ge=1, le=100)):
+    """Returns the stocks a local DCF and relative-value screen ranks as most undervalued.
+
+    The universe is one portfolio, or SCREENER_PORTFOLIOS by default; the LLM only writes the reasons.
+    """
     try:
-        return await find_undervalued_stocks()
+        return await find_undervalued_stocks(portfolio, limit)
+    except HTTPException as e:
+        raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get undervalued stocks: {e}")
 
 
-@router.post("/trade/buy", tags=["Trading"])
-async def trade_buy(request: TradeRequest):
-   """Simulates placing a buy order."""
-   print(f"Received BUY request for {request.ticker}")
-   return JSONResponse(content={"message": f"Your BUY order for {request.ticker} has been queued."})
+@router.get("/cache/stats", response_class=FastJSONResponse, tags=["Diagnostics"])
+async def get_cache_stats():
+   """Returns hit/miss counters for the LLM cache, price store and single-flight coalescing."""
+   return {
+       "llm": llm_cache.stats(),
+       "fundamentals": fundamentals.stats(),
+       "shared": shared_cache.stats(),
+       "price_store": price_store.stats(),
+       "history_batcher": history_batcher.stats(),
+       "indicator_state": indicator_states.stats(),
+       "rules": rule_stats.stats(),
+       "portfolios": portfolio_store.stats(),
+       "screener": screener.stats(),
+       "precompute": precompute_scheduler.stats(),
+       "orders": order_pipeline.stats(),
+       "gemini_batches": batcher_stats(),
+       "gemini_scheduler": gemini_scheduler.stats(),
+       "gemini_resilience": resilience_stats(),
+       "lazy_modules": loaded_modules(),
+       "singleflight": {
+           "analysis": analysis_flight.stats(),
+           "info": info_flight.stats(),
+           "history": history_flight.stats(),
+       },
+   }
+
+
+def _receipt(order_id: str, message: str) -> OrderReceipt:
+   order, status, reference = order_pipeline.get(order_id)
+   return OrderReceipt(
+       order_id=order.order_id, side=order.side, ticker=order.ticker, quantity=order.quantity,
+       accepted_at=order.accepted_at, status=status, broker_reference=reference, message=message,
+   )
+
+
+async def _place_order(side: str, request: TradeRequest, idempotency_key: Optional[str]) -> OrderReceipt:
+   order, duplicate = await order_pipeline.submit(side, request.ticker, request.quantity, request.idempotency_key or idempotency_key)
+   verb = "was already" if duplicate else "has been"
+   return _receipt(order.order_id, f"Your {side.upper()} order for {order.quantity} {order.ticker} {verb} queued.")
+
+
+@router.post("/trade/buy", response_model=OrderReceipt, status_code=202, tags=["Trading"])
+async def trade_buy(request: TradeRequest, idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
+   """Queues a buy order; it is durably logged before this returns and sent to the broker in the background.
+
+   Repeating a request with the same idempotency key (body field or Idempotency-Key header) returns the original order.
+   """
+   return await _place_order("buy", request, idempotency_key)
+
+
+@router.post("/trade/sell", response_model=OrderReceipt, status_code=202, tags=["Trading"])
+async def trade_sell(request: TradeRequest, idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
+   """Queues a sell order; it is durably logged before this returns and sent to the broker in the background.
+
+   Repeating a request with the same idempotency key (body field or Idempotency-Key header) returns the original order.
+   """
+   return await _place_order("sell", request, idempotency_key)
 
 
-@router.post("/trade/sell", tags=["Trading"])
-async def trade_sell(request: TradeRequest):
-   """Simulates placing a sell order."""
-   print(f"Received SELL request for {request.ticker}")
-   return JSONResponse(content={"message": f"Your SELL order for {request.ticker} has been queued."})
\ No newline at end of file
+@router.get("/trade/orders/{order_id}", response_model=OrderReceipt, tags=["Trading"])
+async def get_order(order_id: str):
+   """Returns an order's status: queued (not yet logged), pending (logged, not yet at the broker) or sent."""
+   order, status, _ = order_pipeline.get(order_id)
+   return _receipt(order_id, f"{order.side.upper()} {order.quantity} {order.ticker}: {status}.")
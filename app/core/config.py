@@ -7,6 +7,192 @@ load_dotenv()
 
 class Settings:
    API_KEY: str = os.getenv("GEMINI_API_KEY")
-   GEMINI_API_URL: str = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={API_KEY}"
+   GEMINI_MODEL: str = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+   # Point this at a local stand-in (e.g. http://127.0.0.1:9000) to run without the real API
+   GEMINI_API_BASE: str = os.getenv("GEMINI_API_BASE", "https://generativelanguage.googleapis.com").rstrip("/")
+   GEMINI_API_URL: str = f"{GEMINI_API_BASE}/v1beta/models/{GEMINI_MODEL}:generateContent?key={API_KEY}"
+
+   # Pooled HTTP client for Gemini calls
+   GEMINI_MAX_CONNECTIONS: int = int(os.getenv("GEMINI_MAX_CONNECTIONS", "32"))
+   GEMINI_MAX_KEEPALIVE: int = int(os.getenv("GEMINI_MAX_KEEPALIVE", "16"))
+   GEMINI_KEEPALIVE_EXPIRY: float = float(os.getenv("GEMINI_KEEPALIVE_EXPIRY", "30"))
+   GEMINI_CONNECT_TIMEOUT: float = float(os.getenv("GEMINI_CONNECT_TIMEOUT", "5"))
+   GEMINI_READ_TIMEOUT: float = float(os.getenv("GEMINI_READ_TIMEOUT", "20"))
+   GEMINI_POOL_TIMEOUT: float = float(os.getenv("GEMINI_POOL_TIMEOUT", "10"))
+
+   # Outbound Gemini scheduling: token bucket for the quota, AIMD for concurrency
+   GEMINI_RATE_PER_SECOND: float = float(os.getenv("GEMINI_RATE_PER_SECOND", "5"))
+   GEMINI_RATE_BURST: float = float(os.getenv("GEMINI_RATE_BURST", "10"))
+   GEMINI_CONCURRENCY_INITIAL: float = float(os.getenv("GEMINI_CONCURRENCY_INITIAL", "8"))
+   GEMINI_CONCURRENCY_MIN: float = float(os.getenv("GEMINI_CONCURRENCY_MIN", "1"))
+   GEMINI_CONCURRENCY_MAX: float = float(os.getenv("GEMINI_CONCURRENCY_MAX", "32"))
+   GEMINI_AIMD_COOLDOWN_SECONDS: float = float(os.getenv("GEMINI_AIMD_COOLDOWN_SECONDS", "1"))
+   GEMINI_THROTTLE_PAUSE_SECONDS: float = float(os.getenv("GEMINI_THROTTLE_PAUSE_SECONDS", "1"))
+   GEMINI_MAX_RETRIES: int = int(os.getenv("GEMINI_MAX_RETRIES", "2"))
+
+   # Tail latency: hedge a slow call after the recent p95, and open a circuit breaker on sustained errors
+   GEMINI_HEDGE_ENABLED: bool = os.getenv("GEMINI_HEDGE_ENABLED", "true").lower() == "true"
+   GEMINI_HEDGE_PERCENTILE: float = float(os.getenv("GEMINI_HEDGE_PERCENTILE", "95"))
+   GEMINI_HEDGE_DEFAULT_DELAY: float = float(os.getenv("GEMINI_HEDGE_DEFAULT_DELAY", "3"))
+   GEMINI_HEDGE_MIN_DELAY: float = float(os.getenv("GEMINI_HEDGE_MIN_DELAY", "0.25"))
+   GEMINI_HEDGE_MAX_RATIO: float = float(os.getenv("GEMINI_HEDGE_MAX_RATIO", "0.1"))
+   GEMINI_LATENCY_WINDOW: int = int(os.getenv("GEMINI_LATENCY_WINDOW", "200"))
+   GEMINI_BREAKER_WINDOW: int = int(os.getenv("GEMINI_BREAKER_WINDOW", "20"))
+   GEMINI_BREAKER_MIN_CALLS: int = int(os.getenv("GEMINI_BREAKER_MIN_CALLS", "10"))
+   GEMINI_BREAKER_ERROR_RATE: float = float(os.getenv("GEMINI_BREAKER_ERROR_RATE", "0.5"))
+   GEMINI_BREAKER_OPEN_SECONDS: float = float(os.getenv("GEMINI_BREAKER_OPEN_SECONDS", "30"))
+
+   # Merge per-ticker classification prompts arriving within a short window into one call
+   GEMINI_BATCH_ENABLED: bool = os.getenv("GEMINI_BATCH_ENABLED", "true").lower() == "true"
+   GEMINI_BATCH_WINDOW_MS: float = float(os.getenv("GEMINI_BATCH_WINDOW_MS", "20"))
+   GEMINI_BATCH_MAX_ITEMS: int = int(os.getenv("GEMINI_BATCH_MAX_ITEMS", "8"))
+
+   # LLM response cache (in-memory LRU in front of SQLite)
+   LLM_CACHE_ENABLED: bool = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+   LLM_CACHE_PATH: str = os.getenv("LLM_CACHE_PATH", ".cache/llm_cache.sqlite3")
+   LLM_CACHE_MEMORY_ENTRIES: int = int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "1024"))
+   LLM_CACHE_DISK_ENTRIES: int = int(os.getenv("LLM_CACHE_DISK_ENTRIES", "50000"))
+   # Expired entries are kept this long to answer while the Gemini circuit breaker is open
+   LLM_CACHE_STALE_GRACE_SECONDS: float = float(os.getenv("LLM_CACHE_STALE_GRACE_SECONDS", "86400"))
+   # Seconds per agent type; 0 disables caching for that agent
+   LLM_CACHE_TTLS: dict = {
+       "fundamental": float(os.getenv("LLM_CACHE_TTL_FUNDAMENTAL", "21600")),
+       "technical": float(os.getenv("LLM_CACHE_TTL_TECHNICAL", "900")),
+       "sentiment": float(os.getenv("LLM_CACHE_TTL_SENTIMENT", "3600")),
+       "recommendation": float(os.getenv("LLM_CACHE_TTL_RECOMMENDATION", "900")),
+       "undervalued": float(os.getenv("LLM_CACHE_TTL_UNDERVALUED", "3600")),
+       "default": float(os.getenv("LLM_CACHE_TTL_DEFAULT", "600")),
+   }
+
+   # Cache tier shared by all worker processes on a host: "sqlite", or "none" for a single worker
+   SHARED_CACHE_BACKEND: str = os.getenv("SHARED_CACHE_BACKEND", "sqlite").lower()
+   SHARED_CACHE_PATH: str = os.getenv("SHARED_CACHE_PATH", ".cache/shared_cache.sqlite3")
+   SHARED_CACHE_MAX_ENTRIES: int = int(os.getenv("SHARED_CACHE_MAX_ENTRIES", "20000"))
+   # A worker filling a key holds it this long before another may take over
+   SHARED_CACHE_LEASE_SECONDS: float = float(os.getenv("SHARED_CACHE_LEASE_SECONDS", "60"))
+   SHARED_CACHE_POLL_MS: float = float(os.getenv("SHARED_CACHE_POLL_MS", "20"))
+
+   # Market data source: "yfinance", or "standin" for synthetic data with injected latency (load tests)
+   MARKET_DATA_SOURCE: str = os.getenv("MARKET_DATA_SOURCE", "yfinance").lower()
+   STANDIN_MARKET_LATENCY_MS: float = float(os.getenv("STANDIN_MARKET_LATENCY_MS", "150"))
+   STANDIN_MARKET_LATENCY_SIGMA: float = float(os.getenv("STANDIN_MARKET_LATENCY_SIGMA", "0.5"))
+   STANDIN_MARKET_TAIL_RATE: float = float(os.getenv("STANDIN_MARKET_TAIL_RATE", "0.02"))
+   STANDIN_MARKET_TAIL_MS: float = float(os.getenv("STANDIN_MARKET_TAIL_MS", "1500"))
+   STANDIN_MARKET_FAULT_RATE: float = float(os.getenv("STANDIN_MARKET_FAULT_RATE", "0"))
+
+   # Incremental on-disk OHLCV store
+   PRICE_STORE_ENABLED: bool = os.getenv("PRICE_STORE_ENABLED", "true").lower() == "true"
+   PRICE_STORE_DIR: str = os.getenv("PRICE_STORE_DIR", ".cache/prices")
+   PRICE_STORE_REFRESH_SECONDS: float = float(os.getenv("PRICE_STORE_REFRESH_SECONDS", "300"))
+   PRICE_STORE_RETAIN_DAYS: int = int(os.getenv("PRICE_STORE_RETAIN_DAYS", "400"))
+
+   # Price history requests that arrive together are grouped into multi-symbol downloads; a group is
+   # sent once it has been idle for the window, after the max wait, or when it reaches max symbols
+   HISTORY_BULK_ENABLED: bool = os.getenv("HISTORY_BULK_ENABLED", "true").lower() == "true"
+   HISTORY_BULK_WINDOW_MS: float = float(os.getenv("HISTORY_BULK_WINDOW_MS", "25"))
+   HISTORY_BULK_MAX_WAIT_MS: float = float(os.getenv("HISTORY_BULK_MAX_WAIT_MS", "250"))
+   HISTORY_BULK_MAX_SYMBOLS: int = int(os.getenv("HISTORY_BULK_MAX_SYMBOLS", "100"))
+   HISTORY_BULK_THREADS: int = int(os.getenv("HISTORY_BULK_THREADS", "8"))
+
+   # Incremental indicator state per ticker
+   INDICATOR_STATE_ENABLED: bool = os.getenv("INDICATOR_STATE_ENABLED", "true").lower() == "true"
+   INDICATOR_STATE_DIR: str = os.getenv("INDICATOR_STATE_DIR", ".cache/indicator_state")
+
+   # Fundamentals (ticker.info) snapshot cache
+   FUNDAMENTALS_TTL_SECONDS: float = float(os.getenv("FUNDAMENTALS_TTL_SECONDS", "3600"))
+   FUNDAMENTALS_NEGATIVE_TTL_SECONDS: float = float(os.getenv("FUNDAMENTALS_NEGATIVE_TTL_SECONDS", "900"))
+   FUNDAMENTALS_MAX_ENTRIES: int = int(os.getenv("FUNDAMENTALS_MAX_ENTRIES", "5000"))
+   FUNDAMENTALS_PREFETCH_CONCURRENCY: int = int(os.getenv("FUNDAMENTALS_PREFETCH_CONCURRENCY", "16"))
+
+   # Rule-based fast path; the bands mark how close to a threshold still counts as ambiguous
+   RULES_ENABLED: bool = os.getenv("RULES_ENABLED", "true").lower() == "true"
+   RULES_MIN_SIGNALS: int = int(os.getenv("RULES_MIN_SIGNALS", "2"))
+   RULES_PE_THRESHOLD: float = float(os.getenv("RULES_PE_THRESHOLD", "30"))
+   RULES_PE_BAND: float = float(os.getenv("RULES_PE_BAND", "2"))
+   RULES_GROWTH_THRESHOLD: float = float(os.getenv("RULES_GROWTH_THRESHOLD", "5"))
+   RULES_GROWTH_BAND: float = float(os.getenv("RULES_GROWTH_BAND", "1"))
+   RULES_TARGET_BAND: float = float(os.getenv("RULES_TARGET_BAND", "0.03"))
+   RULES_RSI_OVERBOUGHT: float = float(os.getenv("RULES_RSI_OVERBOUGHT", "70"))
+   RULES_RSI_OVERSOLD: float = float(os.getenv("RULES_RSI_OVERSOLD", "30"))
+   RULES_RSI_BAND: float = float(os.getenv("RULES_RSI_BAND", "3"))
+   RULES_ADX_THRESHOLD: float = float(os.getenv("RULES_ADX_THRESHOLD", "25"))
+   RULES_ADX_BAND: float = float(os.getenv("RULES_ADX_BAND", "3"))
+   RULES_EMA_BAND: float = float(os.getenv("RULES_EMA_BAND", "0.01"))
+
+   # Analysis pipeline deadlines, in seconds
+   PIPELINE_DEADLINE_SECONDS: float = float(os.getenv("PIPELINE_DEADLINE_SECONDS", "30"))
+   PIPELINE_STAGE_TIMEOUTS: dict = {
+       "fundamental": float(os.getenv("PIPELINE_TIMEOUT_FUNDAMENTAL", "15")),
+       "technical": float(os.getenv("PIPELINE_TIMEOUT_TECHNICAL", "15")),
+       "sentiment": float(os.getenv("PIPELINE_TIMEOUT_SENTIMENT", "15")),
+       "recommendation": float(os.getenv("PIPELINE_TIMEOUT_RECOMMENDATION", "15")),
+   }
+
+   # Portfolios: portfolio.txt is "default"; each <name>.txt in PORTFOLIO_DIR is another one
+   PORTFOLIO_FILE: str = os.getenv("PORTFOLIO_FILE", "portfolio.txt")
+   PORTFOLIO_DIR: str = os.getenv("PORTFOLIO_DIR", "portfolios")
+   PORTFOLIO_WATCH_SECONDS: float = float(os.getenv("PORTFOLIO_WATCH_SECONDS", "2"))
+   PORTFOLIO_PAGE_MAX: int = int(os.getenv("PORTFOLIO_PAGE_MAX", "1000"))
+
+   # Background precompute of portfolio analyses, served stale-while-revalidate
+   PRECOMPUTE_ENABLED: bool = os.getenv("PRECOMPUTE_ENABLED", "true").lower() == "true"
+   PRECOMPUTE_INTERVAL_SECONDS: float = float(os.getenv("PRECOMPUTE_INTERVAL_SECONDS", "300"))
+   PRECOMPUTE_JITTER: float = float(os.getenv("PRECOMPUTE_JITTER", "0.1"))  # fraction of the interval
+   PRECOMPUTE_CONCURRENCY: int = int(os.getenv("PRECOMPUTE_CONCURRENCY", "4"))
+   PRECOMPUTE_STALE_SECONDS: float = float(os.getenv("PRECOMPUTE_STALE_SECONDS", "300"))
+   # Comma-separated portfolio names to keep warm, or "*" for all of them
+   PRECOMPUTE_PORTFOLIOS: str = os.getenv("PRECOMPUTE_PORTFOLIOS", "default")
+   RESULT_STORE_MAX_ENTRIES: int = int(os.getenv("RESULT_STORE_MAX_ENTRIES", "2000"))
+
+   # Undervalued-stock screener: two-stage DCF plus P/E relative to the universe median
+   # Comma-separated portfolio names to screen, or "*" for all of them
+   SCREENER_PORTFOLIOS: str = os.getenv("SCREENER_PORTFOLIOS", "*")
+   SCREENER_TOP_N: int = int(os.getenv("SCREENER_TOP_N", "5"))
+   SCREENER_DISCOUNT_RATE: float = float(os.getenv("SCREENER_DISCOUNT_RATE", "0.09"))
+   SCREENER_TERMINAL_GROWTH: float = float(os.getenv("SCREENER_TERMINAL_GROWTH", "0.025"))
+   SCREENER_YEARS: int = int(os.getenv("SCREENER_YEARS", "5"))
+   SCREENER_GROWTH_CAP: float = float(os.getenv("SCREENER_GROWTH_CAP", "0.25"))
+   SCREENER_DCF_WEIGHT: float = float(os.getenv("SCREENER_DCF_WEIGHT", "0.7"))
+   SCREENER_RELATIVE_WEIGHT: float = float(os.getenv("SCREENER_RELATIVE_WEIGHT", "0.3"))
+   SCREENER_TABLE_TTL_SECONDS: float = float(os.getenv("SCREENER_TABLE_TTL_SECONDS", "3600"))
+   # Tables kept for distinct universes (?portfolio=...); the least recently screened is dropped first
+   SCREENER_MAX_TABLES: int = int(os.getenv("SCREENER_MAX_TABLES", "16"))
+   # Ask the LLM to phrase the reasons for the ranked list; off uses templated reasons
+   SCREENER_LLM_REASONS: bool = os.getenv("SCREENER_LLM_REASONS", "true").lower() == "true"
+
+   # Trade orders: queued, group-committed to a local write-ahead log, then sent to the broker in batches
+   ORDER_WAL_PATH: str = os.getenv("ORDER_WAL_PATH", ".cache/orders.wal")
+   ORDER_WAL_FSYNC: bool = os.getenv("ORDER_WAL_FSYNC", "true").lower() == "true"
+   ORDER_WAL_MAX_BATCH: int = int(os.getenv("ORDER_WAL_MAX_BATCH", "512"))
+   ORDER_WAL_COMPACT_BYTES: int = int(os.getenv("ORDER_WAL_COMPACT_BYTES", str(64 * 1024 * 1024)))
+   ORDER_QUEUE_MAX: int = int(os.getenv("ORDER_QUEUE_MAX", "10000"))
+   # "stub", or "package.module:ClassName" for a BrokerAdapter subclass
+   ORDER_BROKER: str = os.getenv("ORDER_BROKER", "stub")
+   ORDER_BROKER_BATCH: int = int(os.getenv("ORDER_BROKER_BATCH", "100"))
+   ORDER_BROKER_RETRY_SECONDS: float = float(os.getenv("ORDER_BROKER_RETRY_SECONDS", "1"))
+   ORDER_IDEMPOTENCY_TTL_SECONDS: float = float(os.getenv("ORDER_IDEMPOTENCY_TTL_SECONDS", "86400"))
+   STANDIN_BROKER_LATENCY_MS: float = float(os.getenv("STANDIN_BROKER_LATENCY_MS", "5"))
+
+   # Import yfinance/pandas/numpy at startup: "background" (after the app is up), "blocking" (before it
+   # accepts requests) or "off" (on the first request that needs them)
+   STARTUP_WARMUP: str = os.getenv("STARTUP_WARMUP", "background").lower()
+
+   # Response compression: brotli when accepted, else gzip; bodies under the minimum are sent as-is
+   COMPRESSION_ENABLED: bool = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+   COMPRESSION_MIN_BYTES: int = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+   COMPRESSION_GZIP_LEVEL: int = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+   COMPRESSION_BROTLI_QUALITY: int = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "5"))
+
+   # Prometheus metrics at /metrics
+   METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+   # Per-request tracing (?trace=1 or an X-Trace header); off disables it for every request
+   TRACING_ENABLED: bool = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+
+   # Batch analysis fan-out. Outbound Gemini calls are bounded by the scheduler above (AIMD between
+   # GEMINI_CONCURRENCY_MIN and _MAX), so this only caps tickers in flight per batch: 16 runs the bundled
+   # 12-ticker portfolio in one wave, which also lets each agent's prompts merge into full batches.
+   BATCH_MAX_CONCURRENCY: int = int(os.getenv("BATCH_MAX_CONCURRENCY", "16"))
+   BATCH_MAX_TICKERS: int = int(os.getenv("BATCH_MAX_TICKERS", "50"))
 
 settings = Settings()
\ No newline at end of file
@@ -0,0 +1,58 @@
+# app/core/lazy.py
+"""Deferred imports for the heavy data libraries (yfinance, pandas, numpy).
+
+lazy_module("pandas") returns a stand-in module that imports the real one on its first attribute
+access, so importing the app, and serving requests that never touch market data, does not pay
+for them. Modules using these stand-ins have `from __future__ import annotations` so that type
+hints such as pd.DataFrame are not evaluated at import time.
+"""
+import importlib
+import sys
+import time
+import types
+from typing import Dict
+
+
+class LazyModule(types.ModuleType):
+   """Module stand-in that imports its target on first use and then caches each attribute it hands out."""
+
+   def _load(self) -> types.ModuleType:
+       module = self.__dict__.get("_target")
+       if module is None:
+           # import_module holds the import lock, so concurrent first uses from worker threads are safe
+           module = self.__dict__["_target"] = importlib.import_module(self.__name__)
+       return module
+
+   def __getattr__(self, attr: str):
+       value = getattr(self._load(), attr)
+       self.__dict__[attr] = value
+       return value
+
+   def __dir__(self):
+       return dir(self._load())
+
+
+_lazy_modules: Dict[str, LazyModule] = {}
+
+
+def lazy_module(name: str) -> LazyModule:
+   """Returns the shared stand-in for module name."""
+   module = _lazy_modules.get(name)
+   if module is None:
+       module = _lazy_modules[name] = LazyModule(name)
+   return module
+
+
+def loaded_modules() -> Dict[str, bool]:
+   """Whether each deferred module has been imported yet."""
+   return {name: name in sys.modules for name in sorted(_lazy_modules)}
+
+
+def preload() -> Dict[str, float]:
+   """Imports every deferred module now; returns seconds spent per module. Blocking."""
+   timings = {}
+   for name, module in sorted(_lazy_modules.items()):
+       started = time.perf_counter()
+       module._load()
+       timings[name] = round(time.perf_counter() - started, 4)
+   return timings
\ No newline at end of file
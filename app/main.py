@@ -1,15 +1,59 @@
 # app/main.py
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 
 from app.api.endpoints import router as api_router
+from app.services.gemini_client import close_http_client
+from app.core.config import settings
+from app.core.lazy import preload
+from app.services.llm_cache import llm_cache
+from app.services.metrics import MetricsMiddleware, render
+from app.services.orders import order_pipeline
+from app.services.portfolio import portfolio_store
+from app.services.precompute import precompute_scheduler
+from app.services.responses import CompressionMiddleware
+from app.services.shared_cache import shared_cache
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+   """Owns app-lifetime resources: the order pipeline, the portfolio watcher, the precompute scheduler,
+   the pooled Gemini HTTP client, the LLM cache and the shared cache.
+
+   The heavy data libraries are imported lazily; STARTUP_WARMUP decides whether they are loaded
+   before the app takes requests, in the background once it does, or on first use.
+   """
+   warmup = None
+   if settings.STARTUP_WARMUP == "blocking":
+       print(f"Preloaded data libraries: {await asyncio.to_thread(preload)}")
+   elif settings.STARTUP_WARMUP == "background":
+       warmup = asyncio.create_task(asyncio.to_thread(preload))
+   await order_pipeline.start()
+   portfolio_store.refresh()
+   portfolio_store.start()
+   if settings.PRECOMPUTE_ENABLED:
+       precompute_scheduler.start()
+   yield
+   await precompute_scheduler.stop()
+   await portfolio_store.stop()
+   await order_pipeline.stop()
+   await close_http_client()
+   llm_cache.close()
+   shared_cache.close()
+   if warmup is not None:
+       await asyncio.gather(warmup, return_exceptions=True)
+
 
 app = FastAPI(
    title="AI Stock Screener API",
    description="An API that uses yfinance and AI to provide stock analysis and recommendations.",
    version="1.1.2",
+   lifespan=lifespan,
 )
 
 # Mount the static directory to serve index.html
@@ -24,6 +68,17 @@ app.add_middleware(
    allow_headers=["*"],
 )
 
+if settings.COMPRESSION_ENABLED:
+   app.add_middleware(
+       CompressionMiddleware,
+       minimum_size=settings.COMPRESSION_MIN_BYTES,
+       gzip_level=settings.COMPRESSION_GZIP_LEVEL,
+       brotli_quality=settings.COMPRESSION_BROTLI_QUALITY,
+   )
+
+if settings.METRICS_ENABLED:
+   app.add_middleware(MetricsMiddleware)
+
 # Include the API router
 app.include_router(api_router, prefix="/api")
 
@@ -32,5 +87,11 @@ async def read_index():
    """Serves the main index.html file."""
    return "static/index.html"
 
+if settings.METRICS_ENABLED:
+   @app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+   async def metrics():
+       """Serves the app's metrics in the Prometheus text format."""
+       return PlainTextResponse(render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 # To run the app, use the command:
 # uvicorn app.main:app --reload
\ No newline at end of file
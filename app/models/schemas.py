@@ -1,9 +1,21 @@
 # app/models/schemas.py
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional
 
 class TradeRequest(BaseModel):
    ticker: str
+   quantity: int = Field(1, gt=0)
+   idempotency_key: Optional[str] = Field(None, max_length=128)
+
+class OrderReceipt(BaseModel):
+   order_id: str
+   side: str
+   ticker: str
+   quantity: int
+   status: str
+   accepted_at: float
+   broker_reference: Optional[str] = None
+   message: str
 
 class FundamentalData(BaseModel):
    company_name: str
@@ -13,6 +25,7 @@ class FundamentalData(BaseModel):
    revenue_growth_yoy: Optional[float] = None
    forward_eps: Optional[float] = None
    recommendation: str
+   decided_by: Optional[str] = None
 
 class TechnicalData(BaseModel):
    rsi_14: Optional[float] = None
@@ -20,6 +33,7 @@ class TechnicalData(BaseModel):
    adx_14: Optional[float] = None
    price: float
    recommendation: str
+   decided_by: Optional[str] = None
 
 class SentimentData(BaseModel):
    sentiment_summary: str
@@ -36,8 +50,47 @@ class StockAnalysis(BaseModel):
    technical: TechnicalData
    sentiment: SentimentData
    final_recommendation: FinalRecommendation
+   degraded: List[str] = []
 
 class UndervaluedStock(BaseModel):
    ticker: str
    company_name: str
-   reason: str
\ No newline at end of file
+   reason: str
+   price: Optional[float] = None
+   intrinsic_value: Optional[float] = None
+   margin_of_safety: Optional[float] = None
+   pe_ratio: Optional[float] = None
+   score: Optional[float] = None
+
+class BatchAnalysisRequest(BaseModel):
+   tickers: List[str]
+
+class TickerAnalysisResult(BaseModel):
+   ticker: str
+   status: str
+   analysis: Optional[StockAnalysis] = None
+   error: Optional[str] = None
+   status_code: Optional[int] = None
+
+class BatchAnalysisResponse(BaseModel):
+   results: List[TickerAnalysisResult]
+   succeeded: int
+   failed: int
+
+class PortfolioSummary(BaseModel):
+   name: str
+   size: int
+   loaded_at: float
+
+class PortfolioPage(BaseModel):
+   name: str
+   total: int
+   offset: int
+   limit: int
+   prefix: str = ""
+   tickers: List[str]
+
+class PortfolioMembership(BaseModel):
+   portfolio: str
+   ticker: str
+   member: bool
\ No newline at end of file
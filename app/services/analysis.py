@@ -0,0 +1,117 @@
+# app/services/analysis.py
+import asyncio
+from collections import Counter, defaultdict
+from typing import Any, Dict, Set, Tuple
+
+from app.core.config import settings
+from app.models.schemas import StockAnalysis, FundamentalData, TechnicalData, SentimentData, FinalRecommendation
+from app.services.analysis_agents import (
+    fundament_agent,
+    technical_agent,
+    sentiment_agent,
+    recommendation_agent,
+    fundamental_snapshot,
+)
+from app.services.fundamentals import fundamentals
+from app.services.market_data import make_ticker
+from app.services.pipeline import Stage, run_graph
+from app.services.shared_cache import shared_cache
+from app.services.singleflight import SingleFlight
+
+analysis_flight = SingleFlight("analysis")
+
+# Queues that receive (symbol, stage, result) as each pipeline stage finishes, keyed by symbol
+_stage_listeners: Dict[str, Set[asyncio.Queue]] = defaultdict(set)
+
+
+def subscribe_stages(symbol: str, queue: asyncio.Queue) -> None:
+   """Delivers stage results for symbol's next or in-flight computation to queue."""
+   _stage_listeners[symbol.upper()].add(queue)
+
+
+def unsubscribe_stages(symbol: str, queue: asyncio.Queue) -> None:
+   listeners = _stage_listeners.get(symbol.upper())
+   if listeners is not None:
+       listeners.discard(queue)
+       if not listeners:
+           del _stage_listeners[symbol.upper()]
+
+
+def _publish_stage(symbol: str, stage: str, result: Any) -> None:
+   for queue in list(_stage_listeners.get(symbol, ())):
+       queue.put_nowait((symbol, stage, result))
+
+
+async def run_analysis(ticker_symbol: str) -> Tuple[StockAnalysis, float]:
+   """Runs the analysis pipeline, sharing one computation between concurrent requests for a ticker.
+
+   Results are shared between worker processes through the shared cache tier for
+   PRECOMPUTE_STALE_SECONDS (degraded ones are not shared). Returns (analysis, computed_at).
+   """
+   symbol = ticker_symbol.upper()
+
+   async def compute() -> Tuple[bytes, float]:
+       analysis = await compute_analysis(symbol)
+       ttl = 0.0 if analysis.degraded else settings.PRECOMPUTE_STALE_SECONDS
+       return analysis.model_dump_json().encode("utf-8"), ttl
+
+   async def load() -> Tuple[StockAnalysis, float]:
+       entry = await shared_cache.get_or_compute(f"analysis:{symbol}", compute)
+       return StockAnalysis.model_validate_json(entry.value), entry.stored_at
+
+   return await analysis_flight.do(symbol, load)
+
+
+def _majority_recommendation(results: dict) -> FinalRecommendation:
+   votes = Counter(results[name].recommendation for name in ("fundamental", "technical", "sentiment") if name in results)
+   verdict, count = votes.most_common(1)[0] if votes else ("HOLD", 0)
+   if count < 2:
+       verdict = "HOLD"
+   return FinalRecommendation(
+       overall_recommendation=verdict,
+       overall_reasoning="The final review did not finish in time; this is the majority of the individual signals.",
+   )
+
+
+async def compute_analysis(ticker_symbol: str) -> StockAnalysis:
+   """Runs the fundamental, technical, sentiment and recommendation agents for one ticker.
+
+   The first three stages run concurrently and the recommendation starts once they finish. A stage
+   that misses its timeout or the overall deadline is replaced by a degraded result and listed in
+   StockAnalysis.degraded. Stage results are also published to subscribe_stages() listeners as they
+   finish. Raises a 404 HTTPException for unknown tickers.
+   """
+   info = await fundamentals.get(ticker_symbol)
+   ticker = make_ticker(ticker_symbol)
+   snapshot = fundamental_snapshot(info)
+   timeouts = settings.PIPELINE_STAGE_TIMEOUTS
+
+   stages = [
+       Stage("fundamental", lambda: fundament_agent(ticker), (), timeouts["fundamental"],
+             lambda _: FundamentalData(**{**snapshot, "decided_by": "degraded"})),
+       Stage("technical", lambda: technical_agent(ticker), (), timeouts["technical"],
+             lambda _: TechnicalData(price=snapshot["price"] or 0, recommendation="HOLD", decided_by="degraded")),
+       Stage("sentiment", lambda: sentiment_agent(ticker_symbol, info.get("longName")), (), timeouts["sentiment"],
+             lambda _: SentimentData(
+                 sentiment_summary="Sentiment analysis is unavailable.",
+                 recommendation="HOLD",
+                 reasoning="The sentiment stage did not finish in time.",
+             )),
+       Stage("recommendation", recommendation_agent, ("fundamental", "technical", "sentiment"),
+             timeouts["recommendation"], _majority_recommendation),
+   ]
+   symbol = ticker_symbol.upper()
+   results, degraded = await run_graph(
+       stages,
+       deadline=settings.PIPELINE_DEADLINE_SECONDS,
+       on_result=lambda stage, result: _publish_stage(symbol, stage, result),
+   )
+
+   return StockAnalysis(
+       ticker=ticker_symbol.upper(),
+       fundamental=results["fundamental"],
+       technical=results["technical"],
+       sentiment=results["sentiment"],
+       final_recommendation=results["recommendation"],
+       degraded=degraded,
+   )
\ No newline at end of file
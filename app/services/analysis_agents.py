@@ -1,21 +1,45 @@
 # app/services/analysis_agents.py
+from __future__ import annotations
+
 import asyncio
 import json
-import yfinance as yf
-import pandas_ta as ta
+from typing import Optional
 from fastapi import HTTPException
+from app.core.config import settings
+from app.core.lazy import lazy_module
 from app.models.schemas import FundamentalData, TechnicalData, SentimentData, FinalRecommendation, UndervaluedStock
+from app.services.fundamentals import fundamentals
+from app.services.gemini_batcher import classify
 from app.services.gemini_client import call_gemini_api
+from app.services.indicator_state import indicator_states
+from app.services.indicators import screen
+from app.services.market_data import fetch_history
+from app.services.metrics import track
+from app.services.rules import decide_fundamental, decide_technical, rule_stats
+from app.services.screener import Candidate, screener, screener_universe
+from app.services.tracing import annotate, span
 
-async def fundament_agent(ticker: yf.Ticker) -> FundamentalData:
-   """Agent 1: Gathers fundamental data and uses an LLM to get a recommendation."""
-   info = await asyncio.to_thread(lambda: ticker.info)
-   data = {
+yf = lazy_module("yfinance")
+
+def fundamental_snapshot(info: dict) -> dict:
+   """Extracts the FundamentalData fields from ticker.info, with a default HOLD recommendation."""
+   return {
        "company_name": info.get("longName"), "price": info.get("currentPrice", info.get("previousClose", 0)),
        "analyst_price_target": info.get("targetMeanPrice"), "pe_ratio": info.get("trailingPE"),
        "revenue_growth_yoy": info.get("revenueGrowth", 0) * 100 if info.get("revenueGrowth") else None,
-       "forward_eps": info.get("forwardEps"), "recommendation": "HOLD"
+       "forward_eps": info.get("forwardEps"), "recommendation": "HOLD", "decided_by": "default"
    }
+
+
+async def fundament_agent(ticker: yf.Ticker) -> FundamentalData:
+   """Agent 1: Gathers fundamental data; clear-cut cases are decided by rules, the rest by an LLM."""
+   info = await fundamentals.get(ticker.ticker)
+   data = fundamental_snapshot(info)
+   decision = decide_fundamental(data) if settings.RULES_ENABLED else None
+   if decision:
+       rule_stats.record("fundamental", "rules")
+       annotate(decided_by="rules")
+       return FundamentalData(**{**data, "recommendation": decision, "decided_by": "rules"})
    prompt = f"""
        Based on the following fundamental data for a stock:
        - Current Price: ${data.get('price') or 0:.2f}
@@ -26,26 +50,41 @@ async def fundament_agent(ticker: yf.Ticker) -> FundamentalData:
        Return a single valid JSON object with one key: "recommendation", with a value of "BUY", "SELL", or "HOLD".
    """
    try:
-       response_text = await call_gemini_api(prompt)
+       response_text = await classify("fundamental", ticker.ticker, prompt)
        if response_text:
            data["recommendation"] = json.loads(response_text).get("recommendation", "HOLD")
+           data["decided_by"] = "llm"
    except Exception as e:
-       print(f"Could not get AI fundamental recommendation: {e}. Defaulting to HOLD.")
+       fallback = decide_fundamental(data, lenient=True) if settings.RULES_ENABLED else None
+       if fallback:
+           print(f"Could not get AI fundamental recommendation: {e}. Falling back to rules ({fallback}).")
+           data["recommendation"], data["decided_by"] = fallback, "rules_fallback"
+       else:
+           print(f"Could not get AI fundamental recommendation: {e}. Defaulting to HOLD.")
+   rule_stats.record("fundamental", data["decided_by"])
+   annotate(decided_by=data["decided_by"])
    return FundamentalData(**data)
 
 
 async def technical_agent(ticker: yf.Ticker) -> TechnicalData:
-   """Agent 2: Gathers technical data and uses an LLM to get a recommendation."""
-   hist = await asyncio.to_thread(ticker.history, period="1y")
+   """Agent 2: Gathers technical data; clear-cut cases are decided by rules, the rest by an LLM."""
+   hist = await fetch_history(ticker, period="1y")
    if hist.empty:
        raise HTTPException(status_code=404, detail="Could not fetch historical data.")
-   hist.ta.adx(length=14, append=True); hist.ta.rsi(length=14, append=True); hist.ta.ema(length=50, append=True)
-   hist.dropna(inplace=True)
-   latest_data = hist.iloc[-1]
+   with track("indicators"):
+       if settings.INDICATOR_STATE_ENABLED:
+           latest_data = await asyncio.to_thread(indicator_states.advance, ticker.ticker, hist)
+       else:
+           latest_data = screen({ticker.ticker: hist})[ticker.ticker]
    data = {
-       "rsi_14": latest_data['RSI_14'], "ema_50": latest_data['EMA_50'],
-       "adx_14": latest_data['ADX_14'], "price": latest_data['Close'], "recommendation": "HOLD"
+       "rsi_14": latest_data['rsi_14'], "ema_50": latest_data['ema_50'],
+       "adx_14": latest_data['adx_14'], "price": latest_data['price'], "recommendation": "HOLD", "decided_by": "default"
    }
+   decision = decide_technical(data) if settings.RULES_ENABLED else None
+   if decision:
+       rule_stats.record("technical", "rules")
+       annotate(decided_by="rules")
+       return TechnicalData(**{**data, "recommendation": decision, "decided_by": "rules"})
    prompt = f"""
        Based on the following technical indicators for a stock, provide a recommendation.
        - RSI (14-day): {data.get('rsi_14') or 0:.2f}
@@ -56,11 +95,19 @@ async def technical_agent(ticker: yf.Ticker) -> TechnicalData:
        Return a single valid JSON object with one key: "recommendation", with a value of "BUY", "SELL", or "HOLD".
    """
    try:
-       response_text = await call_gemini_api(prompt)
+       response_text = await classify("technical", ticker.ticker, prompt)
        if response_text:
            data["recommendation"] = json.loads(response_text).get("recommendation", "HOLD")
+           data["decided_by"] = "llm"
    except Exception as e:
-       print(f"Could not get AI technical recommendation: {e}. Defaulting to HOLD.")
+       fallback = decide_technical(data, lenient=True) if settings.RULES_ENABLED else None
+       if fallback:
+           print(f"Could not get AI technical recommendation: {e}. Falling back to rules ({fallback}).")
+           data["recommendation"], data["decided_by"] = fallback, "rules_fallback"
+       else:
+           print(f"Could not get AI technical recommendation: {e}. Defaulting to HOLD.")
+   rule_stats.record("technical", data["decided_by"])
+   annotate(decided_by=data["decided_by"])
    return TechnicalData(**data)
 
 
@@ -73,7 +120,7 @@ async def sentiment_agent(ticker_symbol: str, company_name: str) -> SentimentDat
        2. "recommendation": Your sentiment-based verdict ("BUY", "SELL", or "HOLD").
        3. "reasoning": A single sentence explaining the sentiment-based recommendation.
    '''
-   response_text = await call_gemini_api(prompt)
+   response_text = await classify("sentiment", ticker_symbol, prompt)
    try:
        return SentimentData(**json.loads(response_text))
    except json.JSONDecodeError:
@@ -89,22 +136,57 @@ async def recommendation_agent(fundamental, technical, sentiment) -> FinalRecomm
        3. Sentiment: {sentiment.model_dump_json()}
        Provide a final verdict. Return a valid JSON object with "overall_recommendation" and "overall_reasoning".
    """
-   response_text = await call_gemini_api(prompt)
+   response_text = await call_gemini_api(prompt, agent="recommendation")
    try:
        return FinalRecommendation(**json.loads(response_text))
    except json.JSONDecodeError:
        raise HTTPException(status_code=500, detail="Invalid JSON response from recommendation analysis.")
 
-async def find_undervalued_stocks() -> list[UndervaluedStock]:
-    """Uses an LLM to find potentially undervalued stocks."""
-    prompt = """
-       List 5 random potentially undervalued stocks, selected primarily based on a discounted cash flow (DCF) model analysis.
-       For each, provide a valid JSON object with 'ticker', 'company_name', and a brief 'reason' explaining the DCF angle.
-       Return the response as a valid JSON array of these objects.
+def _screen_reason(candidate: Candidate) -> str:
+   reason = (f"DCF value of ${candidate.intrinsic_value:.2f} per share is {candidate.margin_of_safety:.0%} above "
+             f"the ${candidate.price:.2f} price")
+   if candidate.pe_ratio is not None and candidate.median_pe is not None:
+       reason += f"; P/E of {candidate.pe_ratio:.1f} against a universe median of {candidate.median_pe:.1f}"
+   return reason + "."
+
+
+async def _explain_candidates(candidates: list[Candidate]) -> dict:
+   """Asks the LLM for one-sentence reasons for the ranked list; returns {} if it fails."""
+   lines = "\n".join(
+       f"- {c.ticker} ({c.company_name}): price ${c.price:.2f}, DCF value ${c.intrinsic_value:.2f}, "
+       f"margin of safety {c.margin_of_safety:.0%}, P/E {c.pe_ratio or 'n/a'} vs median {c.median_pe or 'n/a'}"
+       for c in candidates
+   )
+   prompt = f"""
+       A discounted cash flow screen produced this short list of potentially undervalued stocks:
+{lines}
+       For each, write a brief 'reason' explaining the DCF angle, using only the numbers given.
+       Return a valid JSON array of objects with 'ticker' and 'reason'.
    """
-    try:
-        response_text = await call_gemini_api(prompt)
-        stocks_data = json.loads(response_text)
-        return [UndervaluedStock(**stock) for stock in stocks_data]
-    except json.JSONDecodeError:
-        raise HTTPException(status_code=500, detail="Invalid JSON response for undervalued stocks.")
\ No newline at end of file
+   try:
+       response_text = await call_gemini_api(prompt, agent="undervalued")
+       return {item["ticker"].upper(): item["reason"] for item in json.loads(response_text)
+               if isinstance(item, dict) and item.get("ticker") and item.get("reason")}
+   except Exception as e:
+       print(f"Could not get reasons for undervalued stocks, using templated ones: {e}")
+       return {}
+
+
+async def find_undervalued_stocks(portfolio: Optional[str] = None, limit: Optional[int] = None) -> list[UndervaluedStock]:
+   """Ranks the screener universe by DCF margin of safety and relative P/E; the LLM only words the reasons."""
+   with span("screen"):
+       candidates = await screener.top(screener_universe(portfolio), limit or settings.SCREENER_TOP_N)
+   reasons = await _explain_candidates(candidates) if candidates and settings.SCREENER_LLM_REASONS else {}
+   return [
+       UndervaluedStock(
+           ticker=c.ticker,
+           company_name=c.company_name,
+           reason=reasons.get(c.ticker) or _screen_reason(c),
+           price=c.price,
+           intrinsic_value=c.intrinsic_value,
+           margin_of_safety=c.margin_of_safety,
+           pe_ratio=c.pe_ratio,
+           score=c.score,
+       )
+       for c in candidates
+   ]
@@ -0,0 +1,126 @@
+# app/services/fundamentals.py
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from app.core.config import settings
+from app.services.market_data import fetch_info, make_ticker
+from app.services.shared_cache import shared_cache
+from app.services.tracing import annotate, span
+
+
+class FundamentalsCache:
+   """TTL snapshot cache for ticker.info, with a negative cache so unknown tickers fail fast."""
+
+   def __init__(self, ttl: float, negative_ttl: float, max_entries: int):
+       self.ttl = ttl
+       self.negative_ttl = negative_ttl
+       self.max_entries = max_entries
+       # symbol -> (info, expires_at); an empty info marks a known-invalid ticker
+       self._entries: "OrderedDict[str, Tuple[dict, float]]" = OrderedDict()
+       self.hits = 0
+       self.negative_hits = 0
+       self.misses = 0
+
+   def _lookup(self, symbol: str):
+       entry = self._entries.get(symbol)
+       if entry is None:
+           return None
+       if entry[1] <= time.time():
+           del self._entries[symbol]
+           return None
+       self._entries.move_to_end(symbol)
+       return entry[0]
+
+   def _store(self, symbol: str, info: dict, expires_at: float) -> None:
+       self._entries[symbol] = (info, expires_at)
+       self._entries.move_to_end(symbol)
+       while len(self._entries) > self.max_entries:
+           self._entries.popitem(last=False)
+
+   async def get(self, symbol: str) -> dict:
+       """Returns the cached info snapshot, fetching it off the event loop on a miss.
+
+       Raises a 404 HTTPException for tickers the data source does not know.
+       """
+       symbol = symbol.upper()
+       with span("fundamentals", symbol=symbol):
+           info = self._lookup(symbol)
+           if info is None:
+               self.misses += 1
+               annotate(cache="miss")
+               info, expires_at = await self._fetch(symbol)
+               self._store(symbol, info, expires_at)
+           elif info:
+               self.hits += 1
+               annotate(cache="hit")
+           else:
+               self.negative_hits += 1
+               annotate(cache="negative")
+       if not info:
+           raise HTTPException(status_code=404, detail=f"Ticker '{symbol}' not found.")
+       return info
+
+   async def _fetch(self, symbol: str) -> Tuple[dict, float]:
+       """Fetches info through the shared cache tier, so one worker fetches it for all of them.
+
+       Returns (info, expires_at); info is {} for tickers the data source does not know.
+       """
+       async def compute() -> Tuple[bytes, float]:
+           info = await fetch_info(make_ticker(symbol))
+           if info and info.get("longName"):
+               return json.dumps(info, default=str).encode("utf-8"), self.ttl
+           return b"{}", self.negative_ttl
+
+       entry = await shared_cache.get_or_compute(f"info:{symbol}", compute)
+       return json.loads(entry.value), entry.expires_at
+
+   def peek(self, symbol: str) -> Optional[dict]:
+       """Returns the cached info snapshot without fetching; None when absent, expired or known-invalid."""
+       entry = self._entries.get(symbol.upper())
+       if entry is None or entry[1] <= time.time() or not entry[0]:
+           return None
+       return entry[0]
+
+   async def exists(self, symbol: str) -> bool:
+       try:
+           await self.get(symbol)
+           return True
+       except HTTPException as e:
+           if e.status_code == 404:
+               return False
+           raise
+
+   async def prefetch(self, symbols: List[str]) -> Dict[str, bool]:
+       """Warms the cache for many tickers concurrently; returns whether each one exists."""
+       semaphore = asyncio.Semaphore(max(1, settings.FUNDAMENTALS_PREFETCH_CONCURRENCY))
+
+       async def warm(symbol: str) -> bool:
+           async with semaphore:
+               try:
+                   return await self.exists(symbol)
+               except Exception as e:
+                   print(f"Could not prefetch fundamentals for {symbol}: {e}")
+                   return False
+
+       results = await asyncio.gather(*(warm(symbol) for symbol in symbols))
+       return dict(zip((symbol.upper() for symbol in symbols), results))
+
+   def stats(self) -> dict:
+       return {
+           "hits": self.hits,
+           "negative_hits": self.negative_hits,
+           "misses": self.misses,
+           "entries": len(self._entries),
+       }
+
+
+fundamentals = FundamentalsCache(
+   ttl=settings.FUNDAMENTALS_TTL_SECONDS,
+   negative_ttl=settings.FUNDAMENTALS_NEGATIVE_TTL_SECONDS,
+   max_entries=settings.FUNDAMENTALS_MAX_ENTRIES,
+)
\ No newline at end of file
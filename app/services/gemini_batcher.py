@@ -0,0 +1,176 @@
+# app/services/gemini_batcher.py
+import asyncio
+import json
+from typing import Dict, List, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.services.gemini_client import cache_response, cached_response, call_gemini_api, stale_response
+from app.services.rate_limiter import request_priority
+from app.services.tracing import annotate, detach, span
+
+BATCH_PROMPT = """
+       You will answer {count} independent requests, each about one stock and identified by an "id".
+       Follow each request's instructions for the JSON object it asks for.
+       Return a single valid JSON array with exactly one object per request, and add an "id" key to each
+       object with the request's id. Do not merge or skip requests.
+
+{items}
+"""
+
+
+class PromptBatcher:
+   """Merges per-ticker prompts for one agent that arrive within a short window into a single Gemini call.
+
+   Each caller gets back the JSON text for its own item, as if it had sent its prompt alone. Items
+   missing from the merged answer, or an answer that is not a JSON array, fall back to one call per item.
+   When the merged call fails (or the breaker rejects it), each item gets its own stale cached answer
+   if it has one, as a lone call would, and the merged call's error otherwise.
+   """
+
+   def __init__(self, agent: str, window_seconds: float, max_items: int):
+       self.agent = agent
+       self.window_seconds = window_seconds
+       self.max_items = max_items
+       self._pending: List[Tuple[str, str, asyncio.Future, int]] = []
+       self._timer: Optional[asyncio.TimerHandle] = None
+       self._sending: Set[asyncio.Task] = set()
+       self.batches_sent = 0
+       self.items_batched = 0
+       self.single_sends = 0
+       self.items_retried = 0
+       self.items_after_failed_batch = 0
+
+   async def submit(self, ticker: str, prompt: str) -> Optional[str]:
+       with span("llm_batch", agent=self.agent):
+           return await self._submit(ticker, prompt)
+
+   async def _submit(self, ticker: str, prompt: str) -> Optional[str]:
+       cached = await cached_response(prompt)
+       if cached is not None:
+           annotate(cache="hit")
+           return cached
+       annotate(cache="miss")
+       loop = asyncio.get_running_loop()
+       future = loop.create_future()
+       item_id = ticker.upper()
+       taken = {pending[0] for pending in self._pending}
+       suffix = 2
+       while item_id in taken:
+           item_id, suffix = f"{ticker.upper()}#{suffix}", suffix + 1
+       self._pending.append((item_id, prompt, future, request_priority.get()))
+       if len(self._pending) >= self.max_items:
+           self._flush()
+       elif self._timer is None:
+           self._timer = loop.call_later(self.window_seconds, self._flush)
+       return await future
+
+   def _flush(self) -> None:
+       if self._timer is not None:
+           self._timer.cancel()
+           self._timer = None
+       items, self._pending = self._pending, []
+       if items:
+           task = asyncio.ensure_future(self._send(items))
+           self._sending.add(task)
+           task.add_done_callback(self._sending.discard)
+
+   async def _send(self, items: List[Tuple[str, str, asyncio.Future, int]]) -> None:
+       # Runs in its own task, so the call goes out at the most urgent item's priority, and is
+       # shared by several requests, so it stays out of whichever one's trace it inherited
+       request_priority.set(min(item[3] for item in items))
+       detach()
+       items = [item[:3] for item in items]
+       if len(items) == 1:
+           self.single_sends += 1
+           await self._send_alone(*items[0])
+           return
+
+       self.batches_sent += 1
+       self.items_batched += len(items)
+       merged = BATCH_PROMPT.format(
+           count=len(items),
+           items="\n".join(f'       Request id "{item_id}":\n{prompt}' for item_id, prompt, _ in items),
+       )
+       try:
+           response_text = await call_gemini_api(merged, agent=self.agent)
+       except Exception as e:
+           self.items_after_failed_batch += len(items)
+           for _, prompt, future in items:
+               stale = await stale_response(prompt, self.agent)
+               if future.done():
+                   continue
+               if stale is not None:
+                   future.set_result(stale)
+               else:
+                   future.set_exception(e)
+           return
+
+       answers = self._split(response_text)
+       retries = []
+       for item_id, prompt, future in items:
+           answer = answers.get(item_id)
+           if answer is None:
+               retries.append(self._send_alone(item_id, prompt, future))
+               continue
+           text = json.dumps(answer)
+           await cache_response(prompt, text, self.agent)
+           if not future.done():
+               future.set_result(text)
+       self.items_retried += len(retries)
+       await asyncio.gather(*retries)
+
+   async def _send_alone(self, item_id: str, prompt: str, future: asyncio.Future) -> None:
+       try:
+           result = await call_gemini_api(prompt, agent=self.agent)
+       except Exception as e:
+           if not future.done():
+               future.set_exception(e)
+           return
+       if not future.done():
+           future.set_result(result)
+
+   @staticmethod
+   def _split(response_text: Optional[str]) -> Dict[str, dict]:
+       """Maps item ids to their answer objects, ignoring anything malformed."""
+       try:
+           answers = json.loads(response_text)
+       except (TypeError, json.JSONDecodeError):
+           return {}
+       if not isinstance(answers, list):
+           return {}
+       split = {}
+       for answer in answers:
+           if isinstance(answer, dict) and "id" in answer:
+               item_id = str(answer.pop("id")).upper()
+               split.setdefault(item_id, answer)
+       return split
+
+   def stats(self) -> dict:
+       return {
+           "batches_sent": self.batches_sent,
+           "items_batched": self.items_batched,
+           "single_sends": self.single_sends,
+           "items_retried": self.items_retried,
+           "items_after_failed_batch": self.items_after_failed_batch,
+       }
+
+
+_batchers: Dict[str, PromptBatcher] = {}
+
+
+async def classify(agent: str, ticker: str, prompt: str) -> Optional[str]:
+   """Sends a per-ticker prompt through the agent's batcher, or straight to Gemini when batching is off."""
+   if not settings.GEMINI_BATCH_ENABLED:
+       return await call_gemini_api(prompt, agent=agent)
+   batcher = _batchers.get(agent)
+   if batcher is None:
+       batcher = _batchers[agent] = PromptBatcher(
+           agent,
+           window_seconds=settings.GEMINI_BATCH_WINDOW_MS / 1000,
+           max_items=settings.GEMINI_BATCH_MAX_ITEMS,
+       )
+   return await batcher.submit(ticker, prompt)
+
+
+def batcher_stats() -> dict:
+   return {agent: batcher.stats() for agent, batcher in _batchers.items()}
\ No newline at end of file
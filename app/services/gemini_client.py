@@ -1,25 +1,196 @@
 # app/services/gemini_client.py
 import asyncio
-import requests
 import json
+import time
+import httpx
 from typing import Optional
 from fastapi import HTTPException
 from app.core.config import settings
+from app.services.llm_cache import llm_cache, make_cache_key, ttl_for
+from app.services.metrics import Counter, GaugeFunc, track
+from app.services.rate_limiter import THROTTLE_STATUSES, gemini_scheduler, parse_retry_after
+from app.services.resilience import CircuitBreaker, Hedger, LatencyTracker
+from app.services.tracing import annotate, span
+
+_client: Optional[httpx.AsyncClient] = None
+
+gemini_latency = LatencyTracker(
+   window=settings.GEMINI_LATENCY_WINDOW,
+   percentile=settings.GEMINI_HEDGE_PERCENTILE,
+   default_delay=settings.GEMINI_HEDGE_DEFAULT_DELAY,
+   min_delay=settings.GEMINI_HEDGE_MIN_DELAY,
+)
+gemini_breaker = CircuitBreaker(
+   window=settings.GEMINI_BREAKER_WINDOW,
+   min_calls=settings.GEMINI_BREAKER_MIN_CALLS,
+   error_rate=settings.GEMINI_BREAKER_ERROR_RATE,
+   open_seconds=settings.GEMINI_BREAKER_OPEN_SECONDS,
+)
+gemini_hedger = Hedger(max_ratio=settings.GEMINI_HEDGE_MAX_RATIO)
+
+gemini_calls = Counter(
+   "screener_gemini_calls_total",
+   "Gemini calls by agent and how they were answered (cache, stale, upstream, rejected, error).",
+   ["agent", "outcome"],
+)
+gemini_responses = Counter("screener_gemini_responses_total", "Gemini HTTP attempts by status code.", ["status"])
+GaugeFunc(
+   "screener_gemini_scheduler",
+   "Outbound Gemini scheduler: concurrency limit, in-flight and queued calls, and bucket tokens.",
+   lambda: {(field,): gemini_scheduler.stats()[field] for field in ("limit", "in_flight", "queued", "tokens")},
+   ["field"],
+)
+GaugeFunc(
+   "screener_gemini_breaker_open",
+   "1 while the Gemini circuit breaker is open, 0.5 while half-open, 0 when closed.",
+   lambda: {(): {"closed": 0, "half_open": 0.5, "open": 1}[gemini_breaker.state]},
+)
+
+
+def get_http_client() -> httpx.AsyncClient:
+   """Returns the app-lifetime HTTP client, creating it on first use."""
+   global _client
+   if _client is None or _client.is_closed:
+       _client = httpx.AsyncClient(
+           headers={'Content-Type': 'application/json'},
+           limits=httpx.Limits(
+               max_connections=settings.GEMINI_MAX_CONNECTIONS,
+               max_keepalive_connections=settings.GEMINI_MAX_KEEPALIVE,
+               keepalive_expiry=settings.GEMINI_KEEPALIVE_EXPIRY,
+           ),
+           timeout=httpx.Timeout(
+               settings.GEMINI_READ_TIMEOUT,
+               connect=settings.GEMINI_CONNECT_TIMEOUT,
+               pool=settings.GEMINI_POOL_TIMEOUT,
+           ),
+       )
+   return _client
+
+
+async def close_http_client() -> None:
+   """Closes the pooled HTTP client. Called from the app shutdown hook."""
+   global _client
+   if _client is not None:
+       await _client.aclose()
+       _client = None
+
+
+async def cached_response(prompt: str, allow_stale: bool = False) -> Optional[str]:
+   """Returns the cached response for a prompt, if any; allow_stale also accepts a recently expired one."""
+   if not settings.LLM_CACHE_ENABLED:
+       return None
+   return await llm_cache.get(make_cache_key(prompt, settings.GEMINI_MODEL), allow_stale=allow_stale)
+
+
+async def cache_response(prompt: str, text: Optional[str], agent: str = "default") -> None:
+   """Caches a response under its prompt; only valid JSON is cached, since every agent expects JSON."""
+   if not settings.LLM_CACHE_ENABLED:
+       return
+   try:
+       json.loads(text)
+   except (TypeError, json.JSONDecodeError):
+       return
+   await llm_cache.set(make_cache_key(prompt, settings.GEMINI_MODEL), text, ttl_for(agent))
+
+
+async def stale_response(prompt: str, agent: str = "default") -> Optional[str]:
+   """Returns a recently expired cached answer to serve while Gemini is failing or the breaker is open."""
+   stale = await cached_response(prompt, allow_stale=True)
+   if stale is not None:
+       gemini_calls.labels(agent, "stale").inc()
+       annotate(cache="stale")
+   return stale
+
+
+async def call_gemini_api(prompt: str, agent: str = "default") -> Optional[str]:
+   """Returns the cached response for a prompt, or calls the Gemini API and caches valid JSON answers.
+
+   While the circuit breaker is open, or when the call fails, a recently expired cached answer is
+   served instead; without one the call fails fast with a 503 and the agents fall back to rules.
+   """
+   with span("llm", agent=agent):
+       return await _call_gemini(prompt, agent)
+
+
+async def _call_gemini(prompt: str, agent: str) -> Optional[str]:
+   cached = await cached_response(prompt)
+   if cached is not None:
+       gemini_calls.labels(agent, "cache").inc()
+       annotate(cache="hit")
+       return cached
 
-async def call_gemini_api(prompt: str) -> Optional[str]:
-   """Asynchronously sends a prompt to the Gemini API and cleans the response."""
    if not settings.API_KEY or settings.API_KEY == "YOUR_API_KEY":
        raise HTTPException(status_code=500, detail="Gemini API key is not configured.")
 
-   headers = {'Content-Type': 'application/json'}
+   generation = gemini_breaker.allow()
+   if generation is None:
+       stale = await stale_response(prompt, agent)
+       if stale is not None:
+           return stale
+       gemini_calls.labels(agent, "rejected").inc()
+       annotate(breaker="open")
+       raise HTTPException(status_code=503, detail="Gemini API is unavailable (circuit open); failing fast.")
+   annotate(cache="miss")
+   try:
+       with track(f"gemini_{agent}"):
+           text = await _request_hedged(prompt)
+   except asyncio.CancelledError:
+       gemini_breaker.abandon(generation)
+       raise
+   except Exception:
+       gemini_breaker.record(False, generation)
+       stale = await stale_response(prompt, agent)
+       if stale is not None:
+           return stale
+       gemini_calls.labels(agent, "error").inc()
+       raise
+   gemini_breaker.record(True, generation)
+   gemini_calls.labels(agent, "upstream").inc()
+   await cache_response(prompt, text, agent)
+   return text
+
+
+async def _request_hedged(prompt: str) -> Optional[str]:
+   """Sends the prompt, duplicating the call if it is still outstanding after the recent p95 latency."""
+   if not settings.GEMINI_HEDGE_ENABLED:
+       return await _request_gemini(prompt)
+   return await gemini_hedger.run(lambda: _request_gemini(prompt), gemini_latency.hedge_delay())
+
+
+def resilience_stats() -> dict:
+   return {
+       "latency": gemini_latency.stats(),
+       "hedge_delay": round(gemini_latency.hedge_delay(), 3),
+       "hedging": gemini_hedger.stats(),
+       "breaker": gemini_breaker.stats(),
+   }
+
+
+async def _post_with_retries(data: dict) -> httpx.Response:
+   """Posts through the outbound scheduler, retrying 429/502/503/504 answers after the scheduler's pause."""
+   for attempt in range(settings.GEMINI_MAX_RETRIES + 1):
+       async with gemini_scheduler.slot():
+           try:
+               response = await get_http_client().post(settings.GEMINI_API_URL, json=data)
+           except httpx.TransportError:
+               gemini_scheduler.record(None)
+               gemini_responses.labels("transport_error").inc()
+               raise
+       gemini_responses.labels(str(response.status_code)).inc()
+       gemini_scheduler.record(response.status_code, parse_retry_after(response.headers.get("Retry-After")))
+       if response.status_code not in THROTTLE_STATUSES or attempt == settings.GEMINI_MAX_RETRIES:
+           return response
+       print(f"Gemini returned {response.status_code}; retrying (attempt {attempt + 1}).")
+   return response
+
+
+async def _request_gemini(prompt: str) -> Optional[str]:
+   """Asynchronously sends a prompt to the Gemini API and cleans the response."""
    data = {"contents": [{"parts": [{"text": prompt}]}]}
 
-   loop = asyncio.get_event_loop()
    try:
-       response = await loop.run_in_executor(
-           None,
-           lambda: requests.post(settings.GEMINI_API_URL, headers=headers, data=json.dumps(data), timeout=20)
-       )
+       started = time.monotonic()
+       response = await _post_with_retries(data)
        response.raise_for_status()
        result = response.json()
       
@@ -33,11 +204,16 @@ async def call_gemini_api(prompt: str) -> Optional[str]:
        elif text.strip().startswith("```"):
            text = text.strip()[3:-3]
           
+       gemini_latency.observe(time.monotonic() - started)
        return text.strip()
 
-   except requests.exceptions.RequestException as e:
+   except httpx.HTTPError as e:
        print(f"API Error: {e}")
        raise HTTPException(status_code=503, detail=f"Gemini API request failed: {e}")
    except (KeyError, IndexError) as e:
        print(f"API Error - Key/Index Error: {e}. Response: {result}")
-       raise HTTPException(status_code=500, detail="Invalid response format from Gemini API.")
\ No newline at end of file
+       raise HTTPException(status_code=500, detail="Invalid response format from Gemini API.")
+   except ValueError as e:
+       # A 200 whose body is not JSON (a proxy error page, a truncated body)
+       print(f"API Error - response is not JSON: {e}")
+       raise HTTPException(status_code=502, detail="Gemini API returned a response that is not JSON.")
\ No newline at end of file
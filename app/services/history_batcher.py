@@ -0,0 +1,154 @@
+# app/services/history_batcher.py
+"""Multi-symbol price history downloads.
+
+Fetching history one ticker at a time costs one upstream round trip and one worker thread per
+ticker. HistoryBatcher holds history requests that arrive close together and sends each group
+with the same shape (the same period, or the same start date) as a single multi-symbol download,
+then hands every caller the bars for its own ticker.
+"""
+from __future__ import annotations
+
+import asyncio
+from typing import Callable, Dict, List, NamedTuple, Optional, Set
+
+from app.core.lazy import lazy_module
+from app.services.metrics import track
+from app.services.tracing import detach, span
+
+np = lazy_module("numpy")
+pd = lazy_module("pandas")
+
+HISTORY_COLUMNS = ("Open", "High", "Low", "Close", "Volume", "Dividends", "Stock Splits")
+
+
+class HistoryRequest(NamedTuple):
+   """What to download: the last period of bars, or every bar since start (an ISO date)."""
+   period: Optional[str] = None
+   start: Optional[str] = None
+
+   def kwargs(self) -> dict:
+       """Keyword arguments for ticker.history() or yf.download()."""
+       return {key: value for key, value in self._asdict().items() if value is not None}
+
+
+# download(symbols, request) returns each symbol's bars; blocking, so it runs on a worker thread
+Download = Callable[[List[str], HistoryRequest], Dict[str, "pd.DataFrame"]]
+
+
+def empty_history() -> pd.DataFrame:
+   return pd.DataFrame(columns=list(HISTORY_COLUMNS), index=pd.DatetimeIndex([], tz="UTC"))
+
+
+def unpack_download(frame: Optional[pd.DataFrame], symbols: List[str]) -> Dict[str, pd.DataFrame]:
+   """Splits a yf.download(group_by="ticker") frame into one frame per symbol.
+
+   The combined frame is converted to one float array and sliced by column, rather than copied out
+   per ticker. Rows are the union of every symbol's trading days, so each symbol keeps only the
+   rows where it has a close; symbols the source did not return get an empty frame.
+   """
+   if frame is None or frame.empty:
+       return {symbol: empty_history() for symbol in symbols}
+   if not isinstance(frame.columns, pd.MultiIndex):
+       frame = pd.concat({symbols[0]: frame}, axis=1)
+   index = frame.index if frame.index.tz is not None else frame.index.tz_localize("UTC")
+   # group_by="ticker" puts the ticker on the outer level; older yfinance versions put it inside
+   level = 0 if set(symbols) & set(frame.columns.get_level_values(0)) else 1
+   tickers = np.asarray(frame.columns.get_level_values(level))
+   fields = np.asarray(frame.columns.get_level_values(1 - level))
+   values = frame.to_numpy(dtype=np.float64, na_value=np.nan)
+   result = {}
+   for symbol in symbols:
+       positions = np.flatnonzero((tickers == symbol) & np.isin(fields, HISTORY_COLUMNS))
+       closes = positions[fields[positions] == "Close"]
+       if closes.size == 0:
+           result[symbol] = empty_history()
+           continue
+       rows = ~np.isnan(values[:, closes[0]])
+       result[symbol] = pd.DataFrame(values[rows][:, positions], index=index[rows], columns=list(fields[positions]))
+   return result
+
+
+class HistoryBatcher:
+   """Groups history requests into multi-symbol downloads.
+
+   A group is sent once no request has joined it for window_seconds, at most max_wait_seconds after
+   its first request, or as soon as it holds max_symbols tickers. A failed download fails every
+   request in its group.
+   """
+
+   def __init__(self, download: Download, window_seconds: float, max_wait_seconds: float, max_symbols: int):
+       self.download = download
+       self.window_seconds = window_seconds
+       self.max_wait_seconds = max_wait_seconds
+       self.max_symbols = max_symbols
+       self._pending: Dict[HistoryRequest, Dict[str, List[asyncio.Future]]] = {}
+       self._opened: Dict[HistoryRequest, float] = {}
+       self._timers: Dict[HistoryRequest, asyncio.TimerHandle] = {}
+       self._sending: Set[asyncio.Task] = set()
+       self.downloads = 0
+       self.download_failures = 0
+       self.symbols_downloaded = 0
+       self.requests = 0
+
+   async def fetch(self, symbol: str, request: HistoryRequest) -> pd.DataFrame:
+       """Returns symbol's bars for request, downloaded together with the other pending symbols."""
+       loop = asyncio.get_running_loop()
+       future = loop.create_future()
+       self.requests += 1
+       group = self._pending.setdefault(request, {})
+       group.setdefault(symbol.upper(), []).append(future)
+       if len(group) >= self.max_symbols:
+           self._flush(request)
+       else:
+           now = loop.time()
+           opened = self._opened.setdefault(request, now)
+           timer = self._timers.pop(request, None)
+           if timer is not None:
+               timer.cancel()
+           delay = max(0.0, min(self.window_seconds, opened + self.max_wait_seconds - now))
+           self._timers[request] = loop.call_later(delay, self._flush, request)
+       with span("history_batch", **request.kwargs()):
+           return await future
+
+   def _flush(self, request: HistoryRequest) -> None:
+       timer = self._timers.pop(request, None)
+       if timer is not None:
+           timer.cancel()
+       self._opened.pop(request, None)
+       group = self._pending.pop(request, None)
+       if group:
+           task = asyncio.ensure_future(self._send(request, group))
+           self._sending.add(task)
+           task.add_done_callback(self._sending.discard)
+
+   async def _send(self, request: HistoryRequest, group: Dict[str, List[asyncio.Future]]) -> None:
+       # Shared by several requests, so it stays out of whichever one's trace it inherited
+       detach()
+       symbols = sorted(group)
+       self.downloads += 1
+       self.symbols_downloaded += len(symbols)
+       try:
+           with track("yf_download"):
+               frames = await asyncio.to_thread(self.download, symbols, request)
+       except Exception as e:
+           self.download_failures += 1
+           print(f"History download failed for {len(symbols)} tickers ({', '.join(symbols[:5])}...): {e}")
+           for futures in group.values():
+               for future in futures:
+                   if not future.done():
+                       future.set_exception(e)
+           return
+       for symbol, futures in group.items():
+           frame = frames.get(symbol)
+           for future in futures:
+               if not future.done():
+                   future.set_result(empty_history() if frame is None else frame)
+
+   def stats(self) -> dict:
+       return {
+           "downloads": self.downloads,
+           "download_failures": self.download_failures,
+           "symbols_downloaded": self.symbols_downloaded,
+           "requests": self.requests,
+           "symbols_per_download": round(self.symbols_downloaded / self.downloads, 2) if self.downloads else 0.0,
+       }
@@ -0,0 +1,234 @@
+# app/services/indicator_state.py
+from __future__ import annotations
+
+import json
+import os
+import threading
+from typing import Dict, NamedTuple, Optional
+
+from app.core.config import settings
+from app.core.lazy import lazy_module
+from app.services.price_store import index_to_ns, is_storable
+
+np = lazy_module("numpy")
+pd = lazy_module("pandas")
+
+
+class Bar(NamedTuple):
+   ts: int  # UTC nanoseconds
+   high: float
+   low: float
+   close: float
+
+
+class _Wilder:
+   """One step of pandas_ta's RMA: an adjusted EWM with alpha=1/length and min_periods=length."""
+
+   __slots__ = ("length", "num", "den", "count")
+
+   def __init__(self, length: int, num: float = 0.0, den: float = 0.0, count: int = 0):
+       self.length = length
+       self.num = num
+       self.den = den
+       self.count = count
+
+   def update(self, x: Optional[float]) -> Optional[float]:
+       decay = 1.0 - 1.0 / self.length
+       self.num *= decay
+       self.den *= decay
+       if x is not None:
+           self.num += x
+           self.den += 1.0
+           self.count += 1
+       return self.num / self.den if self.count >= self.length else None
+
+   def to_list(self) -> list:
+       return [self.length, self.num, self.den, self.count]
+
+
+class IndicatorState:
+   """Recursive RSI-14 / EMA-50 / ADX-14 state for one ticker, updated in O(1) per bar.
+
+   Mirrors app.services.indicators bar for bar. The state before the latest bar is kept so that
+   a revised latest bar (an intraday refresh) replaces it instead of being counted twice.
+   """
+
+   RSI_LENGTH = 14
+   EMA_LENGTH = 50
+   ADX_LENGTH = 14
+
+   def __init__(self):
+       self.last_ts: Optional[int] = None
+       self.last_high: Optional[float] = None
+       self.last_low: Optional[float] = None
+       self.last_close: Optional[float] = None
+       self.gains = _Wilder(self.RSI_LENGTH)
+       self.losses = _Wilder(self.RSI_LENGTH)
+       self.ema_count = 0
+       self.ema_sum = 0.0
+       self.ema: Optional[float] = None
+       self.true_range = _Wilder(self.ADX_LENGTH)
+       self.plus_dm = _Wilder(self.ADX_LENGTH)
+       self.minus_dm = _Wilder(self.ADX_LENGTH)
+       self.dx = _Wilder(self.ADX_LENGTH)
+       self.rsi_14: Optional[float] = None
+       self.adx_14: Optional[float] = None
+       self.previous: Optional[dict] = None
+
+   def update(self, bar: Bar) -> dict:
+       """Applies a new bar, or replaces the latest bar if it has the same timestamp."""
+       if self.last_ts is not None and bar.ts < self.last_ts:
+           raise ValueError(f"Bar at {bar.ts} is older than the latest applied bar at {self.last_ts}.")
+       if self.last_ts is not None and bar.ts == self.last_ts:
+           self._restore(self.previous)
+       self.previous = self._snapshot()
+       self._apply(bar)
+       return self.values()
+
+   def _apply(self, bar: Bar) -> None:
+       prev_high, prev_low, prev_close = self.last_high, self.last_low, self.last_close
+
+       change = bar.close - prev_close if prev_close is not None else None
+       gain = self.gains.update(max(change, 0.0) if change is not None else None)
+       loss = self.losses.update(min(change, 0.0) if change is not None else None)
+       self.rsi_14 = 100.0 * gain / (gain + abs(loss)) if gain is not None and loss is not None and gain + abs(loss) else None
+
+       self.ema_count += 1
+       if self.ema_count < self.EMA_LENGTH:
+           self.ema_sum += bar.close
+       elif self.ema_count == self.EMA_LENGTH:
+           self.ema = (self.ema_sum + bar.close) / self.EMA_LENGTH
+       else:
+           alpha = 2.0 / (self.EMA_LENGTH + 1)
+           self.ema = self.ema * (1.0 - alpha) + bar.close * alpha
+
+       if prev_close is None:
+           tr = plus = minus = None
+       else:
+           tr = max(bar.high - bar.low, abs(bar.high - prev_close), abs(prev_close - bar.low))
+           up, down = bar.high - prev_high, prev_low - bar.low
+           plus = up if up > down and up > 0 else 0.0
+           minus = down if down > up and down > 0 else 0.0
+       atr = self.true_range.update(tr)
+       plus_avg = self.plus_dm.update(plus)
+       minus_avg = self.minus_dm.update(minus)
+       dx = None
+       if atr and plus_avg is not None and minus_avg is not None:
+           plus_di, minus_di = 100.0 * plus_avg / atr, 100.0 * minus_avg / atr
+           if plus_di + minus_di:
+               dx = 100.0 * abs(plus_di - minus_di) / (plus_di + minus_di)
+       self.adx_14 = self.dx.update(dx)
+
+       self.last_ts, self.last_high, self.last_low, self.last_close = bar.ts, bar.high, bar.low, bar.close
+
+   def values(self) -> dict:
+       return {"rsi_14": self.rsi_14, "ema_50": self.ema, "adx_14": self.adx_14, "price": self.last_close}
+
+   def _snapshot(self) -> dict:
+       return {
+           "last": [self.last_ts, self.last_high, self.last_low, self.last_close],
+           "gains": self.gains.to_list(),
+           "losses": self.losses.to_list(),
+           "ema": [self.ema_count, self.ema_sum, self.ema],
+           "true_range": self.true_range.to_list(),
+           "plus_dm": self.plus_dm.to_list(),
+           "minus_dm": self.minus_dm.to_list(),
+           "dx": self.dx.to_list(),
+           "out": [self.rsi_14, self.adx_14],
+       }
+
+   def _restore(self, snapshot: dict) -> None:
+       self.last_ts, self.last_high, self.last_low, self.last_close = snapshot["last"]
+       self.gains = _Wilder(*snapshot["gains"])
+       self.losses = _Wilder(*snapshot["losses"])
+       self.ema_count, self.ema_sum, self.ema = snapshot["ema"]
+       self.true_range = _Wilder(*snapshot["true_range"])
+       self.plus_dm = _Wilder(*snapshot["plus_dm"])
+       self.minus_dm = _Wilder(*snapshot["minus_dm"])
+       self.dx = _Wilder(*snapshot["dx"])
+       self.rsi_14, self.adx_14 = snapshot["out"]
+
+   def to_dict(self) -> dict:
+       return {**self._snapshot(), "previous": self.previous}
+
+   @classmethod
+   def from_dict(cls, data: dict) -> "IndicatorState":
+       state = cls()
+       state._restore(data)
+       state.previous = data.get("previous")
+       return state
+
+
+class IndicatorStateStore:
+   """Keeps an IndicatorState per ticker in memory and persists it as JSON next to the price store."""
+
+   def __init__(self, root: str):
+       self.root = root
+       self._states: Dict[str, IndicatorState] = {}
+       self._lock = threading.Lock()
+       self.bars_applied = 0
+       self.resyncs = 0
+
+   def _path(self, symbol: str) -> str:
+       return os.path.join(self.root, f"{symbol}.json")
+
+   def _load(self, symbol: str) -> Optional[IndicatorState]:
+       try:
+           with open(self._path(symbol), "r") as f:
+               return IndicatorState.from_dict(json.load(f))
+       except (OSError, ValueError, KeyError, TypeError):
+           return None
+
+   def _save(self, symbol: str, state: IndicatorState) -> None:
+       os.makedirs(self.root, exist_ok=True)
+       path = self._path(symbol)
+       with open(path + ".tmp", "w") as f:
+           json.dump(state.to_dict(), f)
+       os.replace(path + ".tmp", path)
+
+   def _start_position(self, state: IndicatorState, ts: np.ndarray, close: np.ndarray) -> Optional[int]:
+       """Index of the state's latest bar in the history, or None if the two no longer line up."""
+       if state.last_ts is None:
+           return None
+       pos = int(np.searchsorted(ts, state.last_ts))
+       if pos >= len(ts) or ts[pos] != state.last_ts:
+           return None
+       if state.previous is not None and state.previous["last"][0] is not None:
+           prev_ts, prev_close = state.previous["last"][0], state.previous["last"][3]
+           if pos == 0 or ts[pos - 1] != prev_ts or not np.isclose(close[pos - 1], prev_close, rtol=1e-9):
+               return None
+       return pos
+
+   def advance(self, symbol: str, hist: pd.DataFrame) -> dict:
+       """Feeds the bars from the state's latest bar onward and returns the latest indicator values.
+
+       Rebuilds the state from the whole history when its last bars are missing from, or differ
+       from, the history (a gap, a back-adjustment after a split or dividend, or a fresh start).
+       Blocking; call it from a worker thread.
+       """
+       symbol = symbol.upper()
+       ts = index_to_ns(hist.index)
+       high = hist["High"].to_numpy(dtype=np.float64)
+       low = hist["Low"].to_numpy(dtype=np.float64)
+       close = hist["Close"].to_numpy(dtype=np.float64)
+       with self._lock:
+           state = self._states.get(symbol)
+           if state is None and is_storable(symbol):
+               state = self._load(symbol)
+           pos = self._start_position(state, ts, close) if state is not None else None
+           if pos is None:
+               state, pos = IndicatorState(), 0
+               self.resyncs += 1
+           for i in range(pos, len(ts)):
+               state.update(Bar(int(ts[i]), float(high[i]), float(low[i]), float(close[i])))
+           self.bars_applied += len(ts) - pos
+           self._states[symbol] = state
+           if is_storable(symbol):
+               self._save(symbol, state)
+           return state.values()
+
+   def stats(self) -> dict:
+       return {"tickers": len(self._states), "bars_applied": self.bars_applied, "resyncs": self.resyncs}
+
+
+indicator_states = IndicatorStateStore(settings.INDICATOR_STATE_DIR)
\ No newline at end of file
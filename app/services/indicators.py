@@ -0,0 +1,145 @@
+# app/services/indicators.py
+"""Vectorized RSI, EMA and ADX over many tickers at once.
+
+Inputs are 2-D float arrays shaped (tickers, bars). Each row is one ticker's own bar sequence,
+right-aligned on its latest bar and left-padded with NaN when its history is shorter. The
+recursive filters step through the bars once with every ticker updated per step, and follow
+pandas_ta's definitions (RMA is an adjusted EWM with alpha=1/length; EMA is seeded with an SMA),
+so results match hist.ta.rsi / ema / adx to floating-point tolerance.
+"""
+from __future__ import annotations
+
+from typing import Dict, List, Mapping, Tuple
+
+from app.core.lazy import lazy_module
+
+np = lazy_module("numpy")
+pd = lazy_module("pandas")
+
+
+def _as_2d(values: np.ndarray) -> np.ndarray:
+   values = np.asarray(values, dtype=np.float64)
+   return values[np.newaxis, :] if values.ndim == 1 else values
+
+
+def rma(values: np.ndarray, length: int) -> np.ndarray:
+   """Wilder's moving average, matching pandas ewm(alpha=1/length, min_periods=length).mean()."""
+   values = _as_2d(values)
+   decay = 1.0 - 1.0 / length
+   out = np.full(values.shape, np.nan)
+   num = np.zeros(values.shape[0])
+   den = np.zeros(values.shape[0])
+   count = np.zeros(values.shape[0], dtype=np.int64)
+   for t in range(values.shape[1]):
+       x = values[:, t]
+       valid = ~np.isnan(x)
+       num = num * decay + np.where(valid, x, 0.0)
+       den = den * decay + valid
+       count += valid
+       ready = valid & (count >= length)
+       out[ready, t] = num[ready] / den[ready]
+   return out
+
+
+def ema(close: np.ndarray, length: int = 50) -> np.ndarray:
+   """Exponential moving average seeded with the SMA of each row's first `length` values."""
+   close = _as_2d(close)
+   alpha = 2.0 / (length + 1)
+   n_rows, n_bars = close.shape
+   out = np.full(close.shape, np.nan)
+   first = np.argmax(~np.isnan(close), axis=1)
+   seed_at = first + length - 1
+   has_seed = (~np.isnan(close)).any(axis=1) & (seed_at < n_bars)
+   rows = np.flatnonzero(has_seed)
+   window = first[rows, None] + np.arange(length)
+   seeds = close[rows[:, None], window].mean(axis=1)
+   prev = np.full(n_rows, np.nan)
+   for t in range(n_bars):
+       starting = has_seed & (seed_at == t)
+       prev[rows] = np.where(starting[rows], seeds, prev[rows])
+       stepping = has_seed & (seed_at < t)
+       x = close[:, t]
+       prev = np.where(stepping & ~np.isnan(x), prev * (1.0 - alpha) + x * alpha, prev)
+       out[:, t] = np.where(has_seed & (seed_at <= t), prev, np.nan)
+   return out
+
+
+def rsi(close: np.ndarray, length: int = 14) -> np.ndarray:
+   """Relative Strength Index on a 0-100 scale."""
+   close = _as_2d(close)
+   change = np.full(close.shape, np.nan)
+   change[:, 1:] = close[:, 1:] - close[:, :-1]
+   gains = rma(np.where(np.isnan(change), np.nan, np.maximum(change, 0.0)), length)
+   losses = rma(np.where(np.isnan(change), np.nan, np.minimum(change, 0.0)), length)
+   with np.errstate(divide="ignore", invalid="ignore"):
+       return 100.0 * gains / (gains + np.abs(losses))
+
+
+def adx(high: np.ndarray, low: np.ndarray, close: np.ndarray, length: int = 14) -> np.ndarray:
+   """Average Directional Index, smoothed with RMA over `length` bars."""
+   high, low, close = _as_2d(high), _as_2d(low), _as_2d(close)
+   prev_close = np.full(close.shape, np.nan)
+   prev_close[:, 1:] = close[:, :-1]
+   true_range = np.fmax(np.fmax(high - low, np.abs(high - prev_close)), np.abs(prev_close - low))
+   true_range[np.isnan(prev_close)] = np.nan
+
+   up = np.full(high.shape, np.nan)
+   down = np.full(low.shape, np.nan)
+   up[:, 1:] = high[:, 1:] - high[:, :-1]
+   down[:, 1:] = low[:, :-1] - low[:, 1:]
+   plus_dm = np.where((up > down) & (up > 0), up, 0.0)
+   minus_dm = np.where((down > up) & (down > 0), down, 0.0)
+   plus_dm[np.isnan(up)] = np.nan
+   minus_dm[np.isnan(down)] = np.nan
+
+   with np.errstate(divide="ignore", invalid="ignore"):
+       scale = 100.0 / rma(true_range, length)
+       plus_di = scale * rma(plus_dm, length)
+       minus_di = scale * rma(minus_dm, length)
+       dx = 100.0 * np.abs(plus_di - minus_di) / (plus_di + minus_di)
+   return rma(dx, length)
+
+
+def compute_indicators(high: np.ndarray, low: np.ndarray, close: np.ndarray) -> Dict[str, np.ndarray]:
+   """Computes the full RSI-14, EMA-50 and ADX-14 series for every row."""
+   return {
+       "rsi_14": rsi(close, 14),
+       "ema_50": ema(close, 50),
+       "adx_14": adx(high, low, close, 14),
+   }
+
+
+def latest_indicators(high: np.ndarray, low: np.ndarray, close: np.ndarray) -> Dict[str, np.ndarray]:
+   """Returns each row's indicator values and price at its latest bar (NaN where history is too short)."""
+   series = compute_indicators(high, low, close)
+   latest = {name: values[:, -1] for name, values in series.items()}
+   latest["price"] = _as_2d(close)[:, -1]
+   return latest
+
+
+def stack_frames(frames: Mapping[str, pd.DataFrame]) -> Tuple[List[str], np.ndarray, np.ndarray, np.ndarray]:
+   """Right-aligns per-ticker history frames into (symbols, high, low, close) 2-D arrays."""
+   symbols = [symbol for symbol, frame in frames.items() if not frame.empty]
+   n_bars = max((len(frames[symbol]) for symbol in symbols), default=0)
+   stacked = {column: np.full((len(symbols), n_bars), np.nan) for column in ("High", "Low", "Close")}
+   for row, symbol in enumerate(symbols):
+       frame = frames[symbol]
+       for column, target in stacked.items():
+           target[row, n_bars - len(frame):] = frame[column].to_numpy(dtype=np.float64)
+   return symbols, stacked["High"], stacked["Low"], stacked["Close"]
+
+
+def screen(frames: Mapping[str, pd.DataFrame]) -> Dict[str, Dict[str, float]]:
+   """Computes the latest indicators for many tickers in one vectorized pass."""
+   symbols, high, low, close = stack_frames(frames)
+   if not symbols:
+       return {}
+   latest = latest_indicators(high, low, close)
+   return {
+       symbol: {name: _optional(values[row]) for name, values in latest.items()}
+       for row, symbol in enumerate(symbols)
+   }
+
+
+def _optional(value: float):
+   return None if np.isnan(value) else float(value)
\ No newline at end of file
@@ -0,0 +1,167 @@
+# app/services/llm_cache.py
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from app.core.config import settings
+
+
+def normalize_prompt(prompt: str) -> str:
+   """Collapses whitespace so re-indented or re-wrapped prompts share a cache entry."""
+   return " ".join(prompt.split())
+
+
+def make_cache_key(prompt: str, model: str) -> str:
+   """Hashes the normalized prompt together with the model name."""
+   return hashlib.sha256(f"{model}\x00{normalize_prompt(prompt)}".encode("utf-8")).hexdigest()
+
+
+def ttl_for(agent: str) -> float:
+   """Returns the cache TTL in seconds for an agent type."""
+   return settings.LLM_CACHE_TTLS.get(agent, settings.LLM_CACHE_TTLS["default"])
+
+
+class LLMCache:
+   """Two-tier response cache: an in-memory LRU in front of a SQLite store that survives restarts.
+
+   Expired rows stay on disk for stale_grace seconds so get(..., allow_stale=True) can still answer
+   while the upstream is unavailable.
+   """
+
+   def __init__(self, path: str, memory_max_entries: int, disk_max_entries: int, stale_grace: float = 0.0):
+       self.path = path
+       self.memory_max_entries = memory_max_entries
+       self.disk_max_entries = disk_max_entries
+       self.stale_grace = stale_grace
+       self._memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+       self._conn: Optional[sqlite3.Connection] = None
+       self._lock = threading.Lock()
+       self._writes_since_prune = 0
+       self.memory_hits = 0
+       self.disk_hits = 0
+       self.misses = 0
+       self.stale_hits = 0
+       self.stores = 0
+       self.evictions = 0
+
+   def _connect(self) -> sqlite3.Connection:
+       if self._conn is None:
+           directory = os.path.dirname(self.path)
+           if directory:
+               os.makedirs(directory, exist_ok=True)
+           self._conn = sqlite3.connect(self.path, check_same_thread=False)
+           self._conn.execute("PRAGMA journal_mode=WAL")
+           self._conn.execute(
+               "CREATE TABLE IF NOT EXISTS llm_cache ("
+               "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+           )
+           self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_accessed ON llm_cache (accessed_at)")
+       return self._conn
+
+   def _remember(self, key: str, value: str, expires_at: float) -> None:
+       self._memory[key] = (value, expires_at)
+       self._memory.move_to_end(key)
+       while len(self._memory) > self.memory_max_entries:
+           self._memory.popitem(last=False)
+           self.evictions += 1
+
+   def _disk_get(self, key: str, allow_stale: bool = False) -> Optional[Tuple[str, float]]:
+       with self._lock:
+           conn = self._connect()
+           row = conn.execute("SELECT value, expires_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+           if row is None:
+               return None
+           now = time.time()
+           if row[1] <= now - self.stale_grace:
+               conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+               conn.commit()
+               return None
+           if row[1] <= now and not allow_stale:
+               return None
+           conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (time.time(), key))
+           conn.commit()
+           return row[0], row[1]
+
+   def _disk_set(self, key: str, value: str, expires_at: float) -> None:
+       with self._lock:
+           conn = self._connect()
+           conn.execute(
+               "INSERT OR REPLACE INTO llm_cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+               (key, value, expires_at, time.time()),
+           )
+           self._writes_since_prune += 1
+           if self._writes_since_prune >= 100:
+               self._prune(conn)
+           conn.commit()
+
+   def _prune(self, conn: sqlite3.Connection) -> None:
+       """Drops expired rows, then the least recently used rows above disk_max_entries."""
+       self._writes_since_prune = 0
+       conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (time.time() - self.stale_grace,))
+       overflow = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0] - self.disk_max_entries
+       if overflow > 0:
+           conn.execute(
+               "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY accessed_at LIMIT ?)",
+               (overflow,),
+           )
+           self.evictions += overflow
+
+   async def get(self, key: str, allow_stale: bool = False) -> Optional[str]:
+       """Returns the cached value; with allow_stale, also one that expired within the stale grace period."""
+       entry = self._memory.get(key)
+       if entry is not None:
+           if entry[1] > time.time():
+               self._memory.move_to_end(key)
+               self.memory_hits += 1
+               return entry[0]
+           del self._memory[key]
+       entry = await asyncio.to_thread(self._disk_get, key, allow_stale)
+       if entry is None:
+           self.misses += 1
+           return None
+       if entry[1] <= time.time():
+           self.stale_hits += 1
+           return entry[0]
+       self.disk_hits += 1
+       self._remember(key, *entry)
+       return entry[0]
+
+   async def set(self, key: str, value: str, ttl: float) -> None:
+       if ttl <= 0:
+           return
+       expires_at = time.time() + ttl
+       self._remember(key, value, expires_at)
+       self.stores += 1
+       await asyncio.to_thread(self._disk_set, key, value, expires_at)
+
+   def stats(self) -> dict:
+       lookups = self.memory_hits + self.disk_hits + self.misses
+       return {
+           "memory_hits": self.memory_hits,
+           "disk_hits": self.disk_hits,
+           "misses": self.misses,
+           "stale_hits": self.stale_hits,
+           "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+           "stores": self.stores,
+           "evictions": self.evictions,
+           "memory_entries": len(self._memory),
+       }
+
+   def close(self) -> None:
+       with self._lock:
+           if self._conn is not None:
+               self._conn.close()
+               self._conn = None
+
+
+llm_cache = LLMCache(
+   settings.LLM_CACHE_PATH,
+   memory_max_entries=settings.LLM_CACHE_MEMORY_ENTRIES,
+   disk_max_entries=settings.LLM_CACHE_DISK_ENTRIES,
+   stale_grace=settings.LLM_CACHE_STALE_GRACE_SECONDS,
+)
\ No newline at end of file
@@ -0,0 +1,131 @@
+# app/services/market_data.py
+from __future__ import annotations
+
+import asyncio
+from typing import Dict, List, Tuple
+
+from app.core.config import settings
+from app.core.lazy import lazy_module
+from app.services.history_batcher import HistoryBatcher, HistoryRequest, unpack_download
+from app.services.metrics import track
+from app.services.price_store import PERIOD_DAYS, decode_frame, encode_frame, is_storable, price_store
+from app.services.shared_cache import shared_cache
+from app.services.singleflight import SingleFlight
+from app.services.standin import LatencyProfile, StandInTicker, standin_download
+from app.services.tracing import span
+
+pd = lazy_module("pandas")
+yf = lazy_module("yfinance")
+
+info_flight = SingleFlight("info")
+history_flight = SingleFlight("history")
+
+
+def _standin_latency() -> LatencyProfile:
+   return LatencyProfile(
+       median_ms=settings.STANDIN_MARKET_LATENCY_MS,
+       sigma=settings.STANDIN_MARKET_LATENCY_SIGMA,
+       tail_rate=settings.STANDIN_MARKET_TAIL_RATE,
+       tail_ms=settings.STANDIN_MARKET_TAIL_MS,
+       fault_rate=settings.STANDIN_MARKET_FAULT_RATE,
+   )
+
+
+def make_ticker(symbol: str) -> yf.Ticker:
+   """Returns a yf.Ticker, or a synthetic stand-in with the same interface when MARKET_DATA_SOURCE is "standin"."""
+   if settings.MARKET_DATA_SOURCE == "standin":
+       return StandInTicker(symbol, _standin_latency())
+   return yf.Ticker(symbol)
+
+
+def download_history(symbols: List[str], request: HistoryRequest) -> Dict[str, pd.DataFrame]:
+   """Downloads daily bars for many tickers in one yf.download() call (or the stand-in's). Blocking.
+
+   Bars are adjusted and include dividends and splits, like ticker.history(), and keep their
+   exchange timezone so the price store can line them up with the bars it already holds.
+   """
+   if settings.MARKET_DATA_SOURCE == "standin":
+       frame = standin_download(symbols, _standin_latency(), **request.kwargs())
+   else:
+       frame = yf.download(
+           symbols, group_by="ticker", auto_adjust=True, actions=True, ignore_tz=False, progress=False,
+           threads=min(len(symbols), settings.HISTORY_BULK_THREADS), **request.kwargs(),
+       )
+   return unpack_download(frame, symbols)
+
+
+history_batcher = HistoryBatcher(
+   download_history,
+   window_seconds=settings.HISTORY_BULK_WINDOW_MS / 1000,
+   max_wait_seconds=settings.HISTORY_BULK_MAX_WAIT_MS / 1000,
+   max_symbols=settings.HISTORY_BULK_MAX_SYMBOLS,
+)
+
+
+async def fetch_info(ticker: yf.Ticker) -> dict:
+   """Fetches ticker.info off the event loop, sharing one upstream call between concurrent callers."""
+   async def load() -> dict:
+       with track("yf_info"):
+           return await asyncio.to_thread(lambda: ticker.info)
+
+   return await info_flight.do(ticker.ticker.upper(), load)
+
+
+async def fetch_history(ticker: yf.Ticker, period: str = "1y") -> pd.DataFrame:
+   """Fetches price history off the event loop, sharing one upstream call between concurrent callers.
+
+   Bars come from the incremental price store when it is enabled, so only bars newer than the
+   stored ones are downloaded, and are shared between worker processes through the shared cache
+   tier for PRICE_STORE_REFRESH_SECONDS. With HISTORY_BULK_ENABLED the download joins other
+   tickers' in one multi-symbol call. Each caller receives its own copy, since the agents append
+   indicator columns in place.
+   """
+   key = (ticker.ticker.upper(), period)
+
+   async def compute() -> Tuple[bytes, float]:
+       with track("yf_history"):
+           storable = settings.PRICE_STORE_ENABLED and period in PERIOD_DAYS and is_storable(ticker.ticker)
+           if not settings.HISTORY_BULK_ENABLED:
+               if storable:
+                   hist = await asyncio.to_thread(price_store.sync, ticker, period)
+               else:
+                   hist = await asyncio.to_thread(ticker.history, period=period)
+           elif storable:
+               hist = await _sync_bulk(key[0], period)
+           else:
+               hist = await history_batcher.fetch(key[0], HistoryRequest(period=period))
+       return encode_frame(hist), settings.PRICE_STORE_REFRESH_SECONDS
+
+   async def load() -> pd.DataFrame:
+       entry = await shared_cache.get_or_compute(f"bars:{key[0]}:{period}", compute)
+       return decode_frame(entry.value)
+
+   with span("history", period=period):
+       hist = await history_flight.do(key, load)
+   return hist.copy()
+
+
+async def _sync_bulk(symbol: str, period: str) -> pd.DataFrame:
+   """price_store.sync() with the download going through the history batcher."""
+   request = await asyncio.to_thread(price_store.plan, symbol, period)
+   while request is not None:
+       frame = await history_batcher.fetch(symbol, request)
+       request = await asyncio.to_thread(price_store.apply, symbol, request, frame)
+   return await asyncio.to_thread(price_store.read_frame, symbol, PERIOD_DAYS[period])
+
+
+async def prefetch_history(symbols: List[str], period: str = "1y") -> Dict[str, bool]:
+   """Warms the price history of many tickers at once, so their downloads share multi-symbol calls.
+
+   Returns whether each one has bars. Failures are printed rather than raised; the analyses that
+   follow report them per ticker.
+   """
+   async def warm(symbol: str) -> bool:
+       try:
+           return not (await fetch_history(make_ticker(symbol), period)).empty
+       except Exception as e:
+           print(f"Could not prefetch price history for {symbol}: {e}")
+           return False
+
+   results = await asyncio.gather(*(warm(symbol) for symbol in symbols))
+   return dict(zip((symbol.upper() for symbol in symbols), results))
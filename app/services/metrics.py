@@ -0,0 +1,260 @@
+# app/services/metrics.py
+"""In-process metrics rendered in the Prometheus text exposition format.
+
+Recording is a dict lookup plus a few additions, and is meant to happen on the event loop thread
+(time blocking work around the awaited asyncio.to_thread call, not inside the worker).
+"""
+import asyncio
+import bisect
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Sequence, Tuple
+
+from app.services.tracing import span
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0)
+
+_registry: List["_Metric"] = []
+
+
+def _escape(value: str) -> str:
+   return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+   pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+   if extra:
+       pairs.append(extra)
+   return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+   if value == float("inf"):
+       return "+Inf"
+   return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+   kind = "untyped"
+
+   def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+       self.name = name
+       self.documentation = documentation
+       self.labelnames = tuple(labelnames)
+       self._children: Dict[Tuple[str, ...], object] = {}
+       _registry.append(self)
+
+   def labels(self, *values: str):
+       child = self._children.get(values)
+       if child is None:
+           if len(values) != len(self.labelnames):
+               raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+           child = self._children[values] = self._new_child()
+       return child
+
+   def _new_child(self):
+       raise NotImplementedError
+
+   def _samples(self) -> List[str]:
+       raise NotImplementedError
+
+   def render(self) -> str:
+       header = f"# HELP {self.name} {self.documentation}\n# TYPE {self.name} {self.kind}\n"
+       return header + "".join(f"{line}\n" for line in self._samples())
+
+
+class _Value:
+   __slots__ = ("value",)
+
+   def __init__(self):
+       self.value = 0.0
+
+   def inc(self, amount: float = 1.0) -> None:
+       self.value += amount
+
+   def dec(self, amount: float = 1.0) -> None:
+       self.value -= amount
+
+   def set(self, value: float) -> None:
+       self.value = value
+
+
+class Counter(_Metric):
+   kind = "counter"
+
+   def _new_child(self) -> _Value:
+       return _Value()
+
+   def _samples(self) -> List[str]:
+       return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}"
+               for key, child in self._children.items()]
+
+
+class Gauge(Counter):
+   kind = "gauge"
+
+
+class GaugeFunc(_Metric):
+   """A gauge whose values are read from a callback at scrape time: fn() -> {label values: value}."""
+   kind = "gauge"
+
+   def __init__(self, name: str, documentation: str, fn: Callable[[], Dict[Tuple[str, ...], float]],
+                labelnames: Sequence[str] = ()):
+       super().__init__(name, documentation, labelnames)
+       self.fn = fn
+
+   def _samples(self) -> List[str]:
+       try:
+           values = self.fn()
+       except Exception as e:
+           print(f"Could not collect metric {self.name}: {e}")
+           return []
+       return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+               for key, value in values.items()]
+
+
+class _HistogramValue:
+   __slots__ = ("buckets", "counts", "sum")
+
+   def __init__(self, buckets: Tuple[float, ...]):
+       self.buckets = buckets
+       self.counts = [0] * (len(buckets) + 1)
+       self.sum = 0.0
+
+   def observe(self, value: float) -> None:
+       self.counts[bisect.bisect_left(self.buckets, value)] += 1
+       self.sum += value
+
+
+class Histogram(_Metric):
+   kind = "histogram"
+
+   def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                buckets: Sequence[float] = DEFAULT_BUCKETS):
+       super().__init__(name, documentation, labelnames)
+       self.buckets = tuple(sorted(buckets))
+
+   def _new_child(self) -> _HistogramValue:
+       return _HistogramValue(self.buckets)
+
+   def _samples(self) -> List[str]:
+       lines = []
+       for key, child in self._children.items():
+           cumulative = 0
+           for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+               cumulative += count
+               le = 'le="' + _format_value(bound) + '"'
+               lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+           lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {child.sum!r}")
+           lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+       return lines
+
+
+def render() -> str:
+   """Renders every registered metric in the Prometheus text format."""
+   return "".join(metric.render() for metric in _registry)
+
+
+stage_seconds = Histogram("screener_stage_seconds", "Latency of each analysis stage and upstream fetch.", ["stage"])
+stage_errors = Counter("screener_stage_errors_total", "Analysis stages and upstream fetches that raised.", ["stage"])
+stage_in_flight = Gauge("screener_stage_in_flight", "Analysis stages and upstream fetches currently running.", ["stage"])
+
+
+@contextmanager
+def track(stage: str):
+   """Records a block's latency, errors and in-flight count under the given stage label.
+
+   The block is also a span of the request's trace, when one is active.
+   """
+   in_flight = stage_in_flight.labels(stage)
+   in_flight.inc()
+   started = time.perf_counter()
+   try:
+       with span(stage):
+           yield
+   except asyncio.CancelledError:
+       raise
+   except BaseException:
+       stage_errors.labels(stage).inc()
+       raise
+   finally:
+       in_flight.dec()
+       stage_seconds.labels(stage).observe(time.perf_counter() - started)
+
+
+def _default_executor_stats() -> Dict[Tuple[str, ...], float]:
+   """Reads the default executor's private attributes, reporting only those this loop and Python version have."""
+   try:
+       loop = asyncio.get_running_loop()
+   except RuntimeError:
+       return {}
+   if not hasattr(loop, "_default_executor"):
+       return {}
+   executor = loop._default_executor
+   if executor is None:
+       return {("queued",): 0, ("threads",): 0, ("max_threads",): 0}
+   stats = {}
+   work_queue = getattr(executor, "_work_queue", None)
+   if hasattr(work_queue, "qsize"):
+       stats[("queued",)] = work_queue.qsize()
+   threads = getattr(executor, "_threads", None)
+   if threads is not None:
+       stats[("threads",)] = len(threads)
+   max_workers = getattr(executor, "_max_workers", None)
+   if max_workers is not None:
+       stats[("max_threads",)] = max_workers
+   return stats
+
+
+GaugeFunc("screener_executor", "Default thread pool used by asyncio.to_thread: queued work items and threads.",
+         _default_executor_stats, ["kind"])
+
+
+http_requests = Counter("screener_http_requests_total", "HTTP requests served.", ["method", "route", "status"])
+http_seconds = Histogram("screener_http_request_seconds", "Time to the end of each HTTP response.", ["method", "route"])
+http_in_flight = Gauge("screener_http_in_flight", "HTTP requests currently being served.")
+
+
+def _route_label(scope) -> str:
+   """The matched route's template, including any router prefix (newer FastAPI keeps it off the route)."""
+   route = scope.get("route")
+   path = getattr(route, "path", None)
+   if not path:
+       return "unmatched"
+   try:
+       rendered = route.path_format.format(**scope.get("path_params", {}))
+   except (AttributeError, KeyError, IndexError, ValueError):
+       return path
+   if rendered and scope["path"].endswith(rendered):
+       return scope["path"][: len(scope["path"]) - len(rendered)] + path
+   return path
+
+
+class MetricsMiddleware:
+   """ASGI middleware counting requests and timing them by route template (e.g. /api/analyze/{ticker})."""
+
+   def __init__(self, app):
+       self.app = app
+
+   async def __call__(self, scope, receive, send):
+       if scope["type"] != "http":
+           await self.app(scope, receive, send)
+           return
+       status = 500
+
+       async def send_wrapper(message):
+           nonlocal status
+           if message["type"] == "http.response.start":
+               status = message["status"]
+           await send(message)
+
+       in_flight = http_in_flight.labels()
+       in_flight.inc()
+       started = time.perf_counter()
+       try:
+           await self.app(scope, receive, send_wrapper)
+       finally:
+           in_flight.dec()
+           path = _route_label(scope)
+           http_requests.labels(scope["method"], path, str(status)).inc()
+           http_seconds.labels(scope["method"], path).observe(time.perf_counter() - started)
@@ -0,0 +1,424 @@
+# app/services/orders.py
+"""In-process order pipeline: an asyncio queue in front of a write-ahead log and a broker adapter.
+
+submit() queues an order and returns once it is durable. A single writer drains the queue in
+batches and commits each batch with one write and one fsync (group commit), so under load many
+orders share an fsync. A dispatcher sends durable orders to the broker adapter in batches and logs
+which ones the broker took. On start the log is replayed: orders without a "sent" record are sent
+again, using order_id as the client order id so the broker can drop the duplicates (delivery is
+at-least-once).
+"""
+import asyncio
+import importlib
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from fastapi import HTTPException
+
+from app.core.config import settings
+from app.services.metrics import Counter, GaugeFunc, Histogram, track
+
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+order_events = Counter("screener_orders_total", "Orders by side and outcome.", ["side", "outcome"])
+wal_batch_size = Histogram("screener_order_wal_batch_size", "Orders committed per WAL fsync.", buckets=BATCH_BUCKETS)
+broker_batch_size = Histogram("screener_order_broker_batch_size", "Orders sent per broker call.", buckets=BATCH_BUCKETS)
+
+
+class Order(NamedTuple):
+   order_id: str
+   side: str
+   ticker: str
+   quantity: int
+   idempotency_key: Optional[str]
+   accepted_at: float
+
+   def record(self) -> dict:
+       return {"op": "order", "id": self.order_id, "side": self.side, "ticker": self.ticker, "qty": self.quantity,
+               "key": self.idempotency_key, "ts": self.accepted_at}
+
+   @classmethod
+   def from_record(cls, record: dict) -> "Order":
+       return cls(record["id"], record["side"], record["ticker"], record["qty"], record.get("key"), record["ts"])
+
+
+class OrderLog:
+   """Append-only JSON-lines log on local disk; each append is one write and (optionally) one fsync."""
+
+   def __init__(self, path: str, fsync: bool = True):
+       self.path = path
+       self.fsync = fsync
+       self._lock = threading.Lock()
+       self._file = None
+       self.appends = 0
+       self.syncs = 0
+
+   def _open(self):
+       if self._file is None:
+           os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+           self._file = open(self.path, "ab")
+       return self._file
+
+   def replay(self) -> List[dict]:
+       """Returns every record in the log; a torn line left by a crash mid-write is skipped."""
+       records = []
+       try:
+           with open(self.path, "rb") as f:
+               for line in f:
+                   try:
+                       records.append(json.loads(line))
+                   except ValueError:
+                       print(f"Skipping unreadable order log line in {self.path}")
+       except FileNotFoundError:
+           pass
+       return records
+
+   def append(self, records: List[dict], sync: bool = True) -> None:
+       """Writes records as one append; with sync they are on stable storage when this returns. Blocking."""
+       data = b"".join(json.dumps(record, separators=(",", ":")).encode("utf-8") + b"\n" for record in records)
+       with self._lock:
+           f = self._open()
+           f.write(data)
+           f.flush()
+           if sync and self.fsync:
+               os.fsync(f.fileno())
+               self.syncs += 1
+           self.appends += 1
+
+   def rewrite(self, records: List[dict]) -> None:
+       """Atomically replaces the log with records (compaction). Blocking."""
+       tmp_path = f"{self.path}.tmp"
+       os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+       with self._lock:
+           with open(tmp_path, "wb") as f:
+               f.write(b"".join(json.dumps(record, separators=(",", ":")).encode("utf-8") + b"\n" for record in records))
+               f.flush()
+               if self.fsync:
+                   os.fsync(f.fileno())
+           if self._file is not None:
+               self._file.close()
+               self._file = None
+           os.replace(tmp_path, self.path)
+
+   def size(self) -> int:
+       try:
+           return os.path.getsize(self.path)
+       except OSError:
+           return 0
+
+   def close(self) -> None:
+       with self._lock:
+           if self._file is not None:
+               self._file.close()
+               self._file = None
+
+
+class BrokerAdapter:
+   """Interface for order destinations. send() takes a batch and returns {order_id: broker reference};
+   orders missing from the result, or a raised exception, are retried. Implementations should treat
+   order_id as a client order id and ignore repeats."""
+
+   async def send(self, orders: List[Order]) -> Dict[str, str]:
+       raise NotImplementedError
+
+   async def close(self) -> None:
+       pass
+
+
+class StubBroker(BrokerAdapter):
+   """Local stand-in broker: accepts every order after latency_ms per batch, ignoring repeated order ids.
+
+   Like a real broker's duplicate check it only remembers recent order ids: the oldest are dropped
+   once it holds max_references.
+   """
+
+   def __init__(self, latency_ms: float = 0.0, max_references: int = 100_000):
+       self.latency_ms = latency_ms
+       self.max_references = max_references
+       self.references: Dict[str, str] = {}
+       self.accepted = 0
+       self.batches = 0
+
+   async def send(self, orders: List[Order]) -> Dict[str, str]:
+       if self.latency_ms > 0:
+           await asyncio.sleep(self.latency_ms / 1000)
+       self.batches += 1
+       result = {}
+       for order in orders:
+           reference = self.references.get(order.order_id)
+           if reference is None:
+               self.accepted += 1
+               reference = self.references[order.order_id] = f"STUB-{self.accepted:08d}"
+           result[order.order_id] = reference
+       while len(self.references) > self.max_references:
+           del self.references[next(iter(self.references))]
+       return result
+
+
+def make_broker(name: str) -> BrokerAdapter:
+   """Builds the broker adapter named by ORDER_BROKER: "stub", or "package.module:ClassName"."""
+   if name == "stub":
+       return StubBroker(settings.STANDIN_BROKER_LATENCY_MS)
+   module_name, _, class_name = name.partition(":")
+   if not class_name:
+       raise ValueError(f"Unknown order broker '{name}'; use 'stub' or 'package.module:ClassName'.")
+   return getattr(importlib.import_module(module_name), class_name)()
+
+
+class OrderPipeline:
+   """Accepts orders into a queue, commits them to the order log in groups and forwards them to a broker.
+
+   The log is compacted down to the live orders at start and, while running, whenever it grows past
+   compact_bytes (or twice its size after the last compaction, when the live orders alone are larger).
+   """
+
+   def __init__(self, log: OrderLog, broker: BrokerAdapter, queue_max: int, wal_batch: int, broker_batch: int,
+                retry_seconds: float, idempotency_ttl: float, compact_bytes: int = 64 * 1024 * 1024):
+       self.log = log
+       self.broker = broker
+       self.queue_max = queue_max
+       self.wal_batch = wal_batch
+       self.broker_batch = broker_batch
+       self.retry_seconds = retry_seconds
+       self.idempotency_ttl = idempotency_ttl
+       self.compact_bytes = compact_bytes
+       self._compact_at = compact_bytes
+       # Held while sent records are appended and while the log is rewritten, so none land in the replaced file
+       self._log_lock = asyncio.Lock()
+       self._orders: Dict[str, Order] = {}
+       self._sent: Dict[str, str] = {}
+       self._keys: Dict[str, str] = {}
+       self._durable: Dict[str, asyncio.Future] = {}
+       self._incoming: Optional[asyncio.Queue] = None
+       self._outgoing: Optional[asyncio.Queue] = None
+       self._tasks: List[asyncio.Task] = []
+       self._accepting = False
+       self._last_prune = time.time()
+       self.recovered = 0
+       self.duplicates = 0
+       self.compactions = 0
+
+   async def start(self) -> None:
+       """Replays and compacts the log, re-queues unsent orders, then starts the writer and dispatcher."""
+       if self._tasks:
+           return
+       records = await asyncio.to_thread(self.log.replay)
+       for record in records:
+           if record.get("op") == "order":
+               order = Order.from_record(record)
+               self._orders[order.order_id] = order
+               if order.idempotency_key:
+                   self._keys[order.idempotency_key] = order.order_id
+           elif record.get("op") == "sent":
+               self._sent[record["id"]] = record["ref"]
+       await self._compact()
+       self._incoming = asyncio.Queue(maxsize=self.queue_max)
+       self._outgoing = asyncio.Queue()
+       pending = [order for order_id, order in self._orders.items() if order_id not in self._sent]
+       for order in pending:
+           self._outgoing.put_nowait(order)
+       self.recovered = len(pending)
+       if pending:
+           print(f"Re-sending {len(pending)} orders recovered from {self.log.path}")
+       self._tasks = [asyncio.create_task(self._write_loop()), asyncio.create_task(self._dispatch_loop())]
+       self._accepting = True
+
+   async def stop(self) -> None:
+       """Stops accepting orders, commits the queued ones and stops; unsent orders are resent on next start."""
+       self._accepting = False
+       if self._incoming is not None and self._tasks:
+           await self._incoming.join()
+       for task in self._tasks:
+           task.cancel()
+       await asyncio.gather(*self._tasks, return_exceptions=True)
+       self._tasks = []
+       await self.broker.close()
+       self.log.close()
+
+   async def submit(self, side: str, ticker: str, quantity: int, idempotency_key: Optional[str] = None) -> Tuple[Order, bool]:
+       """Queues an order and waits until it is in the log; returns (order, whether it repeats an earlier key).
+
+       Raises a 409 HTTPException when the key was used for a different order, and 503 when the
+       pipeline is not running, its queue is full or the log write failed.
+       """
+       ticker = ticker.strip().upper()
+       if idempotency_key:
+           existing = self._orders.get(self._keys.get(idempotency_key, ""))
+           if existing is not None:
+               if (existing.side, existing.ticker, existing.quantity) != (side, ticker, quantity):
+                   raise HTTPException(status_code=409, detail="Idempotency key was already used for a different order.")
+               self.duplicates += 1
+               order_events.labels(side, "duplicate").inc()
+               if existing.order_id in self._durable:
+                   await asyncio.shield(self._durable[existing.order_id])
+               return existing, True
+       if not self._accepting:
+           raise HTTPException(status_code=503, detail="Order pipeline is not running.")
+       order = Order(uuid.uuid4().hex, side, ticker, quantity, idempotency_key or None, time.time())
+       durable = asyncio.get_running_loop().create_future()
+       try:
+           self._incoming.put_nowait((order, durable))
+       except asyncio.QueueFull:
+           order_events.labels(side, "rejected").inc()
+           raise HTTPException(status_code=503, detail="Order queue is full; retry shortly.")
+       self._orders[order.order_id] = order
+       self._durable[order.order_id] = durable
+       if idempotency_key:
+           self._keys[idempotency_key] = order.order_id
+       await asyncio.shield(durable)
+       order_events.labels(side, "accepted").inc()
+       return order, False
+
+   def get(self, order_id: str) -> Tuple[Order, str, Optional[str]]:
+       """Returns (order, status, broker reference); status is queued, pending or sent. 404 if unknown."""
+       order = self._orders.get(order_id)
+       if order is None:
+           raise HTTPException(status_code=404, detail=f"Order '{order_id}' not found.")
+       if order_id in self._durable:
+           return order, "queued", None
+       reference = self._sent.get(order_id)
+       return order, "sent" if reference else "pending", reference
+
+   async def _write_loop(self) -> None:
+       while True:
+           batch = [await self._incoming.get()]
+           while len(batch) < self.wal_batch and not self._incoming.empty():
+               batch.append(self._incoming.get_nowait())
+           try:
+               with track("order_wal"):
+                   await asyncio.to_thread(self.log.append, [order.record() for order, _ in batch])
+           except Exception as e:
+               print(f"Could not write {len(batch)} orders to {self.log.path}: {e}")
+               for order, durable in batch:
+                   self._forget(order)
+                   if not durable.done():
+                       durable.set_exception(HTTPException(status_code=503, detail="Order could not be recorded."))
+           else:
+               wal_batch_size.labels().observe(len(batch))
+               for order, durable in batch:
+                   self._durable.pop(order.order_id, None)
+                   self._outgoing.put_nowait(order)
+                   if not durable.done():
+                       durable.set_result(None)
+               # Only this loop appends orders, so the snapshot cannot miss one that is being written
+               if self.log.size() >= self._compact_at:
+                   await self._compact()
+           finally:
+               for _ in batch:
+                   self._incoming.task_done()
+
+   async def _dispatch_loop(self) -> None:
+       delay = self.retry_seconds
+       while True:
+           batch = [await self._outgoing.get()]
+           while len(batch) < self.broker_batch and not self._outgoing.empty():
+               batch.append(self._outgoing.get_nowait())
+           while batch:
+               try:
+                   with track("broker"):
+                       references = await self.broker.send(batch)
+               except Exception as e:
+                   print(f"Broker rejected a batch of {len(batch)} orders, retrying in {delay:.1f}s: {e}")
+                   references = {}
+               sent = [order for order in batch if references.get(order.order_id)]
+               if sent:
+                   broker_batch_size.labels().observe(len(sent))
+                   for order in sent:
+                       self._sent[order.order_id] = references[order.order_id]
+                       order_events.labels(order.side, "sent").inc()
+                   try:
+                       async with self._log_lock:
+                           await asyncio.to_thread(
+                               self.log.append,
+                               [{"op": "sent", "id": order.order_id, "ref": references[order.order_id]} for order in sent],
+                               False,
+                           )
+                   except Exception as e:
+                       print(f"Could not record {len(sent)} sent orders in {self.log.path}: {e}")
+               batch = [order for order in batch if not references.get(order.order_id)]
+               if batch:
+                   await asyncio.sleep(delay)
+                   delay = min(delay * 2, 30.0)
+               else:
+                   delay = self.retry_seconds
+           now = time.time()
+           if now - self._last_prune >= 60:
+               self._prune(now)
+
+   def _forget(self, order: Order) -> None:
+       self._orders.pop(order.order_id, None)
+       self._durable.pop(order.order_id, None)
+       if order.idempotency_key and self._keys.get(order.idempotency_key) == order.order_id:
+           del self._keys[order.idempotency_key]
+
+   def _prune(self, now: float) -> None:
+       """Drops sent orders older than the idempotency window from memory."""
+       self._last_prune = now
+       expired = [order for order_id, order in self._orders.items()
+                  if order_id in self._sent and now - order.accepted_at > self.idempotency_ttl]
+       for order in expired:
+           self._forget(order)
+           self._sent.pop(order.order_id, None)
+
+   async def _compact(self) -> None:
+       """Prunes expired orders and rewrites the log down to the live ones."""
+       async with self._log_lock:
+           self._prune(time.time())
+           try:
+               await asyncio.to_thread(self.log.rewrite, self._snapshot())
+           except Exception as e:
+               print(f"Could not compact {self.log.path}: {e}")
+           else:
+               self.compactions += 1
+       self._compact_at = max(self.compact_bytes, 2 * self.log.size())
+
+   def _snapshot(self) -> List[dict]:
+       """Records for every order already in the log; queued ones are appended by the writer after."""
+       records = []
+       for order_id, order in self._orders.items():
+           if order_id in self._durable:
+               continue
+           records.append(order.record())
+           if order_id in self._sent:
+               records.append({"op": "sent", "id": order_id, "ref": self._sent[order_id]})
+       return records
+
+   def depth(self) -> Dict[Tuple[str, ...], float]:
+       return {
+           ("wal",): self._incoming.qsize() if self._incoming is not None else 0,
+           ("broker",): self._outgoing.qsize() if self._outgoing is not None else 0,
+       }
+
+   def stats(self) -> dict:
+       sent = sum(1 for order_id in self._orders if order_id in self._sent)
+       return {
+           "running": bool(self._tasks),
+           "orders": len(self._orders),
+           "pending": len(self._orders) - sent,
+           "sent": sent,
+           "duplicates": self.duplicates,
+           "recovered": self.recovered,
+           "queued": {key[0]: value for key, value in self.depth().items()},
+           "log_appends": self.log.appends,
+           "log_fsyncs": self.log.syncs,
+           "log_bytes": self.log.size(),
+           "log_compactions": self.compactions,
+       }
+
+
+order_pipeline = OrderPipeline(
+   OrderLog(settings.ORDER_WAL_PATH, fsync=settings.ORDER_WAL_FSYNC),
+   make_broker(settings.ORDER_BROKER),
+   queue_max=settings.ORDER_QUEUE_MAX,
+   wal_batch=settings.ORDER_WAL_MAX_BATCH,
+   broker_batch=settings.ORDER_BROKER_BATCH,
+   retry_seconds=settings.ORDER_BROKER_RETRY_SECONDS,
+   idempotency_ttl=settings.ORDER_IDEMPOTENCY_TTL_SECONDS,
+   compact_bytes=settings.ORDER_WAL_COMPACT_BYTES,
+)
+
+GaugeFunc("screener_order_queue_depth", "Orders waiting for the log writer or the broker.", order_pipeline.depth, ["queue"])
\ No newline at end of file
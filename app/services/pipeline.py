@@ -0,0 +1,72 @@
+# app/services/pipeline.py
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from app.services.metrics import Counter, track
+
+stage_degraded = Counter(
+   "screener_pipeline_degraded_total", "Pipeline stages replaced by a degraded result.", ["stage", "reason"]
+)
+
+
+class Stage(NamedTuple):
+   """One node of the pipeline graph.
+
+   run receives the results of its dependencies as keyword arguments. fallback builds a degraded
+   result from whatever upstream results exist when the stage times out or fails.
+   """
+   name: str
+   run: Callable[..., Awaitable[Any]]
+   deps: Tuple[str, ...]
+   timeout: float
+   fallback: Callable[[Dict[str, Any]], Any]
+
+
+async def run_graph(
+   stages: List[Stage],
+   deadline: float,
+   on_result: Optional[Callable[[str, Any], None]] = None,
+) -> Tuple[Dict[str, Any], List[str]]:
+   """Runs each stage as soon as its dependencies finish, within its own timeout and the overall deadline.
+
+   Returns the results by stage name and the names of stages that fell back to a degraded result.
+   Dependents of a degraded stage still run, on the degraded input. on_result, if given, is called
+   with each stage's name and result as soon as that stage finishes.
+   """
+   expires_at = time.monotonic() + deadline
+   results: Dict[str, Any] = {}
+   degraded: List[str] = []
+   tasks: Dict[str, asyncio.Task] = {}
+
+   async def execute(stage: Stage) -> Any:
+       await asyncio.gather(*(tasks[dep] for dep in stage.deps))
+       inputs = {dep: results[dep] for dep in stage.deps}
+       budget = min(stage.timeout, expires_at - time.monotonic())
+       try:
+           if budget <= 0:
+               raise asyncio.TimeoutError()
+           with track(stage.name):
+               results[stage.name] = await asyncio.wait_for(stage.run(**inputs), timeout=budget)
+       except asyncio.TimeoutError:
+           print(f"Pipeline stage '{stage.name}' missed its {budget:.1f}s budget; using a degraded result.")
+           stage_degraded.labels(stage.name, "timeout").inc()
+           degraded.append(stage.name)
+           results[stage.name] = stage.fallback(dict(results))
+       except Exception as e:
+           print(f"Pipeline stage '{stage.name}' failed: {e}; using a degraded result.")
+           stage_degraded.labels(stage.name, "error").inc()
+           degraded.append(stage.name)
+           results[stage.name] = stage.fallback(dict(results))
+       if on_result is not None:
+           on_result(stage.name, results[stage.name])
+       return results[stage.name]
+
+   for stage in stages:
+       tasks[stage.name] = asyncio.ensure_future(execute(stage))
+   try:
+       await asyncio.gather(*tasks.values())
+   finally:
+       for task in tasks.values():
+           task.cancel()
+   return results, degraded
\ No newline at end of file
@@ -0,0 +1,197 @@
+# app/services/portfolio.py
+import asyncio
+import bisect
+import hashlib
+import os
+import re
+import time
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Tuple
+
+from fastapi import HTTPException
+
+from app.core.config import settings
+
+DEFAULT_PORTFOLIO = ["AAPL", "GOOGL", "MSFT", "NVDA", "TSLA"]
+DEFAULT_NAME = "default"
+_NAME_RE = re.compile(r"^[a-z0-9][a-z0-9_\-]{0,63}$")
+
+
+def parse_tickers(lines: Iterable[str]) -> List[str]:
+   """Upper-cases, de-duplicates and sorts tickers, one per line; blank lines and # comments are skipped."""
+   tickers = {line.split("#", 1)[0].strip().upper() for line in lines}
+   tickers.discard("")
+   return sorted(tickers)
+
+
+class Portfolio:
+   """An immutable, indexed snapshot of one portfolio.
+
+   tickers is sorted, so pages are slices and prefix searches are two bisections; members gives
+   O(1) membership checks. digest identifies the ticker list, for ETags on the pages served from it.
+   """
+   __slots__ = ("name", "tickers", "members", "loaded_at", "digest")
+
+   def __init__(self, name: str, tickers: List[str]):
+       self.name = name
+       self.tickers: Tuple[str, ...] = tuple(tickers)
+       self.members: FrozenSet[str] = frozenset(self.tickers)
+       self.loaded_at = time.time()
+       self.digest = hashlib.sha256("\n".join(self.tickers).encode("utf-8")).hexdigest()
+
+   def __len__(self) -> int:
+       return len(self.tickers)
+
+   def __contains__(self, symbol: str) -> bool:
+       return symbol.upper() in self.members
+
+   def search(self, prefix: str = "", offset: int = 0, limit: Optional[int] = None) -> Tuple[int, List[str]]:
+       """Returns (number of matches, one page of them) for tickers starting with prefix."""
+       prefix = prefix.upper()
+       lo = bisect.bisect_left(self.tickers, prefix) if prefix else 0
+       hi = bisect.bisect_left(self.tickers, prefix + "\uffff") if prefix else len(self.tickers)
+       start = min(hi, lo + max(0, offset))
+       end = hi if limit is None else min(hi, start + max(0, limit))
+       return hi - lo, list(self.tickers[start:end])
+
+
+class _Source(NamedTuple):
+   path: str
+   mtime_ns: int
+   size: int
+
+
+class PortfolioStore:
+   """Named portfolios held in memory and reloaded only when their files change.
+
+   The default portfolio is portfolio_file; every <name>.txt in directory is another portfolio.
+   Reads never touch the disk once loaded: a background watcher polls the files' mtimes and swaps
+   in a new snapshot for each one that changed.
+   """
+
+   def __init__(self, portfolio_file: str, directory: str, poll_seconds: float):
+       self.portfolio_file = portfolio_file
+       self.directory = directory
+       self.poll_seconds = poll_seconds
+       self._portfolios: Dict[str, Portfolio] = {}
+       self._sources: Dict[str, Optional[_Source]] = {}
+       self._loaded = False
+       self._task: Optional[asyncio.Task] = None
+       self.reloads = 0
+
+   def _discover(self) -> Dict[str, str]:
+       paths = {DEFAULT_NAME: self.portfolio_file}
+       try:
+           entries = os.listdir(self.directory)
+       except OSError:
+           entries = []
+       for entry in entries:
+           name, ext = os.path.splitext(entry)
+           name = name.lower()
+           if ext == ".txt" and _NAME_RE.match(name) and name != DEFAULT_NAME:
+               paths[name] = os.path.join(self.directory, entry)
+       return paths
+
+   @staticmethod
+   def _stat(path: str) -> Optional[_Source]:
+       try:
+           st = os.stat(path)
+       except OSError:
+           return None
+       return _Source(path, st.st_mtime_ns, st.st_size)
+
+   def _load(self, name: str, source: Optional[_Source]) -> Portfolio:
+       tickers: List[str] = []
+       if source is not None:
+           try:
+               with open(source.path, "r") as f:
+                   tickers = parse_tickers(f)
+           except Exception as e:
+               print(f"Could not read portfolio '{name}' from {source.path}: {e}")
+               previous = self._portfolios.get(name)
+               if previous is not None:
+                   return previous
+       if not tickers and name == DEFAULT_NAME:
+           tickers = sorted(DEFAULT_PORTFOLIO)
+       return Portfolio(name, tickers)
+
+   def refresh(self) -> bool:
+       """Reloads portfolios whose files were added, changed or removed; returns whether any did. Blocking."""
+       sources = {name: self._stat(path) for name, path in self._discover().items()}
+       if self._loaded and sources == self._sources:
+           return False
+       portfolios = {}
+       for name, source in sources.items():
+           if source is None and name != DEFAULT_NAME:
+               continue
+           unchanged = self._loaded and self._sources.get(name) == source and name in self._portfolios
+           portfolios[name] = self._portfolios[name] if unchanged else self._load(name, source)
+       self._portfolios, self._sources, self._loaded = portfolios, sources, True
+       self.reloads += 1
+       return True
+
+   def get(self, name: str = DEFAULT_NAME) -> Portfolio:
+       """Returns a portfolio by name, raising a 404 HTTPException for unknown names."""
+       if not self._loaded:
+           self.refresh()
+       portfolio = self._portfolios.get(name.lower())
+       if portfolio is None:
+           raise HTTPException(status_code=404, detail=f"Portfolio '{name}' not found.")
+       return portfolio
+
+   def names(self) -> List[str]:
+       if not self._loaded:
+           self.refresh()
+       return sorted(self._portfolios)
+
+   def contains(self, symbol: str, names: Optional[Iterable[str]] = None) -> bool:
+       """Whether symbol is in any of the named portfolios (all of them by default)."""
+       if not self._loaded:
+           self.refresh()
+       symbol = symbol.upper()
+       names = self._portfolios if names is None else names
+       return any(symbol in self._portfolios[name].members for name in names if name in self._portfolios)
+
+   def tickers(self, names: Optional[Iterable[str]] = None) -> List[str]:
+       """Sorted union of the named portfolios' tickers (all of them by default)."""
+       if not self._loaded:
+           self.refresh()
+       names = self._portfolios if names is None else names
+       return sorted(set().union(*(self._portfolios[name].members for name in names if name in self._portfolios)))
+
+   def start(self) -> None:
+       if self._task is None and self.poll_seconds > 0:
+           self._task = asyncio.create_task(self._watch())
+
+   async def stop(self) -> None:
+       if self._task is not None:
+           self._task.cancel()
+           await asyncio.gather(self._task, return_exceptions=True)
+           self._task = None
+
+   async def _watch(self) -> None:
+       while True:
+           try:
+               if await asyncio.to_thread(self.refresh):
+                   print(f"Reloaded portfolios: {', '.join(self.names())}")
+           except Exception as e:
+               print(f"Could not reload portfolios: {e}")
+           await asyncio.sleep(self.poll_seconds)
+
+   def stats(self) -> dict:
+       return {
+           "portfolios": {name: len(portfolio) for name, portfolio in sorted(self._portfolios.items())},
+           "reloads": self.reloads,
+           "watching": self._task is not None,
+       }
+
+
+portfolio_store = PortfolioStore(
+   settings.PORTFOLIO_FILE,
+   settings.PORTFOLIO_DIR,
+   poll_seconds=settings.PORTFOLIO_WATCH_SECONDS,
+)
+
+
+def load_portfolio(name: str = DEFAULT_NAME) -> List[str]:
+   """Returns a portfolio's tickers, de-duplicated and sorted, from the in-memory store."""
+   return list(portfolio_store.get(name).tickers)
\ No newline at end of file
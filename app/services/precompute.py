@@ -0,0 +1,189 @@
+# app/services/precompute.py
+import asyncio
+import random
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from app.core.config import settings
+from app.models.schemas import StockAnalysis
+from app.services.analysis import run_analysis
+from app.services.market_data import prefetch_history
+from app.services.portfolio import portfolio_store
+from app.services.rate_limiter import PRIORITY_BACKGROUND, request_priority
+from app.services.responses import strong_etag
+from app.services.tracing import detach
+
+
+class StoredAnalysis(NamedTuple):
+   analysis: StockAnalysis
+   computed_at: float
+   # JSON body and strong ETag, encoded once when stored rather than on every request
+   body: bytes
+   etag: str
+
+   @property
+   def age(self) -> float:
+       return max(0.0, time.time() - self.computed_at)
+
+
+class ResultStore:
+   """Latest StockAnalysis per ticker, bounded with LRU eviction.
+
+   Pinned tickers (those the scheduler keeps warm) are evicted only when nothing else is left,
+   so a burst of one-off lookups cannot push the precomputed universe out.
+   """
+
+   def __init__(self, max_entries: int, pinned: Callable[[str], bool] = lambda symbol: False):
+       self.max_entries = max_entries
+       self.pinned = pinned
+       self._results: "OrderedDict[str, StoredAnalysis]" = OrderedDict()
+
+   def get(self, symbol: str) -> Optional[StoredAnalysis]:
+       stored = self._results.get(symbol.upper())
+       if stored is not None:
+           self._results.move_to_end(symbol.upper())
+       return stored
+
+   def put(self, symbol: str, analysis: StockAnalysis, computed_at: Optional[float] = None) -> StoredAnalysis:
+       body = analysis.model_dump_json().encode("utf-8")
+       stored = StoredAnalysis(analysis, time.time() if computed_at is None else computed_at, body, strong_etag(body))
+       self._results[symbol.upper()] = stored
+       self._results.move_to_end(symbol.upper())
+       while len(self._results) > self.max_entries:
+           victim = next((key for key in self._results if not self.pinned(key)), None)
+           if victim is None:
+               self._results.popitem(last=False)
+           else:
+               del self._results[victim]
+       return stored
+
+   def __len__(self) -> int:
+       return len(self._results)
+
+
+class PrecomputeScheduler:
+   """Refreshes analyses for a known ticker universe in the background and serves them stale-while-revalidate."""
+
+   def __init__(self, store: ResultStore, universe: Callable[[], List[str]]):
+       self.store = store
+       self.universe = universe
+       self._task: Optional[asyncio.Task] = None
+       self._refreshing: Dict[str, asyncio.Task] = {}
+       self.cycles = 0
+       self.refreshes = 0
+       self.refresh_failures = 0
+       self.fresh_hits = 0
+       self.stale_hits = 0
+       self.misses = 0
+
+   def start(self) -> None:
+       if self._task is None:
+           self._task = asyncio.create_task(self._run())
+
+   async def stop(self) -> None:
+       tasks = [task for task in [self._task, *self._refreshing.values()] if task is not None]
+       for task in tasks:
+           task.cancel()
+       await asyncio.gather(*tasks, return_exceptions=True)
+       self._task = None
+
+   async def _run(self) -> None:
+       while True:
+           try:
+               await self.refresh_all(self.universe())
+           except Exception as e:
+               print(f"Precompute cycle failed: {e}")
+           self.cycles += 1
+           jitter = random.uniform(-settings.PRECOMPUTE_JITTER, settings.PRECOMPUTE_JITTER)
+           await asyncio.sleep(max(1.0, settings.PRECOMPUTE_INTERVAL_SECONDS * (1 + jitter)))
+
+   async def refresh_all(self, symbols: List[str]) -> None:
+       """Refreshes every symbol, at most PRECOMPUTE_CONCURRENCY at a time, with staggered starts.
+
+       The prices for the whole universe are fetched first, in multi-symbol downloads, so the
+       staggered refreshes find them in the cache instead of each making its own call.
+       """
+       if settings.HISTORY_BULK_ENABLED:
+           await prefetch_history(symbols)
+       semaphore = asyncio.Semaphore(max(1, settings.PRECOMPUTE_CONCURRENCY))
+       spread = settings.PRECOMPUTE_INTERVAL_SECONDS * settings.PRECOMPUTE_JITTER
+
+       async def refresh_one(symbol: str) -> None:
+           await asyncio.sleep(random.uniform(0, spread))
+           async with semaphore:
+               await self._refresh(symbol)
+
+       await asyncio.gather(*(refresh_one(symbol) for symbol in symbols))
+
+   async def _refresh(self, symbol: str) -> Optional[StockAnalysis]:
+       request_priority.set(PRIORITY_BACKGROUND)
+       detach()
+       try:
+           analysis, computed_at = await run_analysis(symbol)
+       except Exception as e:
+           self.refresh_failures += 1
+           print(f"Could not refresh analysis for {symbol}: {e}")
+           return None
+       self.refreshes += 1
+       self.store.put(symbol, analysis, computed_at)
+       return analysis
+
+   def refresh_in_background(self, symbol: str) -> None:
+       """Starts a refresh for symbol unless one is already running."""
+       symbol = symbol.upper()
+       if symbol in self._refreshing:
+           return
+       task = asyncio.create_task(self._refresh(symbol))
+       self._refreshing[symbol] = task
+       task.add_done_callback(lambda done: self._refreshing.pop(symbol, None))
+
+   async def get_stored(self, symbol: str) -> Tuple[StoredAnalysis, str]:
+       """Returns (stored analysis, status) where status is fresh, stale or computed.
+
+       A stored result is returned immediately; if it is older than PRECOMPUTE_STALE_SECONDS, or
+       degraded, a background refresh is started. Without a stored result the analysis runs inline.
+       """
+       stored = self.store.get(symbol)
+       if stored is not None:
+           # A degraded result is served, but always counts as stale so it gets replaced
+           if stored.age < settings.PRECOMPUTE_STALE_SECONDS and not stored.analysis.degraded:
+               self.fresh_hits += 1
+               return stored, "fresh"
+           self.stale_hits += 1
+           self.refresh_in_background(symbol)
+           return stored, "stale"
+       self.misses += 1
+       analysis, computed_at = await run_analysis(symbol)
+       return self.store.put(symbol, analysis, computed_at), "computed"
+
+   async def get_analysis(self, symbol: str) -> Tuple[StockAnalysis, float, str]:
+       """Returns (analysis, age in seconds, status); see get_stored()."""
+       stored, status = await self.get_stored(symbol)
+       return stored.analysis, stored.age, status
+
+   def stats(self) -> dict:
+       return {
+           "cycles": self.cycles,
+           "refreshes": self.refreshes,
+           "refresh_failures": self.refresh_failures,
+           "fresh_hits": self.fresh_hits,
+           "stale_hits": self.stale_hits,
+           "misses": self.misses,
+           "stored_results": len(self.store),
+       }
+
+
+def _precompute_portfolios() -> Optional[List[str]]:
+   names = [name.strip().lower() for name in settings.PRECOMPUTE_PORTFOLIOS.split(",") if name.strip()]
+   return None if "*" in names else names
+
+
+result_store = ResultStore(
+   settings.RESULT_STORE_MAX_ENTRIES,
+   pinned=lambda symbol: portfolio_store.contains(symbol, _precompute_portfolios()),
+)
+precompute_scheduler = PrecomputeScheduler(
+   result_store,
+   universe=lambda: portfolio_store.tickers(_precompute_portfolios()),
+)
\ No newline at end of file
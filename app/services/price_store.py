@@ -0,0 +1,301 @@
+# app/services/price_store.py
+from __future__ import annotations
+
+import io
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from typing import Dict, Optional
+
+from app.core.config import settings
+from app.core.lazy import lazy_module
+from app.services.history_batcher import HistoryRequest
+
+np = lazy_module("numpy")
+pd = lazy_module("pandas")
+yf = lazy_module("yfinance")
+
+# One append-only binary file per column; timestamps are int64 UTC nanoseconds, prices float64
+COLUMNS = ("Open", "High", "Low", "Close", "Volume")
+PERIOD_DAYS = {"1mo": 31, "3mo": 92, "6mo": 183, "1y": 366, "2y": 731, "5y": 1827}
+_SYMBOL_RE = re.compile(r"^[A-Z0-9^=][A-Z0-9.^=\-]{0,15}$")
+
+
+def is_storable(symbol: str) -> bool:
+   """True if a symbol is safe to use as a directory name in the store."""
+   return bool(_SYMBOL_RE.match(symbol.upper()))
+
+
+def index_to_ns(index: pd.DatetimeIndex) -> np.ndarray:
+   return index.tz_convert("UTC").as_unit("ns").asi8.astype(np.int64)
+
+
+def encode_frame(frame: pd.DataFrame) -> bytes:
+   """Serializes daily bars as npz columns (timestamps, timezone, one array per column), without pickle."""
+   index = frame.index if frame.index.tz is not None else frame.index.tz_localize("UTC")
+   arrays = {
+       "ts": index_to_ns(index),
+       "tz": np.array(str(index.tz)),
+       "columns": np.array([str(column) for column in frame.columns], dtype=str),
+   }
+   for position, column in enumerate(frame.columns):
+       values = frame[column].to_numpy()
+       arrays[f"c{position}"] = values if values.dtype.kind in "biuf" else values.astype(np.float64)
+   buffer = io.BytesIO()
+   np.savez(buffer, **arrays)
+   return buffer.getvalue()
+
+
+def decode_frame(data: bytes) -> pd.DataFrame:
+   """Inverse of encode_frame(); refuses pickled arrays, since the bytes may come from another process."""
+   with np.load(io.BytesIO(data), allow_pickle=False) as arrays:
+       index = pd.to_datetime(arrays["ts"], utc=True).tz_convert(str(arrays["tz"]))
+       columns = [str(column) for column in arrays["columns"]]
+       return pd.DataFrame({column: arrays[f"c{position}"] for position, column in enumerate(columns)},
+                           index=index, columns=columns)
+
+
+class PriceStore:
+   """Per-ticker columnar OHLCV store on local disk.
+
+   Each ticker lives in its own directory with one raw file per column, so new bars are plain
+   appends and reads are np.memmap views. Only bars after the last stored one are fetched from
+   the data source; a split, dividend or a changed overlapping bar forces a full resync because
+   yfinance back-adjusts the whole series.
+   """
+
+   def __init__(self, root: str, refresh_seconds: float, retain_days: int):
+       self.root = root
+       self.refresh_seconds = refresh_seconds
+       self.retain_days = retain_days
+       self._locks: Dict[str, threading.Lock] = {}
+       self._locks_guard = threading.Lock()
+       self.full_fetches = 0
+       self.incremental_fetches = 0
+       self.fresh_reads = 0
+       self.bars_fetched = 0
+
+   def _lock_for(self, symbol: str) -> threading.Lock:
+       with self._locks_guard:
+           return self._locks.setdefault(symbol, threading.Lock())
+
+   def _dir(self, symbol: str) -> str:
+       return os.path.join(self.root, symbol)
+
+   def _path(self, symbol: str, column: str) -> str:
+       return os.path.join(self._dir(symbol), f"{column}.f8" if column != "ts" else "ts.i8")
+
+   def _read_meta(self, symbol: str) -> Optional[dict]:
+       try:
+           with open(os.path.join(self._dir(symbol), "meta.json"), "r") as f:
+               return json.load(f)
+       except (OSError, ValueError):
+           return None
+
+   def _write_meta(self, symbol: str, meta: dict) -> None:
+       path = os.path.join(self._dir(symbol), "meta.json")
+       with open(path + ".tmp", "w") as f:
+           json.dump(meta, f)
+       os.replace(path + ".tmp", path)
+
+   def _length(self, symbol: str) -> int:
+       """Number of complete rows; a torn append leaves some columns longer, so take the minimum."""
+       sizes = []
+       for column in ("ts",) + COLUMNS:
+           try:
+               sizes.append(os.path.getsize(self._path(symbol, column)) // 8)
+           except OSError:
+               return 0
+       return min(sizes)
+
+   def read_arrays(self, symbol: str, lookback_days: Optional[int] = None) -> Dict[str, np.ndarray]:
+       """Returns read-only memmap views of the stored columns, optionally limited to a lookback window."""
+       symbol = symbol.upper()
+       n = self._length(symbol)
+       if n == 0:
+           return {"ts": np.empty(0, dtype=np.int64), **{c: np.empty(0) for c in COLUMNS}}
+       arrays = {"ts": np.memmap(self._path(symbol, "ts"), dtype=np.int64, mode="r", shape=(n,))}
+       for column in COLUMNS:
+           arrays[column] = np.memmap(self._path(symbol, column), dtype=np.float64, mode="r", shape=(n,))
+       if lookback_days is not None:
+           cutoff = time.time_ns() - lookback_days * 86_400 * 1_000_000_000
+           start = int(np.searchsorted(arrays["ts"], cutoff))
+           arrays = {name: values[start:] for name, values in arrays.items()}
+       return arrays
+
+   def read_frame(self, symbol: str, lookback_days: Optional[int] = None) -> pd.DataFrame:
+       """Returns stored bars as a DataFrame shaped like ticker.history()."""
+       meta = self._read_meta(symbol.upper()) or {}
+       arrays = self.read_arrays(symbol, lookback_days)
+       index = pd.to_datetime(np.asarray(arrays["ts"]), utc=True).tz_convert(meta.get("tz", "UTC"))
+       return pd.DataFrame({c: np.asarray(arrays[c]) for c in COLUMNS}, index=index)
+
+   def _rewrite(self, symbol: str, frame: pd.DataFrame, meta: dict) -> None:
+       """Atomically replaces a ticker's files with the given bars, sorted and de-duplicated."""
+       frame = frame[~frame.index.duplicated(keep="last")].sort_index()
+       tmp_dir = self._dir(symbol) + ".tmp"
+       shutil.rmtree(tmp_dir, ignore_errors=True)
+       os.makedirs(tmp_dir)
+       index_to_ns(frame.index).tofile(os.path.join(tmp_dir, "ts.i8"))
+       for column in COLUMNS:
+           frame[column].to_numpy(dtype=np.float64).tofile(os.path.join(tmp_dir, f"{column}.f8"))
+       with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+           json.dump(meta, f)
+       old_dir = self._dir(symbol) + ".old"
+       shutil.rmtree(old_dir, ignore_errors=True)
+       if os.path.exists(self._dir(symbol)):
+           os.replace(self._dir(symbol), old_dir)
+       os.replace(tmp_dir, self._dir(symbol))
+       shutil.rmtree(old_dir, ignore_errors=True)
+
+   def _append(self, symbol: str, frame: pd.DataFrame) -> None:
+       """Appends bars newer than the last stored one, overwriting the last bar if it was re-sent."""
+       n = self._length(symbol)
+       ts = index_to_ns(frame.index)
+       last_ts = int(np.fromfile(self._path(symbol, "ts"), dtype=np.int64, count=1, offset=(n - 1) * 8)[0])
+       if (ts == last_ts).any():
+           row = int(np.flatnonzero(ts == last_ts)[-1])
+           for column in COLUMNS:
+               with open(self._path(symbol, column), "r+b") as f:
+                   f.seek((n - 1) * 8)
+                   f.write(np.float64(frame[column].iloc[row]).tobytes())
+       newer = ts > last_ts
+       if not newer.any():
+           return
+       # Truncate any torn tail first so every column stays aligned
+       for column in ("ts",) + COLUMNS:
+           with open(self._path(symbol, column), "r+b") as f:
+               f.truncate(n * 8)
+       for column in COLUMNS:
+           with open(self._path(symbol, column), "ab") as f:
+               f.write(frame[column].to_numpy(dtype=np.float64)[newer].tobytes())
+       with open(self._path(symbol, "ts"), "ab") as f:
+           f.write(ts[newer].tobytes())
+
+   def _needs_resync(self, symbol: str, frame: pd.DataFrame, n: int) -> bool:
+       """True when the upstream series was re-adjusted since the bars were stored."""
+       ts = index_to_ns(frame.index)
+       last_ts = np.fromfile(self._path(symbol, "ts"), dtype=np.int64, count=1, offset=(n - 1) * 8)[0]
+       for column in ("Dividends", "Stock Splits"):
+           if column in frame and (frame[column].fillna(0)[ts > last_ts] != 0).any():
+               return True
+       if n < 2:
+           return False
+       prev_ts = np.fromfile(self._path(symbol, "ts"), dtype=np.int64, count=1, offset=(n - 2) * 8)[0]
+       prev_close = np.fromfile(self._path(symbol, "Close"), dtype=np.float64, count=1, offset=(n - 2) * 8)[0]
+       match = np.flatnonzero(ts == prev_ts)
+       if match.size == 0:
+           return False
+       fetched_close = float(frame["Close"].iloc[int(match[0])])
+       return abs(fetched_close - prev_close) > 1e-6 * max(1.0, abs(prev_close))
+
+   def plan(self, symbol: str, period: str = "1y") -> Optional[HistoryRequest]:
+       """Returns the download that brings a ticker's bars up to date for period, or None when they are fresh."""
+       symbol = symbol.upper()
+       lookback_days = PERIOD_DAYS[period]
+       with self._lock_for(symbol):
+           meta = self._read_meta(symbol)
+           n = self._length(symbol)
+           if meta is None or n == 0 or meta.get("coverage_days", 0) < lookback_days:
+               return HistoryRequest(period=period)
+           if time.time() - meta.get("last_sync", 0) < self.refresh_seconds:
+               self.fresh_reads += 1
+               return None
+           # Start at the second-to-last stored bar so one finished bar overlaps for the adjustment check
+           start_ts = int(np.fromfile(self._path(symbol, "ts"), dtype=np.int64, count=1, offset=max(n - 2, 0) * 8)[0])
+           start = pd.Timestamp(start_ts, unit="ns", tz="UTC").tz_convert(meta.get("tz", "UTC")).date()
+           return HistoryRequest(start=start.isoformat())
+
+   def apply(self, symbol: str, request: HistoryRequest, frame: pd.DataFrame) -> Optional[HistoryRequest]:
+       """Stores the bars downloaded for a plan() request.
+
+       Returns the full download to make next when the upstream series was re-adjusted, else None.
+       """
+       symbol = symbol.upper()
+       with self._lock_for(symbol):
+           self.bars_fetched += len(frame)
+           if request.period is not None:
+               self.full_fetches += 1
+               self._store_full(symbol, request.period, frame)
+               return None
+           self.incremental_fetches += 1
+           meta = self._read_meta(symbol)
+           n = self._length(symbol)
+           if meta is None or n == 0 or self._needs_resync(symbol, frame, n):
+               return HistoryRequest(period=(meta or {}).get("period", "1y"))
+           if not frame.empty:
+               self._append(symbol, frame)
+           meta["last_sync"] = time.time()
+           self._write_meta(symbol, meta)
+           first_ts = int(np.fromfile(self._path(symbol, "ts"), dtype=np.int64, count=1)[0])
+           horizon = max(self.retain_days, meta.get("coverage_days", 0)) + 30
+           if first_ts < time.time_ns() - horizon * 86_400 * 1_000_000_000:
+               self._compact(symbol)
+           return None
+
+   def sync(self, ticker: yf.Ticker, period: str = "1y") -> pd.DataFrame:
+       """Brings a ticker's bars up to date from ticker.history() and returns the requested period.
+
+       Blocking; call it from a worker thread. fetch_history() instead runs plan() and apply()
+       around a multi-symbol download.
+       """
+       symbol = ticker.ticker.upper()
+       request = self.plan(symbol, period)
+       while request is not None:
+           request = self.apply(symbol, request, ticker.history(**request.kwargs()))
+       return self.read_frame(symbol, PERIOD_DAYS[period])
+
+   def _store_full(self, symbol: str, period: str, frame: pd.DataFrame) -> None:
+       if frame.empty:
+           return
+       meta = {
+           "tz": str(frame.index.tz or "UTC"),
+           "period": period,
+           "coverage_days": PERIOD_DAYS[period],
+           "last_sync": time.time(),
+       }
+       self._rewrite(symbol, frame, meta)
+
+   def _compact(self, symbol: str) -> None:
+       meta = self._read_meta(symbol)
+       if meta is None:
+           return
+       frame = self.read_frame(symbol)
+       cutoff = pd.Timestamp.now(tz="UTC") - pd.Timedelta(days=max(self.retain_days, meta.get("coverage_days", 0)))
+       self._rewrite(symbol, frame[frame.index >= cutoff], meta)
+
+   def compact(self, symbol: str) -> None:
+       """Sorts, de-duplicates and trims a ticker's files to the retention window."""
+       symbol = symbol.upper()
+       with self._lock_for(symbol):
+           self._compact(symbol)
+
+   def compact_all(self) -> int:
+       """Compacts every stored ticker and returns how many were processed."""
+       if not os.path.isdir(self.root):
+           return 0
+       symbols = [
+           name for name in os.listdir(self.root)
+           if os.path.isdir(self._dir(name)) and not name.endswith((".tmp", ".old"))
+       ]
+       for symbol in symbols:
+           self.compact(symbol)
+       return len(symbols)
+
+   def stats(self) -> dict:
+       return {
+           "full_fetches": self.full_fetches,
+           "incremental_fetches": self.incremental_fetches,
+           "fresh_reads": self.fresh_reads,
+           "bars_fetched": self.bars_fetched,
+       }
+
+
+price_store = PriceStore(
+   settings.PRICE_STORE_DIR,
+   refresh_seconds=settings.PRICE_STORE_REFRESH_SECONDS,
+   retain_days=settings.PRICE_STORE_RETAIN_DAYS,
+)
\ No newline at end of file
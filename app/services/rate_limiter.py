@@ -0,0 +1,162 @@
+# app/services/rate_limiter.py
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
+from typing import List, Optional, Tuple
+
+from app.core.config import settings
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 1
+PRIORITY_BACKGROUND = 2
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_BATCH: "batch", PRIORITY_BACKGROUND: "background"}
+
+# Priority of outbound calls made on behalf of the current request or task
+request_priority: ContextVar[int] = ContextVar("request_priority", default=PRIORITY_INTERACTIVE)
+
+# Overload answers: retried, and they shrink the concurrency limit. A 500 is a server error, not a
+# sign of load, so it is returned to the caller as-is.
+THROTTLE_STATUSES = {429, 502, 503, 504}
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+   """Parses a Retry-After header given as seconds or an HTTP date into a delay in seconds."""
+   if not value:
+       return None
+   try:
+       return max(0.0, float(value))
+   except ValueError:
+       pass
+   try:
+       return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+   except (TypeError, ValueError):
+       return None
+
+
+class OutboundScheduler:
+   """Admits outbound calls in priority order under a token bucket and an AIMD concurrency limit.
+
+   The bucket caps the request rate at the configured quota. The concurrency limit grows by about
+   one per round of successes and halves (at most once per cooldown) on 429/502/503/504 or transport errors;
+   a Retry-After pauses all admissions until it expires.
+   """
+
+   def __init__(self, rate: float, burst: float, initial_limit: float, min_limit: float, max_limit: float,
+                cooldown: float):
+       self.rate = rate
+       self.burst = burst
+       self.min_limit = min_limit
+       self.max_limit = max_limit
+       self.cooldown = cooldown
+       self.limit = initial_limit
+       self.tokens = burst
+       self.in_flight = 0
+       self._refilled_at = time.monotonic()
+       self._paused_until = 0.0
+       self._last_decrease = 0.0
+       self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+       self._sequence = itertools.count()
+       self._wakeup: Optional[asyncio.TimerHandle] = None
+       self.granted = {name: 0 for name in PRIORITY_NAMES.values()}
+       self.throttled = 0
+       self.successes = 0
+
+   def _refill(self, now: float) -> None:
+       self.tokens = min(self.burst, self.tokens + (now - self._refilled_at) * self.rate)
+       self._refilled_at = now
+
+   def _schedule_wakeup(self, delay: float) -> None:
+       if self._wakeup is None:
+           loop = asyncio.get_running_loop()
+           self._wakeup = loop.call_later(delay, self._wake)
+
+   def _wake(self) -> None:
+       self._wakeup = None
+       self._dispatch()
+
+   def _dispatch(self) -> None:
+       while self._waiters:
+           if self._waiters[0][2].done():
+               heapq.heappop(self._waiters)
+               continue
+           if self.in_flight >= int(self.limit):
+               return
+           now = time.monotonic()
+           if now < self._paused_until:
+               self._schedule_wakeup(self._paused_until - now)
+               return
+           self._refill(now)
+           if self.tokens < 1:
+               self._schedule_wakeup((1 - self.tokens) / self.rate)
+               return
+           priority, _, future = heapq.heappop(self._waiters)
+           self.tokens -= 1
+           self.in_flight += 1
+           self.granted[PRIORITY_NAMES.get(priority, str(priority))] += 1
+           future.set_result(None)
+
+   async def acquire(self, priority: int) -> None:
+       future = asyncio.get_running_loop().create_future()
+       heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+       self._dispatch()
+       try:
+           await future
+       except asyncio.CancelledError:
+           if future.done() and not future.cancelled():
+               self.release()
+           raise
+
+   def release(self) -> None:
+       self.in_flight -= 1
+       self._dispatch()
+
+   @asynccontextmanager
+   async def slot(self, priority: Optional[int] = None):
+       """Holds one admission for the duration of an outbound call."""
+       await self.acquire(request_priority.get() if priority is None else priority)
+       try:
+           yield
+       finally:
+           self.release()
+
+   def record(self, status_code: Optional[int], retry_after: Optional[float] = None) -> None:
+       """Feeds a call's outcome back into the limit; status_code is None for transport errors."""
+       now = time.monotonic()
+       if status_code is not None and status_code not in THROTTLE_STATUSES:
+           self.successes += 1
+           self.limit = min(self.max_limit, self.limit + 1.0 / max(self.limit, 1.0))
+           return
+       self.throttled += 1
+       if now - self._last_decrease >= self.cooldown:
+           self.limit = max(self.min_limit, self.limit / 2)
+           self._last_decrease = now
+       if status_code == 429 and retry_after is None:
+           retry_after = settings.GEMINI_THROTTLE_PAUSE_SECONDS
+       if retry_after:
+           self._paused_until = max(self._paused_until, now + retry_after)
+
+   def stats(self) -> dict:
+       return {
+           "limit": round(self.limit, 2),
+           "in_flight": self.in_flight,
+           "queued": sum(1 for _, _, future in self._waiters if not future.done()),
+           "tokens": round(min(self.burst, self.tokens), 2),
+           "paused_for": round(max(0.0, self._paused_until - time.monotonic()), 2),
+           "granted": dict(self.granted),
+           "successes": self.successes,
+           "throttled": self.throttled,
+       }
+
+
+gemini_scheduler = OutboundScheduler(
+   rate=settings.GEMINI_RATE_PER_SECOND,
+   burst=settings.GEMINI_RATE_BURST,
+   initial_limit=settings.GEMINI_CONCURRENCY_INITIAL,
+   min_limit=settings.GEMINI_CONCURRENCY_MIN,
+   max_limit=settings.GEMINI_CONCURRENCY_MAX,
+   cooldown=settings.GEMINI_AIMD_COOLDOWN_SECONDS,
+)
\ No newline at end of file
@@ -0,0 +1,162 @@
+# app/services/resilience.py
+import asyncio
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Optional, TypeVar
+
+from app.services.tracing import annotate
+
+T = TypeVar("T")
+
+
+class LatencyTracker:
+   """Rolling window of recent call latencies, used to pick the hedging delay."""
+
+   def __init__(self, window: int, percentile: float, default_delay: float, min_delay: float, min_samples: int = 20):
+       self._samples: Deque[float] = deque(maxlen=window)
+       self.percentile = percentile
+       self.default_delay = default_delay
+       self.min_delay = min_delay
+       self.min_samples = min_samples
+
+   def observe(self, seconds: float) -> None:
+       self._samples.append(seconds)
+
+   def quantile(self, q: float) -> Optional[float]:
+       if not self._samples:
+           return None
+       ordered = sorted(self._samples)
+       return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+   def hedge_delay(self) -> float:
+       if len(self._samples) < self.min_samples:
+           return self.default_delay
+       return max(self.min_delay, self.quantile(self.percentile))
+
+   def stats(self) -> dict:
+       return {"samples": len(self._samples), "p50": self.quantile(50), "p95": self.quantile(95), "p99": self.quantile(99)}
+
+
+class CircuitBreaker:
+   """Opens when the error rate over the last calls crosses a threshold, then fails fast until a probe succeeds.
+
+   closed -> open when at least min_calls of the last `window` calls were seen and the error rate is
+   at or above error_rate. After open_seconds one probe is let through (half-open); its outcome
+   closes or re-opens the circuit.
+
+   allow() hands each admitted call the current generation, which changes on every state change;
+   record() and abandon() ignore calls from an older one, so a slow call admitted before the circuit
+   opened cannot push back the reopen deadline or decide a half-open probe's outcome.
+   """
+
+   CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+   def __init__(self, window: int, min_calls: int, error_rate: float, open_seconds: float):
+       self._outcomes: Deque[bool] = deque(maxlen=window)
+       self.min_calls = min_calls
+       self.error_rate = error_rate
+       self.open_seconds = open_seconds
+       self.state = self.CLOSED
+       self.generation = 0
+       self._opened_at = 0.0
+       self._probe_in_flight = False
+       self.times_opened = 0
+       self.rejected = 0
+       self.late_outcomes = 0
+
+   def allow(self) -> Optional[int]:
+       """Returns the generation to report the call's outcome under, or None when the call is rejected."""
+       if self.state == self.CLOSED:
+           return self.generation
+       if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+           self._transition(self.HALF_OPEN)
+       if self.state == self.HALF_OPEN and not self._probe_in_flight:
+           self._probe_in_flight = True
+           return self.generation
+       self.rejected += 1
+       return None
+
+   def record(self, success: bool, generation: int) -> None:
+       if generation != self.generation:
+           self.late_outcomes += 1
+           return
+       if self.state == self.HALF_OPEN:
+           self._probe_in_flight = False
+           if success:
+               self._transition(self.CLOSED)
+               self._outcomes.clear()
+           else:
+               self._open()
+           return
+       self._outcomes.append(success)
+       failures = self._outcomes.count(False)
+       if len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.error_rate:
+           self._open()
+
+   def abandon(self, generation: int) -> None:
+       """Frees the half-open probe slot of a call that was cancelled before it had an outcome."""
+       if generation == self.generation and self.state == self.HALF_OPEN:
+           self._probe_in_flight = False
+
+   def _transition(self, state: str) -> None:
+       self.state = state
+       self.generation += 1
+
+   def _open(self) -> None:
+       self._transition(self.OPEN)
+       self._opened_at = time.monotonic()
+       self._outcomes.clear()
+       self.times_opened += 1
+
+   def stats(self) -> dict:
+       return {
+           "state": self.state,
+           "times_opened": self.times_opened,
+           "rejected": self.rejected,
+           "late_outcomes": self.late_outcomes,
+       }
+
+
+class Hedger:
+   """Issues a duplicate call when the first is slower than the delay, and takes whichever succeeds first.
+
+   Hedges are capped at max_ratio of all calls so they cannot double the load on a struggling upstream.
+   """
+
+   def __init__(self, max_ratio: float):
+       self.max_ratio = max_ratio
+       self.calls = 0
+       self.hedges = 0
+       self.hedge_wins = 0
+
+   async def run(self, call: Callable[[], Awaitable[T]], delay: float) -> T:
+       self.calls += 1
+       primary = asyncio.ensure_future(call())
+       tasks = [primary]
+       try:
+           done, _ = await asyncio.wait({primary}, timeout=delay)
+           if done or self.hedges + 1 > self.max_ratio * self.calls:
+               return await primary
+           self.hedges += 1
+           annotate(hedged=True)
+           backup = asyncio.ensure_future(call())
+           tasks.append(backup)
+           pending = {primary, backup}
+           error: Optional[BaseException] = None
+           while pending:
+               done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+               for task in done:
+                   if task.exception() is None:
+                       if task is backup:
+                           self.hedge_wins += 1
+                           annotate(hedge_won=True)
+                       return task.result()
+                   error = task.exception()
+           raise error
+       finally:
+           for task in tasks:
+               if not task.done():
+                   task.cancel()
+
+   def stats(self) -> dict:
+       return {"calls": self.calls, "hedges": self.hedges, "hedge_wins": self.hedge_wins}
\ No newline at end of file
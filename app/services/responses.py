@@ -0,0 +1,220 @@
+# app/services/responses.py
+"""Response encoding: orjson rendering, strong ETags with conditional GET, and gzip/brotli compression."""
+import hashlib
+import zlib
+from typing import Mapping, Optional
+
+import brotli
+import orjson
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import JSONResponse, Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Suffixes the compression middleware appends to the ETag of an encoded representation
+ENCODING_SUFFIXES = ("-gzip", "-br")
+
+
+def dumps(content) -> bytes:
+   """Compact JSON bytes for plain dicts and lists."""
+   return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+
+class FastJSONResponse(JSONResponse):
+   """JSONResponse rendered with dumps().
+
+   Routes with a response_model are already serialized to bytes by pydantic-core, so this is for
+   routes that return plain dicts and lists.
+   """
+
+   def render(self, content) -> bytes:
+       return dumps(content)
+
+
+def strong_etag(body: bytes) -> str:
+   """Strong ETag for a response body."""
+   return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def derived_etag(*parts: str) -> str:
+   """Strong ETag for a representation fully determined by parts, so it can be checked before rendering."""
+   return strong_etag("|".join(parts).encode("utf-8"))
+
+
+def _opaque(tag: str) -> str:
+   tag = tag.strip()
+   if tag.startswith("W/"):
+       tag = tag[2:]
+   tag = tag.strip('"')
+   for suffix in ENCODING_SUFFIXES:
+       if tag.endswith(suffix):
+           return tag[: -len(suffix)]
+   return tag
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+   """If-None-Match comparison (weak, as RFC 9110 specifies), ignoring the compression suffixes."""
+   if not if_none_match:
+       return False
+   if if_none_match.strip() == "*":
+       return True
+   current = _opaque(etag)
+   return any(_opaque(tag) == current for tag in if_none_match.split(",") if tag.strip())
+
+
+def _validator_headers(etag: str, headers: Optional[Mapping[str, str]]) -> dict:
+   # no-cache: caches may keep the body but must revalidate it, which the ETag makes cheap
+   return {**(headers or {}), "ETag": etag, "Cache-Control": "no-cache"}
+
+
+def not_modified(etag: str, if_none_match: Optional[str], headers: Optional[Mapping[str, str]] = None) -> Optional[Response]:
+   """A 304 when the client already holds this ETag, else None; lets routes skip building the body."""
+   if etag_matches(if_none_match, etag):
+       return Response(status_code=304, headers=_validator_headers(etag, headers))
+   return None
+
+
+def conditional_response(body: bytes, etag: str, if_none_match: Optional[str],
+                         headers: Optional[Mapping[str, str]] = None) -> Response:
+   """A 304 when the client already holds this ETag, else the JSON body; both carry the ETag and headers."""
+   response = not_modified(etag, if_none_match, headers)
+   if response is not None:
+       return response
+   return Response(body, media_type="application/json", headers=_validator_headers(etag, headers))
+
+
+def json_response(body: bytes, if_none_match: Optional[str], headers: Optional[Mapping[str, str]] = None) -> Response:
+   """conditional_response() for a body that was just serialized."""
+   return conditional_response(body, strong_etag(body), if_none_match, headers)
+
+
+def _encoded_etag(etag: str, encoding: str) -> str:
+   """The ETag of the encoded representation: "abc" becomes "abc-gzip" so caches keep them apart."""
+   weak, tag = ("W/", etag[2:]) if etag.startswith("W/") else ("", etag)
+   return weak + '"' + tag.strip('"') + "-" + encoding + '"'
+
+
+class _GzipEncoder:
+   def __init__(self, level: int):
+       self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+   def encode(self, data: bytes, final: bool) -> bytes:
+       return self._compressor.compress(data) + self._compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class _BrotliEncoder:
+   def __init__(self, quality: int):
+       self._compressor = brotli.Compressor(quality=quality)
+
+   def encode(self, data: bytes, final: bool) -> bytes:
+       return self._compressor.process(data) + (self._compressor.finish() if final else self._compressor.flush())
+
+
+class _CompressingResponder:
+   """Encodes one response whose body is at least minimum_size bytes, and tags its ETag with the encoding.
+
+   Responses that already have a Content-Encoding, partial content and Server-Sent Events pass
+   through untouched; a streamed body is encoded chunk by chunk, flushing after each one.
+   """
+
+   def __init__(self, app: ASGIApp, minimum_size: int, encoding: str, encoder):
+       self.app = app
+       self.minimum_size = minimum_size
+       self.encoding = encoding
+       self.encoder = encoder
+       self.send: Optional[Send] = None
+       self.start: Optional[Message] = None
+       self.passthrough = False
+
+   async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+       self.send = send
+       await self.app(scope, receive, self.send_encoded)
+
+   async def send_encoded(self, message: Message) -> None:
+       if message["type"] == "http.response.start":
+           headers = Headers(raw=message["headers"])
+           self.passthrough = (
+               "content-encoding" in headers
+               or message["status"] == 206
+               or headers.get("content-type", "").startswith("text/event-stream")
+           )
+           if self.passthrough:
+               await self.send(message)
+           else:
+               self.start = message
+           return
+       if self.passthrough or message["type"] != "http.response.body":
+           if self.start is not None:
+               # A file sent with the pathsend extension, say: there is no body here to encode
+               self.passthrough = True
+               start, self.start = self.start, None
+               await self.send(start)
+           await self.send(message)
+           return
+       body = message.get("body", b"")
+       more_body = message.get("more_body", False)
+       if self.start is not None:
+           start, self.start = self.start, None
+           if len(body) < self.minimum_size and not more_body:
+               self.passthrough = True
+               await self.send(start)
+               await self.send(message)
+               return
+           headers = MutableHeaders(raw=start["headers"])
+           headers.add_vary_header("Accept-Encoding")
+           headers["Content-Encoding"] = self.encoding
+           if "etag" in headers:
+               headers["ETag"] = _encoded_etag(headers["etag"], self.encoding)
+           body = self.encoder.encode(body, final=not more_body)
+           if more_body:
+               del headers["Content-Length"]
+           else:
+               headers["Content-Length"] = str(len(body))
+           await self.send(start)
+           await self.send({"type": "http.response.body", "body": body, "more_body": more_body})
+           return
+       await self.send({"type": "http.response.body", "body": self.encoder.encode(body, final=not more_body),
+                        "more_body": more_body})
+
+
+def _accepted_encodings(header: str) -> set:
+   accepted = set()
+   for part in header.split(","):
+       name, _, params = part.strip().partition(";")
+       q = params.strip()
+       if q.startswith("q="):
+           try:
+               if float(q[2:]) <= 0:
+                   continue
+           except ValueError:
+               continue
+       if name:
+           accepted.add(name.strip().lower())
+   return accepted
+
+
+class CompressionMiddleware:
+   """Compresses responses of at least minimum_size bytes with brotli or gzip, as the client accepts.
+
+   Server-Sent Events and already-encoded responses pass through untouched, as with Starlette's
+   GZipMiddleware.
+   """
+
+   def __init__(self, app: ASGIApp, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 5):
+       self.app = app
+       self.minimum_size = minimum_size
+       self.gzip_level = gzip_level
+       self.brotli_quality = brotli_quality
+
+   async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+       if scope["type"] != "http":
+           await self.app(scope, receive, send)
+           return
+       accepted = _accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+       if "br" in accepted:
+           responder = _CompressingResponder(self.app, self.minimum_size, "br", _BrotliEncoder(self.brotli_quality))
+       elif "gzip" in accepted:
+           responder = _CompressingResponder(self.app, self.minimum_size, "gzip", _GzipEncoder(self.gzip_level))
+       else:
+           await self.app(scope, receive, send)
+           return
+       await responder(scope, receive, send)
\ No newline at end of file
@@ -0,0 +1,112 @@
+# app/services/rules.py
+from collections import Counter
+from typing import Optional
+
+from app.core.config import settings
+
+AMBIGUOUS = "ambiguous"
+
+
+def _compare(value: Optional[float], threshold: Optional[float], band: float):
+   """Returns 1 above threshold, -1 below, AMBIGUOUS within the band around it, None if unknown.
+
+   With no band a value exactly on the threshold is neutral (0) rather than ambiguous.
+   """
+   if value is None or threshold is None:
+       return None
+   if value == threshold and band <= 0:
+       return 0
+   if abs(value - threshold) <= band:
+       return AMBIGUOUS
+   return 1 if value > threshold else -1
+
+
+def _negate(signal):
+   return -signal if isinstance(signal, int) else signal
+
+
+def _vote(signals) -> str:
+   score = sum(signal for signal in signals if isinstance(signal, int))
+   return "BUY" if score > 0 else "SELL" if score < 0 else "HOLD"
+
+
+def decide_fundamental(data: dict, lenient: bool = False) -> Optional[str]:
+   """Applies the fundamental prompt's rules directly; returns None when the LLM should decide.
+
+   Price below the analyst target, P/E under 30 and revenue growth over 5% are bullish. The call
+   is made only when every known signal is clear of its ambiguity band and they all agree.
+   lenient drops the bands and takes a majority vote instead; it is the fallback when the LLM is unavailable.
+   """
+   scale = 0 if lenient else 1
+   price, target = data.get("price"), data.get("analyst_price_target")
+   pe = data.get("pe_ratio") if data.get("pe_ratio") and data.get("pe_ratio") > 0 else None
+   signals = [
+       _negate(_compare(price, target, abs(target or 0) * settings.RULES_TARGET_BAND * scale)),
+       _negate(_compare(pe, settings.RULES_PE_THRESHOLD, settings.RULES_PE_BAND * scale)),
+       _compare(data.get("revenue_growth_yoy"), settings.RULES_GROWTH_THRESHOLD, settings.RULES_GROWTH_BAND * scale),
+   ]
+   known = [signal for signal in signals if signal is not None]
+   if lenient:
+       return _vote(known) if known else None
+   if AMBIGUOUS in known or len(known) < settings.RULES_MIN_SIGNALS:
+       return None
+   if all(signal == 1 for signal in known):
+       return "BUY"
+   if all(signal == -1 for signal in known):
+       return "SELL"
+   return None
+
+
+def decide_technical(data: dict, lenient: bool = False) -> Optional[str]:
+   """Applies the technical prompt's rules directly; returns None when the LLM should decide.
+
+   Price against the EMA gives the trend, ADX above 25 says whether it is strong, and RSI above 70
+   or below 30 marks overbought or oversold. A strong trend that RSI does not contradict decides
+   BUY or SELL; a weak trend with RSI in the neutral zone is a HOLD. Anything else is left to the LLM.
+   lenient drops the bands and sums a strong trend with the RSI signal, so it always decides.
+   """
+   scale = 0 if lenient else 1
+   price, ema_50, rsi_14, adx_14 = data.get("price"), data.get("ema_50"), data.get("rsi_14"), data.get("adx_14")
+   trend = _compare(price, ema_50, abs(ema_50 or 0) * settings.RULES_EMA_BAND * scale)
+   strength = _compare(adx_14, settings.RULES_ADX_THRESHOLD, settings.RULES_ADX_BAND * scale)
+   overbought = _compare(rsi_14, settings.RULES_RSI_OVERBOUGHT, settings.RULES_RSI_BAND * scale)
+   oversold = _compare(rsi_14, settings.RULES_RSI_OVERSOLD, settings.RULES_RSI_BAND * scale)
+   signals = (trend, strength, overbought, oversold)
+   if None in signals or AMBIGUOUS in signals:
+       return None
+   momentum = -1 if overbought == 1 else 1 if oversold == -1 else 0
+   if lenient:
+       return _vote([trend if strength == 1 else 0, momentum])
+   if strength == 1:
+       if trend != 0 and momentum in (0, trend):
+           return "BUY" if trend == 1 else "SELL"
+       return None
+   return "HOLD" if momentum == 0 else None
+
+
+class RuleStats:
+   """Counts which path decided each agent's recommendation."""
+
+   def __init__(self):
+       self._counts: Counter = Counter()
+
+   def record(self, agent: str, path: str) -> None:
+       self._counts[(agent, path)] += 1
+
+   def stats(self) -> dict:
+       agents = sorted({agent for agent, _ in self._counts})
+       result = {}
+       for agent in agents:
+           by_rules = self._counts[(agent, "rules")]
+           total = sum(count for (name, _), count in self._counts.items() if name == agent)
+           result[agent] = {
+               "rules": by_rules,
+               "llm": self._counts[(agent, "llm")],
+               "rules_fallback": self._counts[(agent, "rules_fallback")],
+               "default": self._counts[(agent, "default")],
+               "llm_avoidance_rate": by_rules / total if total else 0.0,
+           }
+       return result
+
+
+rule_stats = RuleStats()
\ No newline at end of file
@@ -0,0 +1,233 @@
+# app/services/screener.py
+"""Vectorized DCF and relative-value screening over a columnar fundamentals table.
+
+The table holds one float64 column per field (price, free cash flow, growth, shares, ...) and one
+row per ticker, built from the fundamentals cache. A screen is a handful of array operations over
+it, so ranking thousands of tickers takes milliseconds once the table is built.
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional
+
+from app.core.config import settings
+from app.core.lazy import lazy_module
+from app.services.fundamentals import fundamentals
+from app.services.portfolio import portfolio_store
+from app.services.tracing import detach
+
+np = lazy_module("numpy")
+
+COLUMNS = ("price", "free_cash_flow", "growth", "shares", "pe_ratio", "cash", "debt", "market_cap")
+
+
+def _number(value) -> float:
+   try:
+       return float(value) if value is not None else np.nan
+   except (TypeError, ValueError):
+       return np.nan
+
+
+def table_row(info: dict) -> Dict[str, float]:
+   """Maps one ticker.info snapshot onto the table's columns (NaN where a field is missing)."""
+   price = _number(info.get("currentPrice", info.get("previousClose")))
+   shares = _number(info.get("sharesOutstanding"))
+   growth = info.get("earningsGrowth") if info.get("earningsGrowth") is not None else info.get("revenueGrowth")
+   market_cap = _number(info.get("marketCap"))
+   return {
+       "price": price,
+       "free_cash_flow": _number(info.get("freeCashflow")),
+       "growth": _number(growth),
+       "shares": shares,
+       "pe_ratio": _number(info.get("trailingPE")),
+       "cash": _number(info.get("totalCash")),
+       "debt": _number(info.get("totalDebt")),
+       "market_cap": market_cap if not np.isnan(market_cap) else price * shares,
+   }
+
+
+class FundamentalsTable(NamedTuple):
+   symbols: np.ndarray
+   names: List[Optional[str]]
+   columns: Dict[str, np.ndarray]
+   built_at: float
+
+   @classmethod
+   def build(cls, snapshots: Dict[str, dict]) -> "FundamentalsTable":
+       symbols = sorted(snapshots)
+       rows = [table_row(snapshots[symbol]) for symbol in symbols]
+       columns = {name: np.array([row[name] for row in rows], dtype=np.float64) for name in COLUMNS}
+       names = [snapshots[symbol].get("longName") for symbol in symbols]
+       return cls(np.array(symbols, dtype=object), names, columns, time.time())
+
+   def __len__(self) -> int:
+       return len(self.symbols)
+
+
+class Candidate(NamedTuple):
+   ticker: str
+   company_name: str
+   price: float
+   intrinsic_value: float
+   margin_of_safety: float
+   pe_ratio: Optional[float]
+   median_pe: Optional[float]
+   fcf_yield: float
+   score: float
+
+
+def dcf_per_share(table: FundamentalsTable, discount_rate: float, terminal_growth: float, years: int,
+                 growth_cap: float) -> np.ndarray:
+   """Two-stage DCF: free cash flow grows at the (capped) growth rate for `years`, then at terminal_growth.
+
+   Returns equity value per share (enterprise value plus cash minus debt, over shares); NaN where
+   free cash flow or shares are missing.
+   """
+   c = table.columns
+   growth = np.clip(np.nan_to_num(c["growth"], nan=terminal_growth), -growth_cap, growth_cap)
+   t = np.arange(1, years + 1, dtype=np.float64)
+   flows = c["free_cash_flow"][:, None] * (1 + growth[:, None]) ** t
+   stage_one = (flows / (1 + discount_rate) ** t).sum(axis=1)
+   terminal = flows[:, -1] * (1 + terminal_growth) / (discount_rate - terminal_growth) / (1 + discount_rate) ** years
+   equity = stage_one + terminal + np.nan_to_num(c["cash"]) - np.nan_to_num(c["debt"])
+   with np.errstate(divide="ignore", invalid="ignore"):
+       return np.where(c["shares"] > 0, equity / c["shares"], np.nan)
+
+
+def screen(table: FundamentalsTable, top_n: int) -> List[Candidate]:
+   """Ranks the table by a blend of DCF margin of safety and P/E relative to the universe median."""
+   if not len(table):
+       return []
+   c = table.columns
+   intrinsic = dcf_per_share(
+       table,
+       discount_rate=settings.SCREENER_DISCOUNT_RATE,
+       terminal_growth=settings.SCREENER_TERMINAL_GROWTH,
+       years=settings.SCREENER_YEARS,
+       growth_cap=settings.SCREENER_GROWTH_CAP,
+   )
+   with np.errstate(divide="ignore", invalid="ignore"):
+       margin = intrinsic / c["price"] - 1
+       positive_pe = np.where(c["pe_ratio"] > 0, c["pe_ratio"], np.nan)
+       median_pe = np.nanmedian(positive_pe) if np.isfinite(positive_pe).any() else np.nan
+       relative = np.nan_to_num(median_pe / positive_pe - 1, nan=0.0)
+       fcf_yield = c["free_cash_flow"] / c["market_cap"]
+   score = (settings.SCREENER_DCF_WEIGHT * np.clip(margin, -1, 3)
+            + settings.SCREENER_RELATIVE_WEIGHT * np.clip(relative, -1, 1))
+   valid = (c["free_cash_flow"] > 0) & (c["price"] > 0) & np.isfinite(margin) & (margin > 0)
+   score = np.where(valid, score, -np.inf)
+
+   n = min(top_n, int(valid.sum()))
+   if n <= 0:
+       return []
+   top = np.argpartition(-score, n - 1)[:n]
+   top = top[np.argsort(-score[top])]
+   optional = lambda value: None if not np.isfinite(value) else round(float(value), 2)
+   return [
+       Candidate(
+           ticker=str(table.symbols[i]),
+           company_name=table.names[i] or str(table.symbols[i]),
+           price=round(float(c["price"][i]), 2),
+           intrinsic_value=round(float(intrinsic[i]), 2),
+           margin_of_safety=round(float(margin[i]), 4),
+           pe_ratio=optional(positive_pe[i]),
+           median_pe=optional(median_pe),
+           fcf_yield=round(float(fcf_yield[i]), 4) if np.isfinite(fcf_yield[i]) else 0.0,
+           score=round(float(score[i]), 4),
+       )
+       for i in top
+   ]
+
+
+class Screener:
+   """Holds the fundamentals table for a universe, rebuilding it when it expires or the universe changes.
+
+   An expired table keeps being served while a rebuild runs in the background. At most max_tables
+   universes are kept, dropping the least recently screened one first.
+   """
+
+   def __init__(self, ttl: float, max_tables: int):
+       self.ttl = ttl
+       self.max_tables = max_tables
+       self._tables: "OrderedDict[tuple, FundamentalsTable]" = OrderedDict()
+       self._building: Dict[tuple, asyncio.Task] = {}
+       self.builds = 0
+       self.build_failures = 0
+       self.evictions = 0
+       self.last_build_seconds = 0.0
+       self.last_screen_seconds = 0.0
+
+   async def _build(self, key: tuple, background: bool) -> FundamentalsTable:
+       if background:
+           detach()
+       started = time.perf_counter()
+       symbols = list(key)
+       await fundamentals.prefetch(symbols)
+       snapshots = {symbol: info for symbol in symbols if (info := fundamentals.peek(symbol)) is not None}
+       table = await asyncio.to_thread(FundamentalsTable.build, snapshots)
+       self._tables[key] = table
+       self._tables.move_to_end(key)
+       while len(self._tables) > self.max_tables:
+           self._tables.popitem(last=False)
+           self.evictions += 1
+       self.builds += 1
+       self.last_build_seconds = time.perf_counter() - started
+       return table
+
+   def _build_once(self, key: tuple, background: bool = False) -> asyncio.Task:
+       task = self._building.get(key)
+       if task is None:
+           task = self._building[key] = asyncio.ensure_future(self._build(key, background))
+           task.add_done_callback(lambda done: self._finish(key, done, background))
+       return task
+
+   def _finish(self, key: tuple, task: asyncio.Task, background: bool) -> None:
+       self._building.pop(key, None)
+       if task.cancelled():
+           return
+       # Retrieve the exception here: nobody awaits a background rebuild
+       error = task.exception()
+       if error is not None:
+           self.build_failures += 1
+           if background:
+               print(f"Background rebuild of the screener table for {len(key)} tickers failed: {error}")
+
+   async def table(self, symbols: List[str]) -> FundamentalsTable:
+       key = tuple(sorted({symbol.upper() for symbol in symbols}))
+       table = self._tables.get(key)
+       if table is None:
+           return await asyncio.shield(self._build_once(key))
+       self._tables.move_to_end(key)
+       if time.time() - table.built_at >= self.ttl:
+           self._build_once(key, background=True)
+       return table
+
+   async def top(self, symbols: List[str], top_n: int) -> List[Candidate]:
+       table = await self.table(symbols)
+       started = time.perf_counter()
+       candidates = screen(table, top_n)
+       self.last_screen_seconds = time.perf_counter() - started
+       return candidates
+
+   def stats(self) -> dict:
+       return {
+           "tables": {len(key): len(table) for key, table in self._tables.items()},
+           "builds": self.builds,
+           "build_failures": self.build_failures,
+           "evictions": self.evictions,
+           "last_build_ms": round(self.last_build_seconds * 1000, 2),
+           "last_screen_ms": round(self.last_screen_seconds * 1000, 3),
+       }
+
+
+def screener_universe(portfolio: Optional[str] = None) -> List[str]:
+   """Tickers to screen: one portfolio, or the SCREENER_PORTFOLIOS ("*" for every portfolio)."""
+   if portfolio:
+       return list(portfolio_store.get(portfolio).tickers)
+   names = [name.strip().lower() for name in settings.SCREENER_PORTFOLIOS.split(",") if name.strip()]
+   return portfolio_store.tickers(None if "*" in names else names)
+
+
+screener = Screener(ttl=settings.SCREENER_TABLE_TTL_SECONDS, max_tables=settings.SCREENER_MAX_TABLES)
\ No newline at end of file
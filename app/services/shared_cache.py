@@ -0,0 +1,302 @@
+# app/services/shared_cache.py
+"""Cache tier shared by every worker process on a host.
+
+In-process caches (fundamentals, price history, stored analyses) are per worker, so without this
+tier each uvicorn worker fetches the same data upstream on its own. The backend stores opaque
+bytes under string keys; get_or_compute() gives a missing key to exactly one filler across all
+workers through a lease, while the others wait for its value instead of computing it too.
+"""
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Awaitable, Callable, NamedTuple, Optional, Tuple
+
+from app.core.config import settings
+from app.services.singleflight import SingleFlight
+
+
+class CacheEntry(NamedTuple):
+   value: bytes
+   stored_at: float
+   expires_at: float
+
+
+# compute() returns the value and how long to keep it; a ttl <= 0 hands it back without storing it
+Compute = Callable[[], Awaitable[Tuple[bytes, float]]]
+
+# Lease owner marking a key whose last fill produced nothing to share (ttl <= 0, or compute() raised).
+# Waiters that see it compute for themselves, in parallel, instead of taking the lease one by one.
+UNSHAREABLE = "-"
+UNSHAREABLE_SECONDS = 2.0
+
+
+class CacheBackend:
+   """Interface for shared cache backends."""
+
+   async def get(self, key: str) -> Optional[CacheEntry]:
+       raise NotImplementedError
+
+   async def get_or_compute(self, key: str, compute: Compute) -> CacheEntry:
+       """Returns the fresh entry for key, or fills it with compute() in one worker while the others wait."""
+       raise NotImplementedError
+
+   def stats(self) -> dict:
+       return {}
+
+   def close(self) -> None:
+       pass
+
+
+class NullBackend(CacheBackend):
+   """Stores nothing; every get_or_compute() computes. For single-worker deployments."""
+
+   def __init__(self):
+       self.computes = 0
+
+   async def get(self, key: str) -> Optional[CacheEntry]:
+       return None
+
+   async def get_or_compute(self, key: str, compute: Compute) -> CacheEntry:
+       self.computes += 1
+       value, ttl = await compute()
+       now = time.time()
+       return CacheEntry(value, now, now + max(0.0, ttl))
+
+   def stats(self) -> dict:
+       return {"backend": "none", "computes": self.computes}
+
+
+class SQLiteBackend(CacheBackend):
+   """Shared cache in a SQLite file in WAL mode, which readers in every process can use concurrently.
+
+   A miss takes a lease row for the key in the same write transaction that saw the miss, so only
+   one process fills it. The others poll until the value lands or the lease expires (the filler
+   died or gave up), in which case one of them takes over. A filler that ends without a value to
+   store marks the key unshareable for a moment, and the waiters then compute it themselves. Keys
+   are stored under namespace, so processes reading different data sources never serve each other's
+   values from the same file.
+   """
+
+   def __init__(self, path: str, lease_seconds: float, poll_seconds: float, max_entries: int, namespace: str = ""):
+       self.path = path
+       self.namespace = namespace
+       self.lease_seconds = lease_seconds
+       self.poll_seconds = poll_seconds
+       self.max_entries = max_entries
+       self._conn: Optional[sqlite3.Connection] = None
+       self._lock = threading.Lock()
+       self._fills_since_prune = 0
+       self._flight = SingleFlight("shared_cache")
+       self.hits = 0
+       self.fills = 0
+       self.waits = 0
+       self.takeovers = 0
+       self.unshared = 0
+       self.errors = 0
+
+   def _connect(self) -> sqlite3.Connection:
+       if self._conn is None:
+           directory = os.path.dirname(self.path)
+           if directory:
+               os.makedirs(directory, exist_ok=True)
+           conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+           conn.execute("PRAGMA journal_mode=WAL")
+           conn.execute("PRAGMA synchronous=NORMAL")
+           conn.execute(
+               "CREATE TABLE IF NOT EXISTS shared_cache ("
+               "key TEXT PRIMARY KEY, value BLOB NOT NULL, stored_at REAL NOT NULL, expires_at REAL NOT NULL)"
+           )
+           conn.execute("CREATE INDEX IF NOT EXISTS shared_cache_expires ON shared_cache (expires_at)")
+           conn.execute(
+               "CREATE TABLE IF NOT EXISTS shared_leases (key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)"
+           )
+           self._conn = conn
+       return self._conn
+
+   def _read(self, key: str) -> Optional[CacheEntry]:
+       with self._lock:
+           row = self._connect().execute(
+               "SELECT value, stored_at, expires_at FROM shared_cache WHERE key = ? AND expires_at > ?", (key, time.time())
+           ).fetchone()
+       return CacheEntry(*row) if row else None
+
+   def _acquire(self, key: str, owner: str) -> Tuple[Optional[CacheEntry], str]:
+       """In one write transaction: returns (entry, "hit") on a hit, else (None, "leased", "wait" or "unshareable")."""
+       with self._lock:
+           conn = self._connect()
+           conn.execute("BEGIN IMMEDIATE")
+           try:
+               now = time.time()
+               row = conn.execute(
+                   "SELECT value, stored_at, expires_at FROM shared_cache WHERE key = ? AND expires_at > ?", (key, now)
+               ).fetchone()
+               if row:
+                   return CacheEntry(*row), "hit"
+               lease = conn.execute("SELECT owner, expires_at FROM shared_leases WHERE key = ?", (key,)).fetchone()
+               if lease and lease[0] == UNSHAREABLE and lease[1] > now:
+                   return None, "unshareable"
+               leased = conn.execute(
+                   "INSERT INTO shared_leases (key, owner, expires_at) VALUES (?, ?, ?) "
+                   "ON CONFLICT(key) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+                   "WHERE shared_leases.expires_at <= ?",
+                   (key, owner, now + self.lease_seconds, now),
+               ).rowcount > 0
+               return None, "leased" if leased else "wait"
+           finally:
+               conn.execute("COMMIT")
+
+   def _fill(self, key: str, owner: str, value: bytes, ttl: float) -> CacheEntry:
+       now = time.time()
+       entry = CacheEntry(value, now, now + max(0.0, ttl))
+       with self._lock:
+           conn = self._connect()
+           conn.execute("BEGIN IMMEDIATE")
+           try:
+               if ttl > 0:
+                   conn.execute(
+                       "INSERT OR REPLACE INTO shared_cache (key, value, stored_at, expires_at) VALUES (?, ?, ?, ?)",
+                       (key, value, entry.stored_at, entry.expires_at),
+                   )
+                   conn.execute("DELETE FROM shared_leases WHERE key = ? AND owner = ?", (key, owner))
+               else:
+                   self._mark_unshareable(conn, key, owner, now)
+               self._fills_since_prune += 1
+               if self._fills_since_prune >= 200:
+                   self._prune(conn, now)
+           finally:
+               conn.execute("COMMIT")
+       return entry
+
+   def _release(self, key: str, owner: str, unshareable: bool) -> None:
+       """Gives up a lease. After compute() raised the key is marked unshareable, so the waiters compute
+       for themselves rather than retry it in turn; a cancelled filler just lets one of them take over."""
+       with self._lock:
+           conn = self._connect()
+           if unshareable:
+               self._mark_unshareable(conn, key, owner, time.time())
+           else:
+               conn.execute("DELETE FROM shared_leases WHERE key = ? AND owner = ?", (key, owner))
+
+   @staticmethod
+   def _mark_unshareable(conn: sqlite3.Connection, key: str, owner: str, now: float) -> None:
+       conn.execute(
+           "UPDATE shared_leases SET owner = ?, expires_at = ? WHERE key = ? AND owner = ?",
+           (UNSHAREABLE, now + UNSHAREABLE_SECONDS, key, owner),
+       )
+
+   def _prune(self, conn: sqlite3.Connection, now: float) -> None:
+       """Drops expired rows and leases, then the oldest rows above max_entries."""
+       self._fills_since_prune = 0
+       conn.execute("DELETE FROM shared_cache WHERE expires_at <= ?", (now,))
+       conn.execute("DELETE FROM shared_leases WHERE expires_at <= ?", (now,))
+       overflow = conn.execute("SELECT COUNT(*) FROM shared_cache").fetchone()[0] - self.max_entries
+       if overflow > 0:
+           conn.execute(
+               "DELETE FROM shared_cache WHERE key IN (SELECT key FROM shared_cache ORDER BY stored_at LIMIT ?)",
+               (overflow,),
+           )
+
+   def _key(self, key: str) -> str:
+       return f"{self.namespace}/{key}" if self.namespace else key
+
+   async def get(self, key: str) -> Optional[CacheEntry]:
+       try:
+           return await asyncio.to_thread(self._read, self._key(key))
+       except sqlite3.Error as e:
+           self.errors += 1
+           print(f"Shared cache read failed for {key}: {e}")
+           return None
+
+   async def get_or_compute(self, key: str, compute: Compute) -> CacheEntry:
+       # Callers in this process share one lease attempt instead of polling against each other
+       key = self._key(key)
+       return await self._flight.do(key, lambda: self._get_or_compute(key, compute))
+
+   async def _get_or_compute(self, key: str, compute: Compute) -> CacheEntry:
+       owner = f"{os.getpid()}:{uuid.uuid4().hex}"
+       delay = self.poll_seconds
+       waited = False
+       while True:
+           try:
+               entry, status = await asyncio.to_thread(self._acquire, key, owner)
+           except sqlite3.Error as e:
+               # The cache is an optimization; compute directly rather than fail the caller
+               self.errors += 1
+               print(f"Shared cache unavailable for {key}, computing locally: {e}")
+               return await self._compute_locally(compute)
+           if entry is not None:
+               self.hits += 1
+               return entry
+           if status == "unshareable":
+               self.unshared += 1
+               return await self._compute_locally(compute)
+           if status == "leased":
+               break
+           if not waited:
+               self.waits += 1
+               waited = True
+           await asyncio.sleep(delay)
+           delay = min(delay * 2, 0.5)
+       if waited:
+           self.takeovers += 1
+       try:
+           value, ttl = await compute()
+       except Exception:
+           await asyncio.to_thread(self._release, key, owner, True)
+           raise
+       except BaseException:
+           await asyncio.to_thread(self._release, key, owner, False)
+           raise
+       self.fills += 1
+       try:
+           return await asyncio.to_thread(self._fill, key, owner, value, ttl)
+       except sqlite3.Error as e:
+           self.errors += 1
+           print(f"Could not store {key} in the shared cache: {e}")
+           now = time.time()
+           return CacheEntry(value, now, now + max(0.0, ttl))
+
+   @staticmethod
+   async def _compute_locally(compute: Compute) -> CacheEntry:
+       value, ttl = await compute()
+       now = time.time()
+       return CacheEntry(value, now, now + max(0.0, ttl))
+
+   def stats(self) -> dict:
+       return {
+           "backend": "sqlite",
+           "hits": self.hits,
+           "fills": self.fills,
+           "waits": self.waits,
+           "takeovers": self.takeovers,
+           "unshared": self.unshared,
+           "errors": self.errors,
+           "coalesced": self._flight.coalesced,
+       }
+
+   def close(self) -> None:
+       with self._lock:
+           if self._conn is not None:
+               self._conn.close()
+               self._conn = None
+
+
+def make_backend(name: str) -> CacheBackend:
+   """Builds the backend named by SHARED_CACHE_BACKEND: "sqlite" or "none"."""
+   if name == "none":
+       return NullBackend()
+   if name == "sqlite":
+       return SQLiteBackend(
+           settings.SHARED_CACHE_PATH,
+           lease_seconds=settings.SHARED_CACHE_LEASE_SECONDS,
+           poll_seconds=settings.SHARED_CACHE_POLL_MS / 1000,
+           max_entries=settings.SHARED_CACHE_MAX_ENTRIES,
+           namespace=settings.MARKET_DATA_SOURCE,
+       )
+   raise ValueError(f"Unknown shared cache backend '{name}'; use 'sqlite' or 'none'.")
+
+
+shared_cache = make_backend(settings.SHARED_CACHE_BACKEND)
\ No newline at end of file
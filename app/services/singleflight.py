@@ -0,0 +1,59 @@
+# app/services/singleflight.py
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+from app.services.tracing import detach, span
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+   """Coalesces concurrent calls for the same key into one in-flight computation."""
+
+   def __init__(self, name: str):
+       self.name = name
+       self._inflight: Dict[Hashable, asyncio.Task] = {}
+       self.calls = 0
+       self.executions = 0
+       self.coalesced = 0
+
+   async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+       """Awaits the in-flight call for key, starting fn() if there is none.
+
+       The shared task is shielded, so a cancelled caller does not cancel it for the others. It runs
+       outside every caller's trace; each caller records a span for its wait, marked when it joined
+       a call that was already in flight.
+       """
+       self.calls += 1
+       task = self._inflight.get(key)
+       coalesced = task is not None
+       if coalesced:
+           self.coalesced += 1
+       else:
+           self.executions += 1
+           task = asyncio.ensure_future(self._run_detached(fn))
+           self._inflight[key] = task
+           task.add_done_callback(lambda done: self._finish(key, done))
+       with span("singleflight", flight=self.name, coalesced=coalesced):
+           return await asyncio.shield(task)
+
+   @staticmethod
+   async def _run_detached(fn: Callable[[], Awaitable[T]]) -> T:
+       # Shared by every caller, so it records into none of their traces
+       detach()
+       return await fn()
+
+   def _finish(self, key: Hashable, task: asyncio.Task) -> None:
+       if self._inflight.get(key) is task:
+           del self._inflight[key]
+       if not task.cancelled():
+           # Mark the exception as retrieved in case every waiter went away
+           task.exception()
+
+   def stats(self) -> dict:
+       return {
+           "calls": self.calls,
+           "executions": self.executions,
+           "coalesced": self.coalesced,
+           "in_flight": len(self._inflight),
+       }
\ No newline at end of file
@@ -0,0 +1,172 @@
+# app/services/standin.py
+"""Local stand-ins for the Gemini API and the yfinance data source, for load tests and offline runs.
+
+StandInTicker mimics the parts of yf.Ticker the app uses (.ticker, .info, .history) with
+deterministic synthetic data per symbol, and standin_download() the multi-symbol yf.download().
+standin_answer() produces Gemini-style JSON answers
+for the app's prompts, including merged batch prompts. Both draw their delays from a LatencyProfile.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import random
+import re
+import time
+from typing import List, NamedTuple, Optional
+
+from app.core.lazy import lazy_module
+
+np = lazy_module("numpy")
+pd = lazy_module("pandas")
+
+# Synthetic price series start here, so every call sees the same bars for the same dates
+SERIES_START = "2015-01-02"
+PERIOD_DAYS = {"1d": 1, "5d": 5, "1mo": 31, "3mo": 92, "6mo": 183, "1y": 366, "2y": 731, "5y": 1827, "10y": 3653}
+RECOMMENDATIONS = ("BUY", "SELL", "HOLD")
+
+
+class LatencyProfile(NamedTuple):
+   """Log-normal delay around median_ms, plus a rare slow tail and an injected fault rate."""
+   median_ms: float = 0.0
+   sigma: float = 0.5
+   tail_rate: float = 0.0
+   tail_ms: float = 0.0
+   fault_rate: float = 0.0
+
+   def sample(self, rng: random.Random) -> float:
+       """Returns a delay in seconds."""
+       delay = self.median_ms * rng.lognormvariate(0, self.sigma) if self.median_ms > 0 else 0.0
+       if self.tail_rate and rng.random() < self.tail_rate:
+           delay += self.tail_ms
+       return delay / 1000
+
+   def fails(self, rng: random.Random) -> bool:
+       return bool(self.fault_rate) and rng.random() < self.fault_rate
+
+
+def _seed(text: str) -> int:
+   return int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+
+
+def is_unknown_symbol(symbol: str) -> bool:
+   """Symbols starting with "ZZ" play the part of tickers the data source does not know."""
+   return symbol.upper().startswith("ZZ")
+
+
+class StandInTicker:
+   """Blocking, yf.Ticker-shaped source of synthetic fundamentals and daily bars."""
+
+   def __init__(self, symbol: str, latency: Optional[LatencyProfile] = None):
+       self.ticker = symbol.upper()
+       self.latency = latency or LatencyProfile()
+       self._rng = random.Random()
+
+   def _wait(self) -> None:
+       time.sleep(self.latency.sample(self._rng))
+       if self.latency.fails(self._rng):
+           raise ConnectionError(f"Stand-in market data fault for {self.ticker}")
+
+   @property
+   def info(self) -> dict:
+       self._wait()
+       if is_unknown_symbol(self.ticker):
+           return {"trailingPegRatio": None}
+       rng = np.random.default_rng(_seed(self.ticker))
+       price = float(self._series()["Close"].iloc[-1])
+       shares = int(rng.uniform(5e7, 5e9))
+       return {
+           "longName": f"{self.ticker} Holdings Inc.",
+           "currentPrice": round(price, 2),
+           "previousClose": round(price * (1 + rng.normal(0, 0.01)), 2),
+           "targetMeanPrice": round(price * rng.uniform(0.8, 1.3), 2),
+           "trailingPE": round(float(rng.uniform(5, 60)), 2),
+           "revenueGrowth": round(float(rng.normal(0.06, 0.1)), 4),
+           "earningsGrowth": round(float(rng.normal(0.08, 0.15)), 4),
+           "forwardEps": round(price / rng.uniform(8, 40), 2),
+           "sharesOutstanding": shares,
+           "marketCap": int(price * shares),
+           "freeCashflow": int(price * shares * rng.normal(0.045, 0.03)),
+           "totalCash": int(price * shares * rng.uniform(0.01, 0.2)),
+           "totalDebt": int(price * shares * rng.uniform(0.0, 0.4)),
+       }
+
+   def _series(self) -> pd.DataFrame:
+       index = pd.bdate_range(SERIES_START, pd.Timestamp.today().normalize(), tz="America/New_York")
+       rng = np.random.default_rng(_seed(self.ticker))
+       close = rng.uniform(20, 400) * np.exp(np.cumsum(rng.normal(0.0003, 0.018, len(index))))
+       spread = close * rng.uniform(0.002, 0.025, len(index))
+       return pd.DataFrame(
+           {
+               "Open": close + rng.uniform(-0.5, 0.5, len(index)) * spread,
+               "High": close + spread,
+               "Low": close - spread,
+               "Close": close,
+               "Volume": rng.integers(100_000, 20_000_000, len(index)).astype(np.int64),
+               "Dividends": 0.0,
+               "Stock Splits": 0.0,
+           },
+           index=index,
+       )
+
+   def history(self, period: str = "1mo", start: Optional[str] = None, **_) -> pd.DataFrame:
+       self._wait()
+       if is_unknown_symbol(self.ticker):
+           return pd.DataFrame(columns=["Open", "High", "Low", "Close", "Volume", "Dividends", "Stock Splits"])
+       frame = self._series()
+       if start is not None:
+           since = pd.Timestamp(start).tz_localize(frame.index.tz)
+       else:
+           since = frame.index[-1] - pd.Timedelta(days=PERIOD_DAYS.get(period, 366))
+       return frame[frame.index >= since]
+
+
+def standin_download(symbols: List[str], latency: Optional[LatencyProfile] = None, **kwargs) -> pd.DataFrame:
+   """yf.download(symbols, group_by="ticker") for stand-in tickers: one delay for the whole call.
+
+   Unknown symbols get all-NaN columns, as yfinance gives tickers it could not download.
+   """
+   source = StandInTicker(",".join(symbols), latency)
+   source._wait()
+   frames = {symbol: StandInTicker(symbol).history(**kwargs) for symbol in symbols}
+   known = {symbol: frame for symbol, frame in frames.items() if not frame.empty}
+   if not known:
+       return pd.DataFrame()
+   combined = pd.concat(known, axis=1)
+   for symbol in symbols:
+       if symbol not in known:
+           for column in frames[symbol].columns:
+               combined[(symbol, column)] = np.nan
+   return combined
+
+
+def _answer_one(prompt: str) -> dict:
+   """Answers one of the app's prompts, with a verdict that is stable for the same prompt."""
+   verdict = RECOMMENDATIONS[_seed(" ".join(prompt.split())) % 3]
+   lowered = prompt.lower()
+   if "sentiment" in lowered and "final verdict" not in lowered:
+       return {
+           "sentiment_summary": "General sentiment is mixed to positive.",
+           "recommendation": verdict,
+           "reasoning": "Stand-in sentiment based on recent coverage.",
+       }
+   if "final verdict" in lowered:
+       return {"overall_recommendation": verdict, "overall_reasoning": "Stand-in verdict weighing all three reports."}
+   return {"recommendation": verdict}
+
+
+_BATCH_ITEM_RE = re.compile(r'Request id "([^"]+)":\n')
+_SHORT_LIST_RE = re.compile(r"^\s*- ([A-Z0-9.^=\-]+) \(", re.MULTILINE)
+
+
+def standin_answer(prompt: str) -> str:
+   """Returns the JSON text Gemini would be expected to answer for one of the app's prompts."""
+   if "independent requests" in prompt:
+       parts = _BATCH_ITEM_RE.split(prompt)[1:]
+       return json.dumps([{**_answer_one(body), "id": item_id} for item_id, body in zip(parts[::2], parts[1::2])])
+   if "short list" in prompt.lower():
+       return json.dumps([
+           {"ticker": ticker, "reason": f"Stand-in: free cash flow supports a DCF value above the price of {ticker}."}
+           for ticker in _SHORT_LIST_RE.findall(prompt)
+       ])
+   return json.dumps(_answer_one(prompt))
\ No newline at end of file
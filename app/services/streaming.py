@@ -0,0 +1,87 @@
+# app/services/streaming.py
+import asyncio
+import json
+from typing import AsyncIterator, List, Optional
+
+from fastapi import HTTPException
+from pydantic import BaseModel
+
+from app.core.config import settings
+from app.services.analysis import subscribe_stages, unsubscribe_stages
+from app.services.precompute import precompute_scheduler
+from app.services.rate_limiter import PRIORITY_BATCH, request_priority
+
+# Pipeline stage name -> SSE event name (the matching StockAnalysis field)
+STAGE_EVENTS = {
+   "fundamental": "fundamental",
+   "technical": "technical",
+   "sentiment": "sentiment",
+   "recommendation": "final_recommendation",
+}
+_DONE = "__done__"
+_ERROR = "__error__"
+
+
+def format_sse(event: str, data: str, event_id: Optional[str] = None) -> str:
+   lines = [f"event: {event}"]
+   if event_id is not None:
+       lines.append(f"id: {event_id}")
+   lines.append(f"data: {data}")
+   return "\n".join(lines) + "\n\n"
+
+
+async def stream_analyses(symbols: List[str], include_ticker: bool = False) -> AsyncIterator[str]:
+   """Yields SSE events for each ticker's fundamental, technical, sentiment and final_recommendation
+   results as the pipeline stages finish, interleaved across tickers, then a done (or error) event per ticker.
+
+   With include_ticker the data is {"ticker": ..., "data": <schema>}; otherwise it is the bare schema JSON.
+   Results already in the precompute store are emitted straight away.
+   """
+   symbols = list(dict.fromkeys(symbol.upper() for symbol in symbols))
+   queue: asyncio.Queue = asyncio.Queue()
+   semaphore = asyncio.Semaphore(max(1, settings.BATCH_MAX_CONCURRENCY))
+   emitted = {symbol: set() for symbol in symbols}
+
+   def payload(symbol: str, data) -> str:
+       if isinstance(data, BaseModel):
+           data = data.model_dump(mode="json")
+       return json.dumps({"ticker": symbol, "data": data} if include_ticker else data)
+
+   async def analyze(symbol: str) -> None:
+       if len(symbols) > 1:
+           request_priority.set(PRIORITY_BATCH)
+       async with semaphore:
+           subscribe_stages(symbol, queue)
+           try:
+               result = await precompute_scheduler.get_analysis(symbol)
+               queue.put_nowait((symbol, _DONE, result))
+           except HTTPException as e:
+               queue.put_nowait((symbol, _ERROR, {"status_code": e.status_code, "detail": e.detail}))
+           except Exception as e:
+               queue.put_nowait((symbol, _ERROR, {"status_code": 500, "detail": str(e)}))
+           finally:
+               unsubscribe_stages(symbol, queue)
+
+   tasks = [asyncio.create_task(analyze(symbol)) for symbol in symbols]
+   remaining = len(symbols)
+   try:
+       yield format_sse("start", json.dumps({"tickers": symbols}))
+       while remaining:
+           symbol, stage, result = await queue.get()
+           if stage == _ERROR:
+               remaining -= 1
+               yield format_sse("error", payload(symbol, result), symbol)
+           elif stage == _DONE:
+               remaining -= 1
+               analysis, age, status = result
+               for event in STAGE_EVENTS.values():
+                   if event not in emitted[symbol]:
+                       yield format_sse(event, payload(symbol, getattr(analysis, event)), symbol)
+               summary = {"status": status, "age_seconds": round(age, 3), "degraded": analysis.degraded}
+               yield format_sse("done", payload(symbol, summary), symbol)
+           elif stage in STAGE_EVENTS and STAGE_EVENTS[stage] not in emitted[symbol]:
+               emitted[symbol].add(STAGE_EVENTS[stage])
+               yield format_sse(STAGE_EVENTS[stage], payload(symbol, result), symbol)
+   finally:
+       for task in tasks:
+           task.cancel()
\ No newline at end of file
@@ -0,0 +1,108 @@
+# app/services/tracing.py
+"""Opt-in per-request span tracing.
+
+A request that asks for a trace opens a root span with trace(); span() and annotate() calls made
+while serving it, including from tasks it starts, attach to that tree through a ContextVar, so
+concurrent requests never mix. Without an active trace, span() is a single ContextVar lookup.
+Background work spawned by a traced request should call detach() so it does not join the trace.
+"""
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, List, Optional, Tuple
+
+_TOKEN_RE = re.compile(r"[^A-Za-z0-9_.\-]")
+
+
+class Span:
+   __slots__ = ("name", "attrs", "children", "started", "ended")
+
+   def __init__(self, name: str, attrs: dict):
+       self.name = name
+       self.attrs = attrs
+       self.children: List["Span"] = []
+       self.started = time.perf_counter()
+       self.ended: Optional[float] = None
+
+   def set(self, **attrs) -> None:
+       self.attrs.update(attrs)
+
+   @property
+   def duration_ms(self) -> float:
+       return ((self.ended or time.perf_counter()) - self.started) * 1000
+
+   def to_dict(self, origin: Optional[float] = None) -> dict:
+       origin = self.started if origin is None else origin
+       return {
+           "name": self.name,
+           "start_ms": round((self.started - origin) * 1000, 3),
+           "duration_ms": round(self.duration_ms, 3),
+           **({"attrs": dict(self.attrs)} if self.attrs else {}),
+           **({"children": [child.to_dict(origin) for child in self.children]} if self.children else {}),
+       }
+
+   def walk(self, prefix: str = "") -> Iterator[Tuple[str, "Span"]]:
+       path = f"{prefix}.{self.name}" if prefix else self.name
+       yield path, self
+       for child in self.children:
+           yield from child.walk(path)
+
+
+current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+@contextmanager
+def trace(name: str, **attrs):
+   """Opens the root span of a new trace for the current request."""
+   root = Span(name, attrs)
+   token = current_span.set(root)
+   try:
+       yield root
+   finally:
+       root.ended = time.perf_counter()
+       current_span.reset(token)
+
+
+@contextmanager
+def span(name: str, **attrs):
+   """Opens a child of the current span; yields None (and records nothing) when no trace is active."""
+   parent = current_span.get()
+   if parent is None:
+       yield None
+       return
+   child = Span(name, attrs)
+   parent.children.append(child)
+   token = current_span.set(child)
+   try:
+       yield child
+   except BaseException as e:
+       child.attrs["error"] = type(e).__name__
+       raise
+   finally:
+       child.ended = time.perf_counter()
+       current_span.reset(token)
+
+
+def annotate(**attrs) -> None:
+   """Adds attributes, such as cache=hit, to the current span if a trace is active."""
+   active = current_span.get()
+   if active is not None:
+       active.attrs.update(attrs)
+
+
+def detach() -> None:
+   """Stops the current task from recording into the trace it inherited."""
+   current_span.set(None)
+
+
+def server_timing(root: Span) -> str:
+   """Formats the span tree as a Server-Timing header value, one metric per span."""
+   metrics = []
+   for path, node in root.walk():
+       metric = f"{_TOKEN_RE.sub('_', path)};dur={node.duration_ms:.1f}"
+       if node.attrs:
+           desc = " ".join(f"{key}={value}" for key, value in node.attrs.items())
+           metric += ';desc="' + desc.replace("\\", "\\\\").replace('"', "'") + '"'
+       metrics.append(metric)
+   return ", ".join(metrics)
\ No newline at end of file
@@ -0,0 +1,66 @@
+# benchmarks/gemini_standin.py
+"""Local stand-in for the Gemini generateContent endpoint, with configurable latency and faults.
+
+Usage: python -m benchmarks.gemini_standin [--port 9000] [--latency-ms 800] [--sigma 0.4]
+                                          [--tail-rate 0.02] [--tail-ms 5000] [--fault-rate 0] [--throttle-rate 0]
+
+Then start the app with GEMINI_API_BASE=http://127.0.0.1:9000 and any GEMINI_API_KEY.
+"""
+import argparse
+import asyncio
+import json
+import random
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from app.services.standin import LatencyProfile, standin_answer
+
+
+def create_app(latency: LatencyProfile, throttle_rate: float = 0.0, seed: int = 0) -> FastAPI:
+   app = FastAPI(title="Gemini stand-in")
+   rng = random.Random(seed)
+   app.state.calls = 0
+
+   @app.post("/v1beta/models/{model}:generateContent")
+   async def generate_content(model: str, request: Request):
+       app.state.calls += 1
+       body = await request.json()
+       await asyncio.sleep(latency.sample(rng))
+       if throttle_rate and rng.random() < throttle_rate:
+           return JSONResponse({"error": {"code": 429, "status": "RESOURCE_EXHAUSTED"}}, status_code=429,
+                               headers={"Retry-After": "1"})
+       if latency.fails(rng):
+           return JSONResponse({"error": {"code": 503, "status": "UNAVAILABLE"}}, status_code=503)
+       prompt = body["contents"][0]["parts"][0]["text"]
+       text = f"```json\n{standin_answer(prompt)}\n```"
+       return {"candidates": [{"content": {"parts": [{"text": text}], "role": "model"}}]}
+
+   @app.get("/stats")
+   async def stats():
+       return {"calls": app.state.calls}
+
+   return app
+
+
+def main() -> None:
+   import uvicorn
+
+   parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+   parser.add_argument("--host", default="127.0.0.1")
+   parser.add_argument("--port", type=int, default=9000)
+   parser.add_argument("--latency-ms", type=float, default=800)
+   parser.add_argument("--sigma", type=float, default=0.4)
+   parser.add_argument("--tail-rate", type=float, default=0.02)
+   parser.add_argument("--tail-ms", type=float, default=5000)
+   parser.add_argument("--fault-rate", type=float, default=0.0)
+   parser.add_argument("--throttle-rate", type=float, default=0.0)
+   parser.add_argument("--seed", type=int, default=0)
+   args = parser.parse_args()
+
+   latency = LatencyProfile(args.latency_ms, args.sigma, args.tail_rate, args.tail_ms, args.fault_rate)
+   uvicorn.run(create_app(latency, args.throttle_rate, args.seed), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+   main()
@@ -0,0 +1,80 @@
+# benchmarks/indicators_bench.py
+"""Compares the vectorized indicator engine with the per-ticker pandas_ta path.
+
+pandas_ta is no longer an app dependency; install it separately for the parity check and reference timing.
+
+Usage: python -m benchmarks.indicators_bench [--tickers 500] [--bars 252]
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.services.indicators import screen
+
+
+def synthetic_universe(n_tickers: int, n_bars: int, seed: int = 0) -> dict:
+   rng = np.random.default_rng(seed)
+   index = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=n_bars)
+   frames = {}
+   for i in range(n_tickers):
+       close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n_bars)))
+       spread = close * rng.uniform(0.001, 0.03, n_bars)
+       frames[f"T{i:04d}"] = pd.DataFrame(
+           {"Open": close, "High": close + spread, "Low": close - spread, "Close": close, "Volume": 1e6},
+           index=index,
+       )
+   return frames
+
+
+def pandas_ta_path(frames: dict) -> dict:
+   """The original technical_agent computation, one ticker at a time."""
+   import pandas_ta  # noqa: F401  (registers the DataFrame.ta accessor)
+
+   results = {}
+   for symbol, frame in frames.items():
+       hist = frame.copy()
+       hist.ta.adx(length=14, append=True); hist.ta.rsi(length=14, append=True); hist.ta.ema(length=50, append=True)
+       hist.dropna(inplace=True)
+       latest = hist.iloc[-1]
+       results[symbol] = {"rsi_14": latest["RSI_14"], "ema_50": latest["EMA_50"], "adx_14": latest["ADX_14"]}
+   return results
+
+
+def main() -> None:
+   parser = argparse.ArgumentParser(description=__doc__)
+   parser.add_argument("--tickers", type=int, default=500)
+   parser.add_argument("--bars", type=int, default=252)
+   parser.add_argument("--tolerance", type=float, default=1e-8)
+   args = parser.parse_args()
+
+   frames = synthetic_universe(args.tickers, args.bars)
+
+   start = time.perf_counter()
+   vectorized = screen(frames)
+   vectorized_s = time.perf_counter() - start
+   print(f"vectorized: {args.tickers} tickers x {args.bars} bars in {vectorized_s * 1000:.1f} ms")
+
+   try:
+       start = time.perf_counter()
+       reference = pandas_ta_path(frames)
+       reference_s = time.perf_counter() - start
+   except ImportError:
+       print("pandas_ta is not installed; skipping the parity check and reference timing.")
+       return
+   print(f"pandas_ta:  {args.tickers} tickers x {args.bars} bars in {reference_s * 1000:.1f} ms "
+         f"({reference_s / vectorized_s:.1f}x slower)")
+
+   worst = max(
+       abs(vectorized[symbol][name] - reference[symbol][name])
+       for symbol in frames
+       for name in ("rsi_14", "ema_50", "adx_14")
+   )
+   print(f"max abs difference vs pandas_ta: {worst:.3e}")
+   if worst > args.tolerance:
+       raise SystemExit(f"parity check failed: {worst:.3e} > {args.tolerance:.0e}")
+
+
+if __name__ == "__main__":
+   main()
\ No newline at end of file
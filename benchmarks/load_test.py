@@ -0,0 +1,236 @@
+# benchmarks/load_test.py
+"""Drives /api/analyze, /api/portfolio and /api/undervalued-stocks at set concurrency levels and
+reports throughput and p50/p95/p99 latency per endpoint and level.
+
+Usage:
+   python -m benchmarks.load_test --spawn [--concurrency 1,8,32] [--duration 15]
+                                  [--save-baseline benchmarks/baseline.json] [--compare benchmarks/baseline.json]
+   python -m benchmarks.load_test --base-url http://127.0.0.1:8000 ...
+
+--spawn starts the Gemini stand-in and the app (with MARKET_DATA_SOURCE=standin and fresh cache
+directories) as subprocesses, so runs are repeatable and need neither an API key nor network access.
+--compare exits non-zero when any p95 grows, or any throughput drops, by more than --tolerance.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+DEFAULT_TICKERS = ["AAPL", "MSFT", "GOOGL", "AMZN", "META", "NVDA", "TSLA", "AMD", "CRM", "DELL"]
+ENDPOINTS = {
+   "analyze": lambda ticker: f"/api/analyze/{ticker}",
+   "portfolio": lambda ticker: "/api/portfolio",
+   "undervalued": lambda ticker: "/api/undervalued-stocks",
+}
+
+
+def percentile(ordered: List[float], q: float) -> Optional[float]:
+   if not ordered:
+       return None
+   return ordered[min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered))) - 1))]
+
+
+async def run_level(client: httpx.AsyncClient, endpoint: str, tickers: List[str], concurrency: int,
+                   duration: float) -> dict:
+   """Keeps `concurrency` requests in flight against one endpoint for `duration` seconds."""
+   paths = itertools.cycle([ENDPOINTS[endpoint](ticker) for ticker in tickers])
+   latencies: List[float] = []
+   errors = 0
+   stop_at = time.monotonic() + duration
+
+   async def worker() -> None:
+       nonlocal errors
+       while time.monotonic() < stop_at:
+           started = time.monotonic()
+           try:
+               response = await client.get(next(paths))
+               ok = response.status_code < 400
+           except httpx.HTTPError:
+               ok = False
+           if ok:
+               latencies.append(time.monotonic() - started)
+           else:
+               errors += 1
+
+   started = time.monotonic()
+   await asyncio.gather(*(worker() for _ in range(concurrency)))
+   elapsed = time.monotonic() - started
+   latencies.sort()
+   as_ms = lambda value: round(value * 1000, 2) if value is not None else None
+   return {
+       "requests": len(latencies) + errors,
+       "errors": errors,
+       "throughput_rps": round(len(latencies) / elapsed, 2),
+       "p50_ms": as_ms(percentile(latencies, 50)),
+       "p95_ms": as_ms(percentile(latencies, 95)),
+       "p99_ms": as_ms(percentile(latencies, 99)),
+   }
+
+
+async def run(base_url: str, endpoints: List[str], levels: List[int], duration: float, warmup: float,
+             tickers: List[str]) -> Dict[str, dict]:
+   limits = httpx.Limits(max_connections=max(levels) + 8, max_keepalive_connections=max(levels) + 8)
+   results = {}
+   async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+       for endpoint in endpoints:
+           if warmup > 0:
+               await run_level(client, endpoint, tickers, min(levels), warmup)
+           for level in levels:
+               key = f"{endpoint}@{level}"
+               results[key] = await run_level(client, endpoint, tickers, level, duration)
+               print(format_row(key, results[key]), flush=True)
+   return results
+
+
+def format_row(key: str, row: dict) -> str:
+   return (f"{key:<18} {row['throughput_rps']:>9.2f} rps  p50 {row['p50_ms'] or 0:>9.1f} ms  "
+           f"p95 {row['p95_ms'] or 0:>9.1f} ms  p99 {row['p99_ms'] or 0:>9.1f} ms  "
+           f"errors {row['errors']}/{row['requests']}")
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], tolerance: float) -> List[str]:
+   """Prints each result against the baseline and returns the keys that regressed beyond the tolerance."""
+   regressions = []
+   print(f"\n{'scenario':<18} {'rps':>16} {'p95 ms':>20} {'p99 ms':>20}")
+   for key, row in results.items():
+       base = baseline.get(key)
+       if base is None:
+           print(f"{key:<18} (not in baseline)")
+           continue
+       change = lambda field: (row[field] - base[field]) / base[field] if base.get(field) and row.get(field) is not None else 0.0
+       print(f"{key:<18} {row['throughput_rps']:>8.2f} ({change('throughput_rps'):+6.1%}) "
+             f"{row['p95_ms'] or 0:>10.1f} ({change('p95_ms'):+6.1%}) {row['p99_ms'] or 0:>10.1f} ({change('p99_ms'):+6.1%})")
+       if change("p95_ms") > tolerance or change("throughput_rps") < -tolerance:
+           regressions.append(key)
+   return regressions
+
+
+def free_port() -> int:
+   with socket.socket() as sock:
+       sock.bind(("127.0.0.1", 0))
+       return sock.getsockname()[1]
+
+
+def wait_until_up(url: str, process: subprocess.Popen, timeout: float = 60) -> None:
+   deadline = time.monotonic() + timeout
+   while time.monotonic() < deadline:
+       if process.poll() is not None:
+           raise RuntimeError(f"{url} exited with code {process.returncode} before it came up")
+       try:
+           httpx.get(url, timeout=1)
+           return
+       except httpx.HTTPError:
+           time.sleep(0.2)
+   raise RuntimeError(f"{url} did not come up within {timeout:.0f}s")
+
+
+def spawn(args, workdir: str) -> tuple:
+   """Starts the Gemini stand-in and the app against it; returns (base_url, processes)."""
+   standin_port, app_port = free_port(), free_port()
+   standin = subprocess.Popen([
+       sys.executable, "-m", "benchmarks.gemini_standin", "--port", str(standin_port),
+       "--latency-ms", str(args.llm_latency_ms), "--tail-rate", str(args.llm_tail_rate),
+       "--tail-ms", str(args.llm_tail_ms), "--fault-rate", str(args.llm_fault_rate),
+   ])
+   wait_until_up(f"http://127.0.0.1:{standin_port}/stats", standin)
+   env = {
+       **os.environ,
+       "GEMINI_API_KEY": "standin",
+       "GEMINI_API_BASE": f"http://127.0.0.1:{standin_port}",
+       "MARKET_DATA_SOURCE": "standin",
+       "STANDIN_MARKET_LATENCY_MS": str(args.market_latency_ms),
+       "LLM_CACHE_PATH": os.path.join(workdir, "llm_cache.sqlite3"),
+       "PRICE_STORE_DIR": os.path.join(workdir, "prices"),
+       "INDICATOR_STATE_DIR": os.path.join(workdir, "indicator_state"),
+       "SHARED_CACHE_PATH": os.path.join(workdir, "shared_cache.sqlite3"),
+       "ORDER_WAL_PATH": os.path.join(workdir, "orders.wal"),
+       "PRECOMPUTE_ENABLED": "true" if args.precompute else "false",
+   }
+   app = subprocess.Popen(
+       [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(app_port), "--log-level", "warning"],
+       env=env,
+   )
+   base_url = f"http://127.0.0.1:{app_port}"
+   wait_until_up(f"{base_url}/api/cache/stats", app)
+   return base_url, [app, standin]
+
+
+def main() -> None:
+   parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+   parser.add_argument("--base-url", help="Load-test an already running app instead of spawning one")
+   parser.add_argument("--spawn", action="store_true", help="Start the Gemini stand-in and the app locally")
+   parser.add_argument("--endpoints", default=",".join(ENDPOINTS))
+   parser.add_argument("--concurrency", default="1,8,32")
+   parser.add_argument("--duration", type=float, default=15, help="Seconds per endpoint and concurrency level")
+   parser.add_argument("--warmup", type=float, default=3, help="Seconds of unrecorded traffic per endpoint")
+   parser.add_argument("--tickers", default=",".join(DEFAULT_TICKERS))
+   parser.add_argument("--llm-latency-ms", type=float, default=800)
+   parser.add_argument("--llm-tail-rate", type=float, default=0.02)
+   parser.add_argument("--llm-tail-ms", type=float, default=5000)
+   parser.add_argument("--llm-fault-rate", type=float, default=0.0)
+   parser.add_argument("--market-latency-ms", type=float, default=150)
+   parser.add_argument("--precompute", action="store_true", help="Keep background precompute on in the spawned app")
+   parser.add_argument("--save-baseline", metavar="PATH")
+   parser.add_argument("--compare", metavar="PATH")
+   parser.add_argument("--tolerance", type=float, default=0.10)
+   args = parser.parse_args()
+   if not args.base_url and not args.spawn:
+       parser.error("pass --base-url or --spawn")
+
+   endpoints = [name.strip() for name in args.endpoints.split(",") if name.strip()]
+   unknown = set(endpoints) - set(ENDPOINTS)
+   if unknown:
+       parser.error(f"unknown endpoints: {', '.join(sorted(unknown))}")
+   levels = [int(level) for level in args.concurrency.split(",")]
+   tickers = [ticker.strip().upper() for ticker in args.tickers.split(",") if ticker.strip()]
+
+   processes = []
+   with tempfile.TemporaryDirectory(prefix="load_test_") as workdir:
+       try:
+           base_url = args.base_url
+           if args.spawn:
+               base_url, processes = spawn(args, workdir)
+           print(f"Load-testing {base_url}: {', '.join(endpoints)} at concurrency {levels}, {args.duration:.0f}s each")
+           results = asyncio.run(run(base_url, endpoints, levels, args.duration, args.warmup, tickers))
+       finally:
+           for process in processes:
+               process.terminate()
+           for process in processes:
+               process.wait(timeout=30)
+
+   if args.save_baseline:
+       meta = {
+           "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+           "python": platform.python_version(),
+           "machine": platform.machine(),
+           "duration": args.duration,
+           "spawned": args.spawn,
+           "llm_latency_ms": args.llm_latency_ms,
+           "market_latency_ms": args.market_latency_ms,
+       }
+       with open(args.save_baseline, "w") as f:
+           json.dump({"meta": meta, "results": results}, f, indent=2)
+       print(f"\nBaseline written to {args.save_baseline}")
+
+   if args.compare:
+       with open(args.compare) as f:
+           baseline = json.load(f)["results"]
+       regressions = compare(results, baseline, args.tolerance)
+       if regressions:
+           print(f"\nRegressed beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+           sys.exit(1)
+       print(f"\nNo regressions beyond {args.tolerance:.0%}.")
+
+
+if __name__ == "__main__":
+   main()
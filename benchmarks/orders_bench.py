@@ -0,0 +1,68 @@
+# benchmarks/orders_bench.py
+"""Measures order pipeline throughput and latency with fsync per order versus group commit.
+
+Each run submits --orders orders from --concurrency concurrent producers into a fresh
+OrderPipeline with a StubBroker and reports orders/s, p50/p99 submit latency and orders per fsync.
+"--wal-batch 1" is the one-fsync-per-order baseline.
+
+Usage: python -m benchmarks.orders_bench [--orders 20000] [--concurrency 1,64,512] [--wal-batch 1,512] [--dir /tmp]
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from app.services.orders import OrderLog, OrderPipeline, StubBroker
+
+
+async def run(path: str, orders: int, concurrency: int, wal_batch: int, fsync: bool) -> dict:
+   log = OrderLog(path, fsync=fsync)
+   pipeline = OrderPipeline(log, StubBroker(), queue_max=max(concurrency, 1) * 2, wal_batch=wal_batch,
+                            broker_batch=500, retry_seconds=1, idempotency_ttl=3600)
+   await pipeline.start()
+   latencies = []
+   per_producer = orders // concurrency
+
+   async def producer(n: int) -> None:
+       for i in range(per_producer):
+           started = time.perf_counter()
+           await pipeline.submit("buy", "AAPL", 1, f"p{n}-{i}")
+           latencies.append(time.perf_counter() - started)
+
+   started = time.perf_counter()
+   await asyncio.gather(*(producer(n) for n in range(concurrency)))
+   elapsed = time.perf_counter() - started
+   await pipeline.stop()
+   total = per_producer * concurrency
+   return {
+       "rps": total / elapsed,
+       "p50_ms": float(np.percentile(latencies, 50)) * 1000,
+       "p99_ms": float(np.percentile(latencies, 99)) * 1000,
+       "per_fsync": total / max(log.syncs, 1) if fsync else float("nan"),
+   }
+
+
+def main() -> None:
+   parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+   parser.add_argument("--orders", type=int, default=20000)
+   parser.add_argument("--concurrency", default="1,64,512")
+   parser.add_argument("--wal-batch", default="1,512")
+   parser.add_argument("--no-fsync", action="store_true", help="skip fsync (page cache only) for comparison")
+   parser.add_argument("--dir", default=None, help="directory for the log files (default: a temp dir)")
+   args = parser.parse_args()
+
+   with tempfile.TemporaryDirectory(dir=args.dir) as root:
+       print(f"{'wal_batch':>9} {'producers':>9} {'orders/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'orders/fsync':>13}")
+       for wal_batch in (int(value) for value in args.wal_batch.split(",")):
+           for concurrency in (int(value) for value in args.concurrency.split(",")):
+               path = os.path.join(root, f"orders-{wal_batch}-{concurrency}.wal")
+               result = asyncio.run(run(path, args.orders, concurrency, wal_batch, not args.no_fsync))
+               print(f"{wal_batch:>9} {concurrency:>9} {result['rps']:>10.0f} {result['p50_ms']:>8.2f} "
+                     f"{result['p99_ms']:>8.2f} {result['per_fsync']:>13.1f}")
+
+
+if __name__ == "__main__":
+   main()
\ No newline at end of file
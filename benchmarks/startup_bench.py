@@ -0,0 +1,160 @@
+# benchmarks/startup_bench.py
+"""Measures cold-start cost: the time to import app.main, and the time from spawning uvicorn to the
+first response from a light route (/api/portfolio) and from one that needs the data libraries
+(/api/undervalued-stocks, screened locally without the LLM).
+
+Usage:
+   python -m benchmarks.startup_bench [--runs 5] [--warmup off,background,blocking]
+                                      [--save-baseline benchmarks/startup_baseline.json]
+                                      [--compare benchmarks/startup_baseline.json] [--tolerance 0.2]
+
+Each figure is the median over --runs fresh processes. --compare exits non-zero when any of them
+grows by more than --tolerance.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import httpx
+
+from benchmarks.load_test import free_port
+
+IMPORT_PROBE = (
+   "import json, sys, time; started = time.perf_counter(); import app.main; "
+   "print(json.dumps({'seconds': time.perf_counter() - started, "
+   "'loaded': [m for m in ('numpy', 'pandas', 'yfinance', 'pandas_ta') if m in sys.modules]}))"
+)
+LIGHT_PATH = "/api/portfolio"
+HEAVY_PATH = "/api/undervalued-stocks?portfolio=default"
+
+
+def measure_import() -> dict:
+   output = subprocess.run([sys.executable, "-c", IMPORT_PROBE], capture_output=True, text=True, check=True).stdout
+   return json.loads(output.strip().splitlines()[-1])
+
+
+def poll(client: httpx.Client, url: str, process: subprocess.Popen, timeout: float = 60) -> None:
+   deadline = time.monotonic() + timeout
+   while time.monotonic() < deadline:
+       if process.poll() is not None:
+           raise RuntimeError(f"The app exited with code {process.returncode} before answering {url}")
+       try:
+           if client.get(url, timeout=timeout).status_code == 200:
+               return
+       except httpx.TransportError:
+           pass
+       time.sleep(0.01)
+   raise RuntimeError(f"{url} did not answer within {timeout:.0f}s")
+
+
+def measure_first_response(warmup: str, workdir: str) -> dict:
+   """Spawns the app and returns seconds until the light and then the heavy route first answer 200."""
+   port = free_port()
+   env = {
+       **os.environ,
+       "STARTUP_WARMUP": warmup,
+       "MARKET_DATA_SOURCE": "standin",
+       "STANDIN_MARKET_LATENCY_MS": "0",
+       "STANDIN_MARKET_TAIL_RATE": "0",
+       "SCREENER_LLM_REASONS": "false",
+       "PRECOMPUTE_ENABLED": "false",
+       "SHARED_CACHE_BACKEND": "none",
+       "LLM_CACHE_PATH": os.path.join(workdir, "llm_cache.sqlite3"),
+       "PRICE_STORE_DIR": os.path.join(workdir, "prices"),
+       "INDICATOR_STATE_DIR": os.path.join(workdir, "indicator_state"),
+       "ORDER_WAL_PATH": os.path.join(workdir, "orders.wal"),
+   }
+   base_url = f"http://127.0.0.1:{port}"
+   started = time.perf_counter()
+   process = subprocess.Popen(
+       [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+       env=env, stdout=subprocess.DEVNULL,
+   )
+   try:
+       with httpx.Client() as client:
+           poll(client, base_url + LIGHT_PATH, process)
+           light = time.perf_counter() - started
+           poll(client, base_url + HEAVY_PATH, process)
+           heavy = time.perf_counter() - started
+   finally:
+       process.terminate()
+       process.wait(timeout=30)
+   return {"first_response_s": light, "first_heavy_response_s": heavy}
+
+
+def run(runs: int, warmups: List[str]) -> Dict[str, dict]:
+   results = {}
+   imports = [measure_import() for _ in range(runs)]
+   results["import"] = {"seconds": statistics.median(sample["seconds"] for sample in imports),
+                        "loaded": imports[-1]["loaded"]}
+   print(f"import app.main      {results['import']['seconds'] * 1000:>8.1f} ms  "
+         f"(data libraries loaded at import: {', '.join(results['import']['loaded']) or 'none'})")
+   for warmup in warmups:
+       samples = []
+       for _ in range(runs):
+           with tempfile.TemporaryDirectory(prefix="startup_bench_") as workdir:
+               samples.append(measure_first_response(warmup, workdir))
+       row = {key: statistics.median(sample[key] for sample in samples) for key in samples[0]}
+       results[f"warmup={warmup}"] = row
+       print(f"warmup={warmup:<11} first response {row['first_response_s'] * 1000:>8.1f} ms  "
+             f"first heavy response {row['first_heavy_response_s'] * 1000:>8.1f} ms")
+   return results
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], tolerance: float) -> List[str]:
+   """Prints each figure against the baseline and returns those that grew beyond the tolerance."""
+   regressions = []
+   print()
+   for scenario, row in results.items():
+       for field, value in row.items():
+           base = baseline.get(scenario, {}).get(field)
+           if not isinstance(value, float) or not base:
+               continue
+           change = (value - base) / base
+           print(f"{scenario + ' ' + field:<42} {value * 1000:>8.1f} ms ({change:+6.1%})")
+           if change > tolerance:
+               regressions.append(f"{scenario} {field}")
+   return regressions
+
+
+def main() -> None:
+   parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+   parser.add_argument("--runs", type=int, default=5)
+   parser.add_argument("--warmup", default="off,background,blocking", help="STARTUP_WARMUP modes to measure")
+   parser.add_argument("--save-baseline", metavar="PATH")
+   parser.add_argument("--compare", metavar="PATH")
+   parser.add_argument("--tolerance", type=float, default=0.20)
+   args = parser.parse_args()
+
+   results = run(args.runs, [mode.strip() for mode in args.warmup.split(",") if mode.strip()])
+
+   if args.save_baseline:
+       meta = {
+           "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+           "python": platform.python_version(),
+           "machine": platform.machine(),
+           "runs": args.runs,
+       }
+       with open(args.save_baseline, "w") as f:
+           json.dump({"meta": meta, "results": results}, f, indent=2)
+       print(f"\nBaseline written to {args.save_baseline}")
+
+   if args.compare:
+       with open(args.compare) as f:
+           baseline = json.load(f)["results"]
+       regressions = compare(results, baseline, args.tolerance)
+       if regressions:
+           print(f"\nRegressed beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+           sys.exit(1)
+       print(f"\nNo regressions beyond {args.tolerance:.0%}.")
+
+
+if __name__ == "__main__":
+   main()
\ No newline at end of file
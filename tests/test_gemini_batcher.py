@@ -0,0 +1,60 @@
+# tests/test_gemini_batcher.py
+import asyncio
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from app.core.config import settings
+from app.services import gemini_batcher, gemini_client
+from app.services.llm_cache import LLMCache, make_cache_key
+from app.services.resilience import CircuitBreaker
+
+
+@pytest.fixture
+def open_breaker(monkeypatch):
+   """A fresh Gemini breaker, opened by a failed call, in place of the shared one."""
+   breaker = CircuitBreaker(window=1, min_calls=1, error_rate=0.5, open_seconds=60)
+   breaker.record(False, breaker.allow())
+   assert breaker.state == breaker.OPEN
+   monkeypatch.setattr(gemini_client, "gemini_breaker", breaker)
+   return breaker
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+   """An empty LLM cache in a temporary file, whatever LLM_CACHE_PATH says."""
+   cache = LLMCache(str(tmp_path / "llm_cache.sqlite3"), memory_max_entries=100, disk_max_entries=100, stale_grace=3600)
+   monkeypatch.setattr(gemini_client, "llm_cache", cache)
+   return cache
+
+
+def _cache_stale(cache: LLMCache, prompt: str, text: str) -> None:
+   cache._disk_set(make_cache_key(prompt, settings.GEMINI_MODEL), text, time.time() - 10)
+
+
+def test_open_breaker_serves_stale_answers_through_the_batcher(monkeypatch, open_breaker, cache):
+   monkeypatch.setattr(settings, "API_KEY", "test-key")
+   monkeypatch.setattr(settings, "GEMINI_BATCH_ENABLED", True)
+   monkeypatch.setattr(gemini_batcher, "_batchers", {})
+   p1 = "Sentiment for ticker A; return JSON."
+   p2 = "Sentiment for ticker B; return JSON."
+   p3 = "Sentiment for ticker C; return JSON."
+   _cache_stale(cache, p1, '{"recommendation": "BUY"}')
+   _cache_stale(cache, p2, '{"recommendation": "SELL"}')
+
+   async def run():
+       return await asyncio.gather(
+           gemini_batcher.classify("sentiment", "A", p1),
+           gemini_batcher.classify("sentiment", "B", p2),
+           gemini_batcher.classify("sentiment", "C", p3),
+           return_exceptions=True,
+       )
+
+   a, b, c = asyncio.run(run())
+   assert a == '{"recommendation": "BUY"}'
+   assert b == '{"recommendation": "SELL"}'
+   # Without a stale answer the item still fails fast with the breaker's 503
+   assert isinstance(c, HTTPException) and c.status_code == 503
+   assert gemini_batcher._batchers["sentiment"].batches_sent == 1
+   assert open_breaker.rejected >= 1
@@ -0,0 +1,83 @@
+# tests/test_indicator_state.py
+import numpy as np
+import pandas as pd
+
+from app.services import indicators
+from app.services.indicator_state import IndicatorStateStore
+
+
+def _history(n_bars, seed=7):
+   rng = np.random.default_rng(seed)
+   close = 100.0 * np.exp(np.cumsum(rng.normal(0.0, 0.02, n_bars)))
+   index = pd.date_range("2023-01-02", periods=n_bars, freq="B", tz="UTC")
+   return pd.DataFrame({
+       "High": close * (1.0 + rng.uniform(0.0, 0.02, n_bars)),
+       "Low": close * (1.0 - rng.uniform(0.0, 0.02, n_bars)),
+       "Close": close,
+   }, index=index)
+
+
+def _assert_matches_screen(values, hist):
+   expected = indicators.screen({"AAPL": hist})["AAPL"]
+   for name, value in expected.items():
+       if value is None:
+           assert values[name] is None, name
+       else:
+           assert abs(values[name] - value) < 1e-9 * max(1.0, abs(value)), name
+
+
+def test_bar_by_bar_matches_a_full_recompute(tmp_path):
+   store = IndicatorStateStore(str(tmp_path))
+   hist = _history(120)
+   for end in range(1, len(hist) + 1):
+       _assert_matches_screen(store.advance("AAPL", hist.iloc[:end]), hist.iloc[:end])
+   assert store.resyncs == 1
+   # Each call replays the stored latest bar in case it was revised, then applies the new one
+   assert store.bars_applied == 1 + 2 * (len(hist) - 1)
+
+
+def test_rewritten_last_bar_replaces_it(tmp_path):
+   store = IndicatorStateStore(str(tmp_path))
+   hist = _history(100)
+   store.advance("AAPL", hist)
+   # An intraday refresh revises the latest bar a few times
+   for close in (101.0, 97.5, 99.0):
+       revised = hist.copy()
+       revised.iloc[-1, revised.columns.get_loc("Close")] = close
+       revised.iloc[-1, revised.columns.get_loc("High")] = close * 1.01
+       revised.iloc[-1, revised.columns.get_loc("Low")] = close * 0.99
+       _assert_matches_screen(store.advance("AAPL", revised), revised)
+   assert store.resyncs == 1
+   assert store.bars_applied == len(hist) + 3
+
+
+def test_state_survives_a_restart(tmp_path):
+   hist = _history(90)
+   IndicatorStateStore(str(tmp_path)).advance("AAPL", hist.iloc[:80])
+   store = IndicatorStateStore(str(tmp_path))
+   _assert_matches_screen(store.advance("AAPL", hist), hist)
+   assert store.resyncs == 0
+   assert store.bars_applied == 11
+
+
+def test_gap_resyncs_from_the_full_history(tmp_path):
+   store = IndicatorStateStore(str(tmp_path))
+   hist = _history(100)
+   store.advance("AAPL", hist.iloc[:80])
+   # The state's latest bar is missing from the newer history
+   gapped = hist.drop(hist.index[79])
+   _assert_matches_screen(store.advance("AAPL", gapped), gapped)
+   assert store.resyncs == 2
+   assert store.bars_applied == 80 + len(gapped)
+
+
+def test_changed_previous_close_resyncs(tmp_path):
+   store = IndicatorStateStore(str(tmp_path))
+   hist = _history(100)
+   store.advance("AAPL", hist.iloc[:80])
+   # A split or dividend back-adjusts the earlier closes
+   adjusted = hist.copy()
+   adjusted.iloc[:, :] = adjusted.to_numpy() * 0.5
+   _assert_matches_screen(store.advance("AAPL", adjusted), adjusted)
+   assert store.resyncs == 2
+   assert store.bars_applied == 80 + len(adjusted)
@@ -0,0 +1,98 @@
+# tests/test_indicators.py
+import numpy as np
+import pandas as pd
+
+from app.services import indicators
+
+# Reference definitions, written the way pandas_ta computes them with plain pandas
+def _rma(series, length):
+   return series.ewm(alpha=1.0 / length, min_periods=length).mean()
+
+
+def _rsi(close, length=14):
+   change = close.diff()
+   gains = _rma(change.clip(lower=0), length)
+   losses = _rma(change.clip(upper=0), length)
+   return 100.0 * gains / (gains + losses.abs())
+
+
+def _ema(close, length=50):
+   seeded = close.copy()
+   seeded.iloc[:length - 1] = np.nan
+   seeded.iloc[length - 1] = close.iloc[:length].mean()
+   out = seeded.iloc[length - 1:].ewm(span=length, adjust=False).mean()
+   return out.reindex(close.index)
+
+
+def _adx(high, low, close, length=14):
+   prev_close = close.shift(1)
+   true_range = pd.concat([high - low, (high - prev_close).abs(), (prev_close - low).abs()], axis=1).max(axis=1)
+   true_range[prev_close.isna()] = np.nan
+   up, down = high.diff(), -low.diff()
+   plus_dm = up.where((up > down) & (up > 0), 0.0).where(up.notna())
+   minus_dm = down.where((down > up) & (down > 0), 0.0).where(down.notna())
+   scale = 100.0 / _rma(true_range, length)
+   plus_di, minus_di = scale * _rma(plus_dm, length), scale * _rma(minus_dm, length)
+   return _rma(100.0 * (plus_di - minus_di).abs() / (plus_di + minus_di), length)
+
+
+def _bars(n_bars, seed):
+   rng = np.random.default_rng(seed)
+   close = 100.0 * np.exp(np.cumsum(rng.normal(0.0, 0.02, n_bars)))
+   high = close * (1.0 + rng.uniform(0.0, 0.02, n_bars))
+   low = close * (1.0 - rng.uniform(0.0, 0.02, n_bars))
+   return high, low, close
+
+
+def _padded(rows, n_bars):
+   out = np.full((len(rows), n_bars), np.nan)
+   for i, row in enumerate(rows):
+       out[i, n_bars - len(row):] = row
+   return out
+
+
+def _assert_close(actual, expected):
+   np.testing.assert_allclose(actual, np.asarray(expected, dtype=np.float64), rtol=1e-10, atol=1e-10, equal_nan=True)
+
+
+def test_single_row_matches_the_reference_definitions():
+   high, low, close = _bars(300, seed=1)
+   h, l, c = pd.Series(high), pd.Series(low), pd.Series(close)
+   _assert_close(indicators.rsi(close, 14)[0], _rsi(c))
+   _assert_close(indicators.ema(close, 50)[0], _ema(c))
+   _assert_close(indicators.adx(high, low, close, 14)[0], _adx(h, l, c))
+
+
+def test_nan_padded_rows_match_each_ticker_on_its_own():
+   # Histories of different lengths, right-aligned; one too short for any indicator
+   lengths = [300, 120, 51, 20]
+   bars = [_bars(n, seed=10 + i) for i, n in enumerate(lengths)]
+   n_bars = max(lengths)
+   high = _padded([b[0] for b in bars], n_bars)
+   low = _padded([b[1] for b in bars], n_bars)
+   close = _padded([b[2] for b in bars], n_bars)
+   series = indicators.compute_indicators(high, low, close)
+   for row, (h, l, c) in enumerate(bars):
+       h, l, c = pd.Series(h), pd.Series(l), pd.Series(c)
+       tail = slice(n_bars - len(c), None)
+       # Nothing is emitted in the padding
+       assert np.isnan(series["rsi_14"][row, :tail.start]).all()
+       _assert_close(series["rsi_14"][row, tail], _rsi(c))
+       _assert_close(series["ema_50"][row, tail], _ema(c) if len(c) >= 50 else np.full(len(c), np.nan))
+       _assert_close(series["adx_14"][row, tail], _adx(h, l, c))
+
+
+def test_screen_reports_latest_values_and_none_for_short_histories():
+   index = pd.date_range("2024-01-01", periods=120, freq="D", tz="UTC")
+   high, low, close = _bars(120, seed=3)
+   frames = {
+       "LONG": pd.DataFrame({"High": high, "Low": low, "Close": close}, index=index),
+       "SHORT": pd.DataFrame({"High": high[-10:], "Low": low[-10:], "Close": close[-10:]}, index=index[-10:]),
+   }
+   result = indicators.screen(frames)
+   c = pd.Series(close)
+   assert abs(result["LONG"]["rsi_14"] - _rsi(c).iloc[-1]) < 1e-10
+   assert abs(result["LONG"]["ema_50"] - _ema(c).iloc[-1]) < 1e-10
+   assert result["LONG"]["price"] == close[-1]
+   assert result["SHORT"]["rsi_14"] is None and result["SHORT"]["ema_50"] is None
+   assert result["SHORT"]["price"] == close[-1]
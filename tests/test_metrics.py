@@ -0,0 +1,30 @@
+# tests/test_metrics.py
+import asyncio
+from concurrent.futures import Executor
+
+from app.services.metrics import _default_executor_stats
+
+
+def test_executor_stats_read_the_default_thread_pool():
+   async def run():
+       await asyncio.to_thread(lambda: None)
+       return _default_executor_stats()
+
+   stats = asyncio.run(run())
+   assert stats[("queued",)] == 0
+   assert stats[("threads",)] >= 1
+   assert stats[("max_threads",)] >= stats[("threads",)]
+
+
+def test_executor_stats_skip_what_another_executor_does_not_have():
+   class PlainExecutor(Executor):
+       pass
+
+   async def run():
+       loop = asyncio.get_running_loop()
+       # set_default_executor() insists on a ThreadPoolExecutor; other loops and versions may not
+       loop._default_executor = PlainExecutor()
+       return _default_executor_stats()
+
+   assert asyncio.run(run()) == {}
+   assert _default_executor_stats() == {}
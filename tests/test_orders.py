@@ -0,0 +1,154 @@
+# tests/test_orders.py
+import asyncio
+import json
+
+import pytest
+from fastapi import HTTPException
+
+from app.services.orders import BrokerAdapter, Order, OrderLog, OrderPipeline, StubBroker
+
+
+class DownBroker(BrokerAdapter):
+   """Rejects every batch, so orders stay pending."""
+
+   def __init__(self):
+       self.attempts = 0
+
+   async def send(self, orders):
+       self.attempts += 1
+       raise ConnectionError("broker unreachable")
+
+
+class BrokenLog(OrderLog):
+   """Fails appends while broken is set."""
+
+   broken = True
+
+   def append(self, records, sync=True):
+       if self.broken:
+           raise OSError("disk full")
+       super().append(records, sync)
+
+
+def _pipeline(log, broker, **overrides):
+   options = dict(queue_max=100, wal_batch=8, broker_batch=8, retry_seconds=0.01, idempotency_ttl=3600)
+   options.update(overrides)
+   return OrderPipeline(log, broker, **options)
+
+
+async def _until_sent(pipeline, order_ids, timeout=5.0):
+   deadline = asyncio.get_running_loop().time() + timeout
+   while any(pipeline.get(order_id)[1] != "sent" for order_id in order_ids):
+       assert asyncio.get_running_loop().time() < deadline, "orders were not sent in time"
+       await asyncio.sleep(0.01)
+
+
+def _logged_orders(path):
+   with open(path, "rb") as f:
+       return [record["id"] for record in map(json.loads, f) if record["op"] == "order"]
+
+
+def test_unsent_orders_are_resent_after_a_restart(tmp_path):
+   path = str(tmp_path / "orders.wal")
+
+   async def run():
+       down = DownBroker()
+       first = _pipeline(OrderLog(path), down)
+       await first.start()
+       orders = [(await first.submit("buy", "aapl", n + 1))[0] for n in range(3)]
+       await asyncio.sleep(0.05)
+       assert down.attempts > 0
+       assert {first.get(order.order_id)[1] for order in orders} == {"pending"}
+       await first.stop()
+
+       broker = StubBroker()
+       second = _pipeline(OrderLog(path), broker)
+       await second.start()
+       assert second.recovered == 3
+       await _until_sent(second, [order.order_id for order in orders])
+       await second.stop()
+       assert set(broker.references) == {order.order_id for order in orders}
+       assert second.get(orders[0].order_id)[0].ticker == "AAPL"
+
+       # Sent records are in the log too, so a further restart has nothing to resend
+       third = _pipeline(OrderLog(path), StubBroker())
+       await third.start()
+       await third.stop()
+       assert third.recovered == 0
+
+   asyncio.run(run())
+
+
+def test_idempotency_key_returns_the_original_order(tmp_path):
+   async def run():
+       pipeline = _pipeline(OrderLog(str(tmp_path / "orders.wal")), StubBroker())
+       await pipeline.start()
+       first, repeated = await pipeline.submit("buy", "MSFT", 5, "key-1")
+       again, repeated_again = await pipeline.submit("buy", "msft", 5, "key-1")
+       assert not repeated and repeated_again
+       assert again.order_id == first.order_id
+       with pytest.raises(HTTPException) as conflict:
+           await pipeline.submit("buy", "MSFT", 6, "key-1")
+       assert conflict.value.status_code == 409
+       await pipeline.stop()
+       assert pipeline.duplicates == 1
+       assert _logged_orders(pipeline.log.path) == [first.order_id]
+
+   asyncio.run(run())
+
+
+def test_failed_log_write_forgets_the_idempotency_key(tmp_path):
+   async def run():
+       log = BrokenLog(str(tmp_path / "orders.wal"))
+       pipeline = _pipeline(log, StubBroker())
+       await pipeline.start()
+       with pytest.raises(HTTPException) as failure:
+           await pipeline.submit("sell", "TSLA", 2, "key-2")
+       assert failure.value.status_code == 503
+       assert pipeline.stats()["orders"] == 0
+
+       # The retry is a new order rather than a duplicate of one that was never recorded
+       log.broken = False
+       order, repeated = await pipeline.submit("sell", "TSLA", 2, "key-2")
+       assert not repeated
+       await _until_sent(pipeline, [order.order_id])
+       await pipeline.stop()
+
+   asyncio.run(run())
+
+
+def test_compaction_while_running_keeps_queued_orders_out_of_the_snapshot(tmp_path):
+   path = str(tmp_path / "orders.wal")
+
+   async def run():
+       # A tiny threshold compacts after every write, while other orders are still queued
+       pipeline = _pipeline(OrderLog(path), DownBroker(), wal_batch=2, compact_bytes=1)
+       await pipeline.start()
+       results = await asyncio.gather(*(pipeline.submit("buy", f"T{n}", 1) for n in range(20)))
+       await pipeline.stop()
+       assert pipeline.compactions > 1
+       order_ids = [order.order_id for order, _ in results]
+       logged = _logged_orders(path)
+       # Each order is in the log exactly once: not in a snapshot and again from the writer
+       assert sorted(logged) == sorted(order_ids)
+
+       restarted = _pipeline(OrderLog(path), StubBroker())
+       await restarted.start()
+       assert restarted.recovered == 20
+       await _until_sent(restarted, order_ids)
+       await restarted.stop()
+
+   asyncio.run(run())
+
+
+def test_stub_broker_keeps_a_bounded_set_of_references():
+   async def run():
+       broker = StubBroker(max_references=3)
+       orders = [Order(f"id-{n}", "buy", "AAPL", 1, None, 0.0) for n in range(5)]
+       first = await broker.send(orders[:2])
+       assert await broker.send(orders[:2]) == first
+       await broker.send(orders[2:])
+       assert list(broker.references) == ["id-2", "id-3", "id-4"]
+       assert broker.accepted == 5
+
+   asyncio.run(run())
@@ -0,0 +1,21 @@
+# tests/test_rate_limiter.py
+from app.services.rate_limiter import OutboundScheduler
+
+
+def _scheduler():
+   return OutboundScheduler(rate=10, burst=10, initial_limit=8, min_limit=1, max_limit=16, cooldown=0)
+
+
+def test_only_overload_statuses_shrink_the_limit():
+   for status in (429, 502, 503, 504, None):
+       scheduler = _scheduler()
+       scheduler.record(status)
+       assert scheduler.limit == 4, status
+       assert scheduler.throttled == 1
+
+
+def test_server_errors_are_not_treated_as_throttling():
+   scheduler = _scheduler()
+   scheduler.record(500)
+   assert scheduler.limit > 8
+   assert scheduler.throttled == 0
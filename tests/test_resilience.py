@@ -0,0 +1,26 @@
+# tests/test_resilience.py
+from app.services.resilience import CircuitBreaker
+
+
+def test_outcomes_from_before_a_state_change_are_ignored(monkeypatch):
+   now = [1000.0]
+   monkeypatch.setattr("app.services.resilience.time.monotonic", lambda: now[0])
+   breaker = CircuitBreaker(window=10, min_calls=2, error_rate=0.5, open_seconds=30)
+   early, slow = breaker.allow(), breaker.allow()
+   breaker.record(False, early)
+   breaker.record(False, early)
+   assert breaker.state == breaker.OPEN
+
+   # A failure from a call admitted while closed does not push back the reopen deadline
+   now[0] += 20
+   breaker.record(False, slow)
+   now[0] += 15
+   probe = breaker.allow()
+   assert probe is not None and breaker.state == breaker.HALF_OPEN
+
+   # Nor does it decide the half-open probe's outcome
+   breaker.record(True, slow)
+   assert breaker.state == breaker.HALF_OPEN and breaker.allow() is None
+   breaker.record(True, probe)
+   assert breaker.state == breaker.CLOSED
+   assert breaker.late_outcomes == 2
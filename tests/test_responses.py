@@ -0,0 +1,111 @@
+# tests/test_responses.py
+import gzip
+import os
+
+import brotli
+from fastapi import FastAPI, Header
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.api import endpoints
+from app.services.portfolio import PortfolioStore
+from app.services.responses import CompressionMiddleware, conditional_response, etag_matches, strong_etag
+
+BODY = b'{"tickers": "' + b"AAPL," * 400 + b'"}'
+
+
+def _client(minimum_size=64):
+   app = FastAPI()
+
+   @app.get("/data")
+   async def data(if_none_match: str = Header(None)):
+       return conditional_response(BODY, strong_etag(BODY), if_none_match)
+
+   @app.get("/stream")
+   async def stream(media_type: str = "application/json"):
+       async def chunks():
+           for _ in range(4):
+               yield BODY
+       return StreamingResponse(chunks(), media_type=media_type)
+
+   app.add_middleware(CompressionMiddleware, minimum_size=minimum_size)
+   return TestClient(app)
+
+
+def test_etag_matching_ignores_the_encoding_suffix():
+   assert etag_matches('"abc-gzip"', '"abc"')
+   assert etag_matches('"abc-br"', '"abc"')
+   assert etag_matches('W/"abc-br"', '"abc"')
+   assert etag_matches('"other", "abc-gzip"', '"abc"')
+   assert etag_matches("*", '"abc"')
+   assert not etag_matches('"abcd-gzip"', '"abc"')
+   assert not etag_matches('"abc-deflate"', '"abc"')
+   assert not etag_matches(None, '"abc"')
+
+
+def test_encoded_responses_revalidate_with_their_tagged_etag():
+   client = _client()
+   etag = strong_etag(BODY)
+   for encoding in ("gzip", "br"):
+       response = client.get("/data", headers={"Accept-Encoding": encoding})
+       assert response.headers["content-encoding"] == encoding
+       assert response.headers["etag"] == etag[:-1] + "-" + encoding + '"'
+       assert "Accept-Encoding" in response.headers["vary"]
+       # The client decodes the body
+       assert response.content == BODY
+
+       revalidated = client.get("/data", headers={"Accept-Encoding": encoding, "If-None-Match": response.headers["etag"]})
+       assert revalidated.status_code == 304
+       assert revalidated.content == b""
+       assert revalidated.headers["etag"] == etag
+       assert "content-encoding" not in revalidated.headers
+
+
+def test_small_and_unencoded_responses_keep_the_plain_etag():
+   response = _client(minimum_size=len(BODY) + 1).get("/data", headers={"Accept-Encoding": "gzip"})
+   assert "content-encoding" not in response.headers
+   assert response.headers["etag"] == strong_etag(BODY)
+   response = _client().get("/data", headers={"Accept-Encoding": "identity"})
+   assert "content-encoding" not in response.headers
+   assert response.content == BODY
+
+
+def test_streamed_bodies_are_encoded_chunk_by_chunk():
+   client = _client()
+   for encoding, decode in (("gzip", gzip.decompress), ("br", brotli.decompress)):
+       with client.stream("GET", "/stream", headers={"Accept-Encoding": encoding}) as response:
+           assert response.headers["content-encoding"] == encoding
+           assert "content-length" not in response.headers
+           raw = b"".join(response.iter_raw())
+       assert decode(raw) == BODY * 4
+   events = client.get("/stream", params={"media_type": "text/event-stream"}, headers={"Accept-Encoding": "gzip"})
+   assert "content-encoding" not in events.headers
+   assert events.content == BODY * 4
+
+
+def test_portfolio_etag_changes_when_the_file_changes(tmp_path, monkeypatch):
+   path = tmp_path / "portfolio.txt"
+   path.write_text("AAPL\nMSFT\n")
+   store = PortfolioStore(str(path), str(tmp_path / "portfolios"), poll_seconds=60)
+   monkeypatch.setattr(endpoints, "portfolio_store", store)
+   app = FastAPI()
+   app.include_router(endpoints.router)
+   client = TestClient(app)
+
+   first = client.get("/portfolio")
+   assert first.json() == ["AAPL", "MSFT"]
+   assert first.headers["x-total-count"] == "2"
+   etag = first.headers["etag"]
+   cached = client.get("/portfolio", headers={"If-None-Match": etag})
+   assert cached.status_code == 304 and cached.headers["etag"] == etag
+   # A different page of the same list is a different representation
+   assert client.get("/portfolio", params={"limit": 1}).headers["etag"] != etag
+
+   path.write_text("AAPL\nMSFT\nNVDA\n")
+   stat = os.stat(path)
+   os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+   store.refresh()
+   changed = client.get("/portfolio", headers={"If-None-Match": etag})
+   assert changed.status_code == 200
+   assert changed.json() == ["AAPL", "MSFT", "NVDA"]
+   assert changed.headers["etag"] != etag
@@ -0,0 +1,25 @@
+# tests/test_rules.py
+from app.services.rules import decide_fundamental, decide_technical
+
+ON_THRESHOLDS = {"price": 100.0, "ema_50": 100.0, "rsi_14": 70.0, "adx_14": 25.0}
+
+
+def test_lenient_technical_decides_values_exactly_on_a_threshold():
+   # Price on the EMA has no trend, RSI on 70 is not overbought: nothing to act on
+   assert decide_technical(ON_THRESHOLDS) is None
+   assert decide_technical(ON_THRESHOLDS, lenient=True) == "HOLD"
+   # RSI exactly at the oversold line is neutral, so a strong uptrend still decides
+   assert decide_technical({"price": 110.0, "ema_50": 100.0, "rsi_14": 30.0, "adx_14": 40.0}, lenient=True) == "BUY"
+
+
+def test_lenient_technical_ignores_a_strong_but_flat_trend():
+   data = {"price": 100.0, "ema_50": 100.0, "rsi_14": 50.0, "adx_14": 40.0}
+   assert decide_technical(data, lenient=True) == "HOLD"
+
+
+def test_lenient_fundamental_counts_a_value_on_the_threshold_as_neutral():
+   data = {"price": 90.0, "analyst_price_target": 100.0, "pe_ratio": 30.0, "revenue_growth_yoy": 5.0}
+   # Strict mode leaves the P/E and growth on their thresholds to the LLM
+   assert decide_fundamental(data) is None
+   assert decide_fundamental(data, lenient=True) == "BUY"
+   assert decide_fundamental({**data, "price": 100.0}, lenient=True) == "HOLD"
@@ -0,0 +1,95 @@
+# tests/test_screener.py
+import asyncio
+import math
+
+import numpy as np
+
+from app.services import screener as screener_module
+from app.services.screener import FundamentalsTable, Screener, dcf_per_share, screen
+
+
+def _info(price, fcf, growth, shares, pe=None, cash=0.0, debt=0.0, name=None):
+   return {"currentPrice": price, "freeCashflow": fcf, "earningsGrowth": growth, "sharesOutstanding": shares,
+           "trailingPE": pe, "totalCash": cash, "totalDebt": debt, "longName": name}
+
+
+def _reference_dcf(fcf, growth, shares, cash, debt, rate=0.09, terminal=0.025, years=5):
+   flows = [fcf * (1 + growth) ** t for t in range(1, years + 1)]
+   value = sum(flow / (1 + rate) ** t for t, flow in enumerate(flows, start=1))
+   value += flows[-1] * (1 + terminal) / (rate - terminal) / (1 + rate) ** years
+   return (value + cash - debt) / shares
+
+
+def test_dcf_per_share_matches_a_direct_computation():
+   table = FundamentalsTable.build({
+       "AAA": _info(50.0, 100.0, 0.10, 10.0, cash=50.0, debt=20.0),
+       "CAP": _info(50.0, 100.0, 0.90, 10.0),  # growth above the cap
+       "NOG": _info(50.0, 100.0, None, 10.0),  # missing growth grows at the terminal rate
+       "NOS": _info(50.0, 100.0, 0.10, None),  # missing shares
+       "NOF": _info(50.0, None, 0.10, 10.0),  # missing free cash flow
+   })
+   value = dict(zip(table.symbols, dcf_per_share(table, 0.09, 0.025, 5, 0.25)))
+   assert math.isclose(value["AAA"], _reference_dcf(100.0, 0.10, 10.0, 50.0, 20.0), rel_tol=1e-12)
+   assert math.isclose(value["CAP"], _reference_dcf(100.0, 0.25, 10.0, 0.0, 0.0), rel_tol=1e-12)
+   assert math.isclose(value["NOG"], _reference_dcf(100.0, 0.025, 10.0, 0.0, 0.0), rel_tol=1e-12)
+   assert np.isnan(value["NOS"]) and np.isnan(value["NOF"])
+
+
+def test_screen_ranks_by_margin_and_relative_pe_and_skips_unusable_rows():
+   table = FundamentalsTable.build({
+       "CHEAP": _info(20.0, 100.0, 0.05, 10.0, pe=10.0, name="Cheap Co"),
+       "FAIR": _info(150.0, 100.0, 0.05, 10.0, pe=20.0),
+       "PRICEY": _info(500.0, 100.0, 0.05, 10.0, pe=40.0),  # below its intrinsic value
+       "BURNING": _info(20.0, -100.0, 0.05, 10.0, pe=5.0),  # negative free cash flow
+       "NOPRICE": _info(None, 100.0, 0.05, 10.0, pe=8.0),
+       "NOPE": _info(30.0, 100.0, 0.05, 10.0, pe=None),  # P/E unknown: no relative component
+   })
+   candidates = screen(table, top_n=10)
+   assert [c.ticker for c in candidates] == ["CHEAP", "NOPE", "FAIR"]
+   cheap = candidates[0]
+   assert cheap.company_name == "Cheap Co" and candidates[2].company_name == "FAIR"
+   # The median ignores missing P/Es: the positive ones are 5, 8, 10, 20 and 40
+   assert cheap.median_pe == 10.0 and candidates[1].pe_ratio is None
+   assert cheap.margin_of_safety > candidates[1].margin_of_safety > candidates[2].margin_of_safety > 0
+   assert [c.ticker for c in screen(table, top_n=1)] == ["CHEAP"]
+
+
+def test_screen_handles_an_empty_or_unusable_universe():
+   assert screen(FundamentalsTable.build({}), top_n=5) == []
+   table = FundamentalsTable.build({"NOF": _info(10.0, None, None, None)})
+   assert screen(table, top_n=5) == []
+
+
+def test_failed_background_rebuild_is_logged_and_tables_are_bounded(monkeypatch, capsys):
+   infos = {symbol: _info(20.0, 100.0, 0.05, 10.0, pe=10.0) for symbol in ("A", "B", "C")}
+   failing = []
+
+   async def prefetch(symbols):
+       if failing:
+           raise ConnectionError("upstream down")
+       return {symbol: True for symbol in symbols}
+
+   monkeypatch.setattr(screener_module.fundamentals, "prefetch", prefetch)
+   monkeypatch.setattr(screener_module.fundamentals, "peek", lambda symbol: infos.get(symbol))
+
+   async def run():
+       screener = Screener(ttl=0, max_tables=2)
+       first = await screener.table(["A"])
+       await screener.table(["B"])
+       await screener.table(["A"])  # A is the most recently used
+       await screener.table(["C"])
+       assert set(screener._tables) == {("A",), ("C",)}
+       assert screener.evictions == 1
+
+       # Expired (ttl=0): the old table is served while the rebuild fails in the background
+       failing.append(True)
+       await screener.table(["A"])
+       served = await screener.table(["A"])
+       while screener._building:
+           await asyncio.sleep(0.01)
+       return screener, first, served
+
+   screener, first, served = asyncio.run(run())
+   assert served.symbols.tolist() == first.symbols.tolist()
+   assert screener.build_failures >= 1
+   assert "Background rebuild of the screener table for 1 tickers failed: upstream down" in capsys.readouterr().out
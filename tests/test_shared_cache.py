@@ -0,0 +1,80 @@
+# tests/test_shared_cache.py
+import asyncio
+import time
+
+from app.services.shared_cache import SQLiteBackend
+
+
+def _workers(path, count=4):
+   # One backend per simulated worker process: each has its own connection and single-flight
+   return [SQLiteBackend(str(path), lease_seconds=10, poll_seconds=0.01, max_entries=100) for _ in range(count)]
+
+
+def _run_concurrently(backends, key, compute):
+   async def timed(backend):
+       entry = await backend.get_or_compute(key, compute)
+       return entry.value, time.perf_counter() - started
+
+   async def run():
+       return await asyncio.gather(*(timed(backend) for backend in backends))
+
+   started = time.perf_counter()
+   return asyncio.run(run())
+
+
+def test_one_worker_fills_a_key_for_all_of_them(tmp_path):
+   backends = _workers(tmp_path / "shared.sqlite3")
+   calls = []
+
+   async def compute():
+       calls.append(1)
+       await asyncio.sleep(0.2)
+       return b"value", 60
+
+   results = _run_concurrently(backends, "info:AAPL", compute)
+   # A backend error falls back to computing locally, which would also show up as extra calls
+   assert [backend.errors for backend in backends] == [0] * 4
+   assert [value for value, _ in results] == [b"value"] * 4
+   assert len(calls) == 1
+   assert sum(backend.hits for backend in backends) == 3
+
+
+def test_unshareable_fill_releases_the_waiters_to_compute_in_parallel(tmp_path):
+   backends = _workers(tmp_path / "shared.sqlite3")
+   calls = []
+
+   async def compute():
+       calls.append(1)
+       await asyncio.sleep(0.5)
+       return b"degraded", 0
+
+   results = _run_concurrently(backends, "analysis:AAPL", compute)
+   assert [backend.errors for backend in backends] == [0] * 4
+   assert len(calls) == 4
+   # In turn this would take about 4 x 0.5 s; released waiters finish about one compute after the filler
+   assert max(elapsed for _, elapsed in results) < 1.6
+   assert sum(backend.unshared for backend in backends) == 3
+
+
+def test_failed_fill_releases_the_waiters(tmp_path):
+   backends = _workers(tmp_path / "shared.sqlite3")
+   calls = []
+
+   async def compute():
+       calls.append(1)
+       await asyncio.sleep(0.3)
+       raise RuntimeError("upstream down")
+
+   async def attempt(backend):
+       try:
+           await backend.get_or_compute("info:MSFT", compute)
+       except RuntimeError:
+           return time.perf_counter() - started
+
+   async def run():
+       return await asyncio.gather(*(attempt(backend) for backend in backends))
+
+   started = time.perf_counter()
+   elapsed = asyncio.run(run())
+   assert len(calls) == 4
+   assert max(elapsed) < 1.0
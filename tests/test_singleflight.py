@@ -0,0 +1,34 @@
+# tests/test_singleflight.py
+import asyncio
+
+from app.services.singleflight import SingleFlight
+from app.services.tracing import span, trace
+
+
+def test_shared_call_runs_outside_every_callers_trace():
+   flight = SingleFlight("test")
+   calls = []
+
+   async def load():
+       calls.append(1)
+       with span("upstream"):
+           await asyncio.sleep(0.01)
+       return "value"
+
+   async def traced_request(name):
+       with trace(name) as root:
+           value = await flight.do("key", load)
+       return value, root.to_dict()
+
+   async def run():
+       return await asyncio.gather(traced_request("first"), traced_request("second"))
+
+   (first_value, first), (second_value, second) = asyncio.run(run())
+   assert first_value == second_value == "value" and len(calls) == 1
+   # Neither trace holds the shared call's spans; each shows its own wait
+   for root, coalesced in ((first, False), (second, True)):
+       [wait] = root["children"]
+       assert wait["name"] == "singleflight"
+       assert wait["attrs"] == {"flight": "test", "coalesced": coalesced}
+       assert "children" not in wait
+   assert flight.stats() == {"calls": 2, "executions": 1, "coalesced": 1, "in_flight": 0}